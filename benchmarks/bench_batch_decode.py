@@ -0,0 +1,48 @@
+"""
+Throughput of :func:`j1939.decode_can_ids`, cross-checked against the
+ArbitrationID/PDU object path on a random sample of identifiers.
+"""
+
+import argparse
+
+import numpy as np
+
+from common import rate, timed, report
+
+import j1939
+from j1939.batch import NO_DESTINATION
+
+
+def cross_check(can_ids, decoded):
+    for i, can_id in enumerate(can_ids):
+        arbitration_id = j1939.ArbitrationID()
+        arbitration_id.can_id = int(can_id)
+        pdu = j1939.PDU(arbitration_id=arbitration_id)
+        destination = pdu.destination
+        if destination is None:
+            destination = NO_DESTINATION
+        expected = (arbitration_id.priority, pdu.pgn, pdu.source, destination)
+        got = (decoded.priority[i], decoded.pgn[i], decoded.source[i], decoded.destination[i])
+        if expected != tuple(int(v) for v in got):
+            raise AssertionError("0x{:08x}: object path {} != batch {}".format(int(can_id), expected, got))
+
+
+def run(frames=10000000, sample=20000, seed=1939):
+    rng = np.random.RandomState(seed)
+    can_ids = rng.randint(0, 1 << 29, size=frames, dtype=np.uint32)
+
+    cross_check(can_ids[:sample], j1939.decode_can_ids(can_ids[:sample]))
+
+    return {
+        "frames": frames,
+        "cross_checked": sample,
+        "frames_per_second": rate(frames, timed(j1939.decode_can_ids, can_ids)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=10000000)
+    parser.add_argument("--sample", type=int, default=20000)
+    args = parser.parse_args()
+    report(run(args.frames, args.sample))
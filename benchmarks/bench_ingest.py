@@ -0,0 +1,83 @@
+"""
+Frames per second of :meth:`j1939.Bus.ingest` on packed can_frame
+buffers, against unpacking the same records into :class:`can.Message`
+objects (as python-can's socketcan interface does) and feeding them to
+:meth:`j1939.Bus.notification`.
+
+Measured on a bus that queues every frame and on one that wants none of
+them (broadcast off, no Nodes), where a frame is dropped after its
+header decode.
+"""
+
+import argparse
+import time
+
+import can
+
+from common import sample_messages, rate, timed, report
+
+import j1939
+from j1939.canframe import CAN_FRAME, CAN_FRAME_SIZE, CAN_ID_MASK, CAN_EFF_FLAG, pack_can_frames
+
+# frames per buffer, about what one recv_into of a busy socket returns
+BATCH = 64
+
+
+def _buffer():
+    messages = sample_messages()
+    return pack_can_frames((msg.arbitration_id, msg.data) for msg in
+                           (messages[i % len(messages)] for i in range(BATCH)))
+
+
+def _feed_messages(bus, buffer, frames):
+    notification = bus.notification
+    Message = can.Message
+    unpack_from = CAN_FRAME.unpack_from
+    for batch in range(frames // BATCH):
+        timestamp = time.time()
+        for offset in range(0, len(buffer), CAN_FRAME_SIZE):
+            can_id, length, data = unpack_from(buffer, offset)
+            notification(Message(timestamp=timestamp, arbitration_id=can_id & CAN_ID_MASK,
+                                 is_extended_id=bool(can_id & CAN_EFF_FLAG), dlc=length, data=data[:length]))
+        if batch & 0xF == 0:
+            bus.queue.queue.clear()
+    bus.queue.queue.clear()
+
+
+def _feed_ingest(bus, buffer, frames):
+    ingest = bus.ingest
+    for batch in range(frames // BATCH):
+        ingest(buffer)
+        if batch & 0xF == 0:
+            bus.queue.queue.clear()
+    bus.queue.queue.clear()
+
+
+def _compare(bus, buffer, frames):
+    _feed_ingest(bus, buffer, BATCH * 16)  # warm up the decode cache
+    messages_fps = rate(frames, timed(_feed_messages, bus, buffer, frames))
+    ingest_fps = rate(frames, timed(_feed_ingest, bus, buffer, frames))
+    return {"message_fps": messages_fps, "ingest_fps": ingest_fps, "speedup": ingest_fps / messages_fps}
+
+
+def run(frames=50000):
+    buffer = _buffer()
+    results = {"batch": BATCH}
+    bus = j1939.Bus(channel="bench-ingest", bustype="virtual", timeout=0.01)
+    try:
+        results["queued"] = _compare(bus, buffer, frames)
+    finally:
+        bus.shutdown()
+    bus = j1939.Bus(channel="bench-ingest", bustype="virtual", timeout=0.01, broadcast=False)
+    try:
+        results["dropped"] = _compare(bus, buffer, frames)
+    finally:
+        bus.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=50000)
+    args = parser.parse_args()
+    report(run(args.frames))
@@ -0,0 +1,48 @@
+"""
+Frames per second through :meth:`j1939.Bus.notification`, with tracing
+disabled and with tracing enabled into an in-memory buffer.
+"""
+
+import argparse
+
+from common import sample_messages, rate, timed, report
+
+import j1939
+from j1939 import trace
+
+
+def _feed(bus, messages, frames):
+    notification = bus.notification
+    count = len(messages)
+    for i in range(frames):
+        notification(messages[i % count])
+        if i & 0x3FF == 0:
+            bus.queue.queue.clear()
+    bus.queue.queue.clear()
+
+
+def run(frames=20000):
+    bus = j1939.Bus(channel="bench", bustype="virtual", timeout=0.01)
+    messages = sample_messages()
+    results = {}
+    try:
+        _feed(bus, messages, 1000)  # warm up the decode cache
+        results["trace_disabled_fps"] = rate(frames, timed(_feed, bus, messages, frames))
+
+        sink = trace.TraceBuffer(maxlen=None)
+        trace.enable(sink)
+        try:
+            results["trace_enabled_fps"] = rate(frames, timed(_feed, bus, messages, frames))
+        finally:
+            trace.disable(sink)
+        results["trace_records_per_frame"] = len(sink.records) / float(frames)
+    finally:
+        bus.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=20000)
+    args = parser.parse_args()
+    report(run(args.frames))
@@ -0,0 +1,48 @@
+"""
+Memory per PDU and PDU construction rate, building PDUs the way the
+receive path does (decoded arbitration ID plus an 8 byte payload).
+"""
+
+import argparse
+import gc
+import tracemalloc
+
+from common import rate, timed, report
+
+import j1939
+
+
+def _build(count, can_ids, payload):
+    cache = j1939.ArbitrationIDCache()
+    pdus = []
+    append = pdus.append
+    n = len(can_ids)
+    for i in range(count):
+        arbitration_id = j1939.ArbitrationID.from_decoded(cache.lookup(can_ids[i % n]))
+        append(j1939.PDU(timestamp=float(i), arbitration_id=arbitration_id, data=bytearray(payload)))
+    return pdus
+
+
+def run(count=200000):
+    can_ids = [0x0CF00400, 0x18FEF100, 0x18FECA03, 0x18EA1700, 0x18EEFF05]
+    payload = b"\x01\x02\x03\x04\x05\x06\x07\x08"
+    results = {"pdus": count}
+
+    results["construction_per_second"] = rate(count, timed(_build, count, can_ids, payload))
+
+    gc.collect()
+    tracemalloc.start()
+    pdus = _build(count, can_ids, payload)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results["bytes_per_pdu"] = current / float(count)
+    results["peak_bytes"] = peak
+    del pdus
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=200000)
+    args = parser.parse_args()
+    report(run(args.count))
@@ -0,0 +1,106 @@
+"""
+Helpers shared by the benchmark scripts in this directory.
+
+The benchmarks run offline on python-can's ``virtual`` interface, e.g.::
+
+    python benchmarks/bench_notification.py --frames 20000
+"""
+
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+# make the in-tree j1939 package importable when run from a checkout
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import can
+
+
+def extended_message(can_id, data, timestamp=0.0):
+    return can.Message(arbitration_id=can_id, is_extended_id=True, dlc=len(data),
+                       data=data, timestamp=timestamp)
+
+
+def sample_messages():
+    """A small mix of broadcast, destination specific and address claim frames."""
+    return [
+        extended_message(0x0CF00400, [0xF0, 0x7D, 0x7D, 0x00, 0x00, 0x00, 0xF0, 0x7D]),  # EEC1
+        extended_message(0x18FEF100, [0xFF, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0xFF]),  # CCVS
+        extended_message(0x18FECA03, [0x00, 0xFF, 0x00, 0x00, 0x00, 0x00, 0xFF, 0xFF]),  # DM1
+        extended_message(0x18EA1700, [0xEE, 0xFE, 0x00]),                                # request
+        extended_message(0x18EEFF05, [0x01, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x80]),  # claim
+    ]
+
+
+def rate(count, seconds):
+    return count / seconds if seconds else float("inf")
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(step, iterations, memory_iterations=1000):
+    """
+    Call ``step(i)`` for ``iterations`` iterations, timing each call, then
+    run it again ``memory_iterations`` times under tracemalloc for the
+    peak memory (tracing slows the calls down too much to time them in
+    the same pass).
+    """
+    perf_counter = time.perf_counter
+    latencies = []
+    append = latencies.append
+    start = perf_counter()
+    for i in range(iterations):
+        t = perf_counter()
+        step(i)
+        append(perf_counter() - t)
+    seconds = perf_counter() - start
+    latencies.sort()
+
+    tracemalloc.start()
+    try:
+        for i in range(min(iterations, memory_iterations)):
+            step(i)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "operations": iterations,
+        "seconds": seconds,
+        "ops_per_second": rate(iterations, seconds),
+        "p50_us": percentile(latencies, 0.50) * 1e6,
+        "p99_us": percentile(latencies, 0.99) * 1e6,
+        "max_us": latencies[-1] * 1e6,
+        "peak_memory_bytes": peak,
+    }
+
+
+def environment():
+    import j1939
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "python_can": can.__version__,
+        "j1939": j1939.__version__,
+    }
+
+
+def report(results):
+    json.dump(results, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write("\n")
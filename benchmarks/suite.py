@@ -0,0 +1,239 @@
+"""
+Benchmark suite for the J1939 stack, run offline on python-can's
+``virtual`` interface.
+
+Every case reports throughput, per-operation latency percentiles and peak
+traced memory as JSON, so results can be compared between releases::
+
+    python benchmarks/suite.py --output results.json
+    python benchmarks/suite.py --cases notification bam_reassembly --scale 0.1
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from common import extended_message, sample_messages, measure, environment, report
+
+import j1939
+from j1939 import profiling
+from j1939.constants import *
+
+
+def _bus(**kwargs):
+    return j1939.Bus(channel="bench-suite", bustype="virtual", timeout=0.01, **kwargs)
+
+
+def _drain(bus):
+    bus.queue.queue.clear()
+
+
+def _tp_frames(source, destination, pgn, payload, bam):
+    """The connection management announce and TP.DT frames carrying ``payload``."""
+    num_packets = (len(payload) + 6) // 7
+    cm_id = (7 << 26) | (PGN_TP_CONNECTION_MANAGEMENT << 8) | (destination << 8) | source
+    dt_id = (7 << 26) | (PGN_TP_DATA_TRANSFER << 8) | (destination << 8) | source
+    announce = extended_message(cm_id, [CM_MSG_TYPE_BAM if bam else CM_MSG_TYPE_RTS,
+                                        len(payload) & 0xFF, len(payload) >> 8, num_packets, 0xFF,
+                                        pgn & 0xFF, (pgn >> 8) & 0xFF, (pgn >> 16) & 0xFF])
+    padded = bytes(payload) + b"\xFF" * (-len(payload) % 7)
+    data = [extended_message(dt_id, bytearray((i + 1,)) + padded[i * 7:i * 7 + 7])
+            for i in range(num_packets)]
+    return [announce] + data
+
+
+def bench_notification(scale):
+    bus = _bus()
+    messages = sample_messages()
+    count = len(messages)
+    notification = bus.notification
+
+    def step(i):
+        notification(messages[i % count])
+        if i & 0x3FF == 0:
+            _drain(bus)
+
+    try:
+        return measure(step, int(50000 * scale))
+    finally:
+        bus.shutdown()
+
+
+def _bench_listener(scale, **kwargs):
+    # called the way the receive thread calls it, through the listener
+    bus = _bus(**kwargs)
+    messages = sample_messages()
+    count = len(messages)
+    listener = bus._listener
+
+    def step(i):
+        listener(messages[i % count])
+        if i & 0x3FF == 0:
+            _drain(bus)
+
+    try:
+        return measure(step, int(50000 * scale))
+    finally:
+        bus.shutdown()
+
+
+def bench_notification_listener(scale):
+    return _bench_listener(scale)
+
+
+def bench_notification_metrics(scale):
+    """notification_listener with metrics collection on, for its overhead."""
+    return _bench_listener(scale, metrics=True)
+
+
+def bench_notification_profiled(scale):
+    """notification_listener with a stage profiling hook, for its overhead."""
+    collector = profiling.LatencyCollector()
+    profiling.add_hook(collector)
+    try:
+        return _bench_listener(scale)
+    finally:
+        profiling.remove_hook(collector)
+
+
+def bench_send(scale):
+    bus = _bus()
+    pdu = j1939.PDU(arbitration_id=j1939.ArbitrationID(priority=3, pgn=0xF004, source_address=0x00),
+                    data=b"\xF0\x7D\x7D\x00\x00\x00\xF0\x7D")
+    try:
+        return measure(lambda i: bus.send(pdu), int(20000 * scale))
+    finally:
+        bus.shutdown()
+
+
+def bench_tp_segmentation(scale):
+    # RTS/CTS path: segment 1785 bytes and send the RTS; the CTS never comes
+    bus = _bus()
+    pdu = j1939.PDU(arbitration_id=j1939.ArbitrationID(pgn=PGN_DM16_BINARY_DATA_TRANSFER,
+                                                       source_address=0x20, destination_address=0x17),
+                    data=bytes(range(256)) * 6 + bytes(249))
+
+    def step(i):
+        bus.send(pdu)
+        bus._incomplete_transmitted_pdus.clear()
+
+    try:
+        result = measure(step, int(2000 * scale))
+        result["payload_bytes"] = len(pdu.data)
+        return result
+    finally:
+        bus.shutdown()
+
+
+def _bench_reassembly(scale, bam):
+    bus = _bus()
+    node = None
+    destination = DESTINATION_ADDRESS_GLOBAL
+    if not bam:
+        destination = 0x17
+        node = j1939.Node(bus, j1939.NodeName(), [destination])
+        bus.connect(node)
+    payload = bytes(range(256)) * 6 + bytes(249)
+    sessions = [_tp_frames(source, destination, 0xFEE3 if bam else PGN_DM16_BINARY_DATA_TRANSFER, payload, bam)
+                for source in range(0x20, 0x30)]
+    notification = bus.notification
+
+    def step(i):
+        for message in sessions[i % len(sessions)]:
+            notification(message)
+        _drain(bus)
+
+    try:
+        result = measure(step, int(500 * scale), memory_iterations=100)
+        result["payload_bytes"] = len(payload)
+        result["frames_per_second"] = result["ops_per_second"] * len(sessions[0])
+        result["completed"] = bus._tp_sessions.completed
+        return result
+    finally:
+        bus.shutdown()
+
+
+def bench_bam_reassembly(scale):
+    return _bench_reassembly(scale, bam=True)
+
+
+def bench_rts_reassembly(scale):
+    return _bench_reassembly(scale, bam=False)
+
+
+def bench_address_claim_storm(scale):
+    """
+    A node seeing address claims from many other ECUs, one in sixteen of
+    them contending for its own address with a losing NAME, so the node
+    re-claims.
+    """
+    bus = _bus(broadcast=False)
+    node = j1939.Node(bus, j1939.NodeName(0x0000000000000010), [0x80])
+    node.known_node_addresses[node.node_name.value] = 0x80
+    claims = []
+    for i in range(256):
+        name = j1939.NodeName(0x8000000000000000 | (i << 21) | 0x1000)
+        source = 0x80 if i % 16 == 0 else i % 0x7F
+        aid = j1939.ArbitrationID(priority=6, pgn=PGN_AC_ADDRESS_CLAIMED, source_address=source,
+                                  destination_address=DESTINATION_ADDRESS_GLOBAL)
+        claims.append(j1939.PDU(arbitration_id=aid, data=name.bytes))
+
+    try:
+        result = measure(lambda i: node.on_message_received(claims[i & 0xFF]), int(20000 * scale))
+        result["known_nodes"] = len(node.known_node_addresses)
+        return result
+    finally:
+        bus.shutdown()
+
+
+def bench_nodename_encode(scale):
+    names = [j1939.NodeName(0x8000000000000000 | (i << 21) | i) for i in range(256)]
+    return measure(lambda i: names[i & 0xFF].bytes, int(50000 * scale))
+
+
+def bench_nodename_decode(scale):
+    encoded = [j1939.NodeName(0x8000000000000000 | (i << 21) | i).bytes for i in range(256)]
+    name = j1939.NodeName()
+
+    def step(i):
+        name.bytes = encoded[i & 0xFF]
+
+    return measure(step, int(50000 * scale))
+
+
+CASES = {
+    "notification": bench_notification,
+    "notification_listener": bench_notification_listener,
+    "notification_metrics": bench_notification_metrics,
+    "notification_profiled": bench_notification_profiled,
+    "send": bench_send,
+    "tp_segmentation": bench_tp_segmentation,
+    "bam_reassembly": bench_bam_reassembly,
+    "rts_reassembly": bench_rts_reassembly,
+    "address_claim_storm": bench_address_claim_storm,
+    "nodename_encode": bench_nodename_encode,
+    "nodename_decode": bench_nodename_decode,
+}
+
+
+def run(cases=None, scale=1.0):
+    results = {"environment": environment(), "scale": scale, "started": time.time(), "cases": {}}
+    for name in cases or sorted(CASES):
+        results["cases"][name] = CASES[name](scale)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), help="cases to run, default all")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier for the iteration counts")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    results = run(args.cases, args.scale)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    else:
+        report(results)
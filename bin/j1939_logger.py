@@ -5,8 +5,12 @@ import datetime
 import textwrap
 import json
 
+import time
+
 import can
 import j1939
+from j1939.capture import CaptureWriter
+from j1939.filters import compile_filters
 import logging
 
 lLevel = logging.WARN
@@ -48,6 +52,17 @@ def parse_arguments():
     hex data in output
     when dumping output display data in hex'''), default=False)
 
+    parser.add_argument('-b', '--binary-out',
+                        help=textwrap.dedent('''\
+    record the raw frames to this file in the compact binary
+    capture format instead of printing them, replay the file
+    with j1939_replay.py'''))
+
+    parser.add_argument('--no-compress',
+                        action='store_true',
+                        help=textwrap.dedent('''\
+    don't compress the blocks of the binary capture'''), default=False)
+
     filter_group = parser.add_mutually_exclusive_group()
     filter_group.add_argument('--pgn',
                               help=textwrap.dedent('''\
@@ -136,6 +151,27 @@ if __name__ == "__main__":
     print("filter source : ", args.source)
     print("filters       : ", filters)
 
+    if args.binary_out:
+        # record raw frames as they arrive; nothing needs to reach the
+        # PDU queue so the bus doesn't broadcast to it
+        capture_filter = compile_filters(filters)
+        writer = CaptureWriter(args.binary_out, compress=not args.no_compress,
+                               accept=capture_filter.accepts if capture_filter else None)
+        bus = j1939.Bus(channel=args.channel, bustype=args.interface, j1939_filters=filters, timeout=0.1,
+                        broadcast=False)
+        bus.can_notifier.add_listener(writer)
+        print("channel info  : ", bus.can_bus.channel_info)
+        print("recording to  : ", args.binary_out)
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            bus.shutdown()
+            # joins the receive thread, then stops (flushes) the writer
+            bus.can_notifier.stop()
+            print("recorded %d frames" % writer.frames)
+        raise SystemExit
+
     bus = j1939.Bus(channel=args.channel, bustype=args.interface, j1939_filters=filters, timeout=0.1)
     print("channel info  : ", bus.can_bus.channel_info)
     log_start_time = datetime.datetime.now()
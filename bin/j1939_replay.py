@@ -0,0 +1,80 @@
+#!/usr/bin/python
+#
+from __future__ import print_function
+
+_name = "j1939_replay"
+__version__ = "1.0.0"
+__date__ = "10/18/2026"
+__exp__ = "(expirimental)"  # (Release Version)
+title = "%s Version: %s %s %s" % (_name, __version__, __date__, __exp__)
+
+import argparse
+import json
+import logging
+import textwrap
+import threading
+
+import j1939
+from j1939.capture import CaptureReader, replay
+
+
+if __name__ == "__main__":
+
+    logger = logging.getLogger("j1939")
+    ch = logging.StreamHandler()
+    ch.setLevel(logging.WARNING)
+    logger.addHandler(ch)
+
+    parser = argparse.ArgumentParser(description=textwrap.dedent('''\
+        Replay a binary capture written by j1939_logger.py --binary-out
+        through the J1939 stack and print the resulting PDUs.
+
+        example: %(prog)s --speed 10 truck.j1939
+        '''), formatter_class=argparse.RawTextHelpFormatter, epilog=title)
+
+    parser.add_argument("capture", help="capture file to replay")
+    parser.add_argument("-s", "--speed", type=float, default=1.0,
+                        help="playback speed, 1.0 is the original timing (default)")
+    parser.add_argument("-m", "--max-speed", action="store_true", default=False,
+                        help="replay as fast as possible")
+    parser.add_argument("-x", "--hex-out", action="store_true", default=False,
+                        help="hex data in output")
+    parser.add_argument("--filter", type=argparse.FileType('r'),
+                        help="json file with j1939_filters, see j1939_logger.py")
+    args = parser.parse_args()
+
+    filters = json.load(args.filter) if args.filter is not None else None
+
+    # The virtual interface is only there to give the Bus something to
+    # open, frames are fed straight into its notification; the bounded
+    # queue holds the replay back while printing catches up
+    bus = j1939.Bus(channel="j1939_replay", bustype="virtual", j1939_filters=filters, timeout=0.1,
+                    queue_size=10000)
+
+    reader = CaptureReader(args.capture)
+    done = threading.Event()
+
+    def run():
+        try:
+            count = replay(reader, bus, speed=None if args.max_speed else args.speed)
+            logger.info("replayed %d frames", count)
+        finally:
+            done.set()
+
+    player = threading.Thread(target=run)
+    player.daemon = True
+    player.start()
+
+    try:
+        while not (done.is_set() and bus.queue.qsize() == 0):
+            msg = bus.recv(timeout=0.1)
+            if msg is None:
+                continue
+            if args.hex_out:
+                msg.display_radix = 'hex'
+            print(msg)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bus.shutdown()
+        reader.close()
@@ -11,7 +11,6 @@ http://en.wikipedia.org/wiki/J1939
 import threading
 import logging
 import logging.handlers
-import pprint
 import time
 import tempfile
 import os
@@ -21,7 +20,6 @@ try:
 except ImportError:
     from Queue import Queue, Empty
 
-import copy
 
 # By this stage the can.rc should have been set up
 from can import CanError
@@ -35,10 +33,28 @@ from can.bus import BusABC
 from j1939.pdu import PDU
 from j1939.pgn import PGN
 from j1939.constants import *
-from j1939.notifier import Notifier, CanNotifier as canNotifier
+from j1939.notifier import Notifier, InlineNotifier, CanNotifier as canNotifier
 from j1939.node import Node
 from j1939.nodename import NodeName
 from j1939.arbitrationid import ArbitrationID
+from j1939 import trace
+from j1939 import profiling
+from j1939.decodecache import ArbitrationIDCache, DecodedArbitrationID, decode_can_id, DEFAULT_CACHE_SIZE
+from j1939.batch import decode_can_ids
+from j1939.transport import TransportReassembler, ReassemblySession, TransmitScheduler
+from j1939.subscription import Subscription, SubscriptionIndex, normalize_pgn
+from j1939.correlator import RequestCorrelator
+from j1939.metrics import MetricsRegistry, MeasuredListener, PrometheusFileWriter
+from j1939.filters import compile_filters, FilterSet
+from j1939.receivequeue import ReceiveQueue, OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_PRIORITY
+from j1939.asyncbus import AsyncBus
+from j1939.reactor import Reactor
+from j1939.canframe import CAN_FRAME_SIZE, pack_can_frames, can_frame_views
+from j1939.canframe import CAN_EFF_FLAG, CAN_RTR_FLAG, CAN_ERR_FLAG, CAN_ID_MASK
+from j1939.spn import SPNDatabase, SPNDefinition
+from j1939.pool import BusPool
+from j1939.memory import MemoryAccess, MemoryAccessError
+from j1939.multichannel import MultiChannelBus, ChannelPDU
 from j1939.utils import *
 
 lLevel = logging.WARNING
@@ -72,6 +88,13 @@ class j1939Listner(canListener):
         self.handler = handler
 
     def on_message_received(self, msg):
+        if profiling.enabled:
+            profiling.begin(msg.arbitration_id)
+            try:
+                self.handler(msg)
+            finally:
+                profiling.end()
+            return
         self.handler(msg)
 
     def stop(self):
@@ -89,7 +112,46 @@ class Bus(BusABC):
 
         Options are:
 
-        * :pgn: An integer PGN to show
+        * :pgn: An integer PGN (or list of them) to show
+        * :pgn_range: An inclusive (low, high) PGN range, or list of them
+        * :source: A source address or list of them
+        * :destination: A destination address or list of them
+        * :priority: A priority or list of them
+
+        All options given in one filter must match.  See
+        :mod:`j1939.filters`; :attr:`filter_stats` counts the frames
+        accepted and rejected.
+
+    :param int id_cache_size:
+        Number of distinct 29-bit CAN IDs whose decoded arbitration fields
+        are cached on the receive path (LRU eviction).
+
+    :param int queue_size:
+        Bound for the receive queue and each connected Node's queue, 0
+        (the default) for unbounded.
+
+    :param str overflow_policy:
+        What a full queue does with a new PDU: ``"block"`` (the default)
+        waits for room, ``"drop-oldest"``, ``"drop-newest"``, or
+        ``"priority"`` which sheds the lowest J1939 priority first.  See
+        :class:`j1939.ReceiveQueue` for the depth/high-water/drop counters.
+
+    :param float bam_gap:
+        Seconds between the packets of an outbound BAM, 0.05 to 0.2 per
+        J1939-21.  BAMs from different source addresses are interleaved.
+
+    :param asyncio.AbstractEventLoop loop:
+        Run the receive path on this event loop, see :class:`j1939.AsyncBus`.
+
+    :param metrics:
+        True or a :class:`j1939.MetricsRegistry` to count frames per PGN
+        and source, inbound TP sessions and receive path time, see
+        :attr:`metrics`.  Off by default.
+
+    :param reactor:
+        True or a shared :class:`j1939.Reactor` to run the receive path,
+        the connected Nodes and the BAM transmissions on one event driven
+        thread instead of a thread each.  Can't be combined with ``loop``.
     """
 
     channel_info = "j1939 bus"
@@ -99,19 +161,27 @@ class Bus(BusABC):
 
         #self.rx_can_message_queue = Queue()
 
-        self.queue = Queue()
+        self._queue_size = kwargs.pop('queue_size', 0)
+        self._overflow_policy = kwargs.pop('overflow_policy', OVERFLOW_BLOCK)
+        self.queue = ReceiveQueue(self._queue_size, self._overflow_policy)
         self.node_queue_list = []  # Start with nothing
 
         super(Bus, self).__init__(kwargs.get('channel'), kwargs.get('can_filters'))
         self._pdu_type = pdu_type
         self.timeout = 1
-        self._long_message_throttler = threading.Thread(target=self._throttler_function)
-        self._long_message_throttler.daemon = True
 
-        self._incomplete_received_pdus = {}
-        self._incomplete_received_pdu_lengths = {}
+        self._tp_sessions = TransportReassembler()
+
+        metrics = kwargs.pop('metrics', None)
+        if metrics is True:
+            metrics = MetricsRegistry()
+        elif metrics is False:
+            metrics = None
+        self._metrics = metrics
+        if metrics is not None:
+            metrics.queue_stats = lambda: self.queue_stats
+            self._tp_sessions.observer = metrics.tp_session
         self._incomplete_transmitted_pdus = {}
-        self._long_message_segment_queue = Queue(0)
         self._key_generation_fcn = None
         self._ignore_can_send_error = False
 
@@ -121,36 +191,45 @@ class Bus(BusABC):
 
         self._ignore_can_send_error = kwargs.get('ignoreCanSendError')
 
+        self._id_cache = ArbitrationIDCache(kwargs.pop('id_cache_size', DEFAULT_CACHE_SIZE))
+
+        bam_gap = kwargs.pop('bam_gap', TP_BAM_GAP_MIN)
+        if not isinstance(bam_gap, (int, float)):
+            raise ValueError("Bad bam_gap type")
+        if not TP_BAM_GAP_MIN <= bam_gap <= TP_BAM_GAP_MAX:
+            logger.warning("bam_gap of %.3f s is outside the J1939-21 range", bam_gap)
+        self._tx_scheduler = TransmitScheduler(self._send_tp_frame, gap=bam_gap)
+
+        # With an asyncio loop python-can watches the interface's file
+        # descriptor from the loop (or hands messages over from its thread)
+        # so notification runs on the loop thread.
+        loop = kwargs.pop('loop', None)
+
+        reactor = kwargs.pop('reactor', None)
+        self._own_reactor = reactor is True
+        if reactor is True:
+            reactor = Reactor()
+        elif reactor is False:
+            reactor = None
+        if reactor is not None and loop is not None:
+            raise ValueError("reactor and loop can't be combined")
+        self._reactor = reactor
+
+        self._broadcast = broadcast
+        self._subscriptions = SubscriptionIndex()
+        self._correlator = RequestCorrelator()
         if broadcast:
             self.node_queue_list = [(None,  self)]  # Start with default logger Queue which will receive everything
+        self._rebuild_dispatch_index()
+
+        # Compile the J1939 filters; they are checked exactly in
+        # notification and also handed to python-can as masks accepting a
+        # superset, for interfaces that can filter below Python
 
-        # Convert J1939 filters into Raw Can filters
-
-        if 'j1939_filters' in kwargs and kwargs['j1939_filters'] is not None:
-            filters = kwargs.pop('j1939_filters')
-            logger.debug("Got filters: {}".format(filters))
-            can_filters = []
-            for filt in filters:
-                can_id, can_mask = 0, 0
-                if 'pgn' in filt:
-                    can_id = filt['pgn'] << 8
-                    # The pgn needs to be left shifted by 8 to ignore the CAN_ID's source address
-                    # Look at most significant 4 bits to determine destination specific
-                    if can_id & 0xF00000 == 0xF00000:
-                        logging.info("PDU2 (broadcast message)")
-                        can_mask = 0xFFFF00
-                    else:
-                        logging.info("PDU1 (p2p)")
-                        can_mask = 0xFF0000
-                if 'source' in filt:
-                    # filter by source
-                    can_mask |= 0xFF
-                    can_id |= filt['source']
-                    logger.info("added source", filt)
-
-                logger.info("Adding CAN ID filter: {:0x}:{:0x}".format(can_id, can_mask))
-                can_filters.append({"can_id": can_id, "can_mask": can_mask})
-            kwargs['can_filters'] = can_filters
+        self._filter = compile_filters(kwargs.pop('j1939_filters', None))
+        if self._filter is not None:
+            logger.debug("Got filters: {}".format(self._filter.filters))
+            kwargs['can_filters'] = self._filter.can_filters()
 
         if 'timeout' in kwargs and kwargs['timeout'] is not None:
             if isinstance(kwargs['timeout'], (int, float)):
@@ -160,72 +239,196 @@ class Bus(BusABC):
 
         logger.debug("Creating a new can bus")
         self.can_bus = RawCanBus(*args, **kwargs)
+        if self._filter is not None and type(self.can_bus)._apply_filters is BusABC._apply_filters:
+            # the interface would check the masks in Python for every
+            # frame, the compiled filter is exact and cheaper
+            self.can_bus.set_filters(None)
 
-        canListener = j1939Listner(self.notification)
-        self.can_notifier = canNotifier(self.can_bus, [canListener], timeout=self.timeout)
-
-        self._long_message_throttler.start()
+        if self._metrics is None:
+            canListener = j1939Listner(self.notification)
+        else:
+            canListener = MeasuredListener(self.notification, self._metrics)
+        self._listener = canListener
+        self._loop = loop
+        if reactor is not None:
+            self.can_notifier = None
+            self._tx_scheduler.wakeup = reactor.wakeup
+            reactor.add(self)
+        else:
+            self.can_notifier = canNotifier(self.can_bus, [canListener], timeout=self.timeout, loop=loop)
+            self._tx_scheduler.start()
 
 
     def notification(self, inboundMessage):
         #self.rx_can_message_queue.put(inboundMessage)
-        if self.can_notifier._running is False:
-            logger.info('{}: Aborting message {} bus is not running'.format(inspect.stack()[0][3], inboundMessage))
+        if self.can_notifier is not None and self.can_notifier._running is False:
+            logger.info('notification: Aborting message %s bus is not running', inboundMessage)
             # Should I return or throw exception here.
 
         if isinstance(inboundMessage, Message):
-            logger.info('\n\n{}:  Got a Message from CAN: {}'.format(inspect.stack()[0][3],inboundMessage))
+            if trace.enabled:
+                trace.emit("bus.rx", can_id=inboundMessage.arbitration_id,
+                           is_extended_id=inboundMessage.is_extended_id,
+                           timestamp=inboundMessage.timestamp, data=bytes(inboundMessage.data))
             if inboundMessage.is_extended_id:
                 # Extended ID
                 # Only J1939 messages (i.e. 29-bit IDs) should go further than this point.
                 # Non-J1939 systems can co-exist with J1939 systems, but J1939 doesn't care
                 # about the content of their messages.
-                logger.info('{}: Message is j1939 msg'.format(inspect.stack()[0][3]))
-
-                #
-                # Need to determine if it's a broadcast message or
-                # limit to listening nodes only
-                #
-                arbitration_id = ArbitrationID()
-                arbitration_id.can_id = inboundMessage.arbitration_id
-                logger.info("{}: ArbitrationID = {}, inboundMessage.arbitration_id: 0x{:08x}".format(inspect.stack()[0][3],arbitration_id, inboundMessage.arbitration_id))
-
-                for (node, l_notifier) in self.node_queue_list:
-                    logger.debug("notification: node=%s" % (node))
-                    logger.debug("              notifier=%s" % (l_notifier))
-                    logger.debug("              arbitration_id.pgn=%s" % (arbitration_id.pgn))
-                    logger.debug("              destination_address=%s" % (arbitration_id.destination_address))
-
-                    # redirect the AC stuff to the node processors. the rest can go
-                    # to the main queue.
-                    if node and (arbitration_id.pgn in [PGN_AC_ADDRESS_CLAIMED, PGN_AC_COMMANDED_ADDRESS, PGN_REQUEST_FOR_PGN]):
-                        logger.info("{}: sending to notifier queue".format(inspect.stack()[0][3]))
-                        # send the PDU to the node processor.
-                        l_notifier.queue.put(inboundMessage)
-
-                    # if node has the destination address, do something with the PDU
-                    elif node and (arbitration_id.destination_address in node.address_list):
-                        logger.info("{}: sending to process_incoming_message".format(inspect.stack()[0][3]))
-                        rx_pdu = self._process_incoming_message(inboundMessage)
-                        if rx_pdu:
-                            logger.info("WP02: notification: sent to general queue: %s QQ=%s" % (rx_pdu, self.queue))
-                            self.queue.put(rx_pdu)
-                    elif node and (arbitration_id.destination_address is None):
-                        logger.info("{}: sending broadcast to general queue".format(inspect.stack()[0][3]))
-                        rx_pdu = self._process_incoming_message(inboundMessage)
-                        logger.info("WP01: notification: sent broadcast to general queue: %s QQ=%s" % (rx_pdu, self.queue))
-                        self.queue.put(rx_pdu)
-                    elif node is None:
-                        # always send the message to the logging queue
-                        logger.info("{}: sending to general queue".format(inspect.stack()[0][3]))
-                        rx_pdu = self._process_incoming_message(inboundMessage)
-                        logger.info("WP03: notification: sent pdu [%s] to general queue" % rx_pdu)
-                        self.queue.put(rx_pdu)
-                    else:
-                        logger.info("WP04: notification: pdu dropped: %s\n\n" % inboundMessage)
+                self._receive_frame(inboundMessage.arbitration_id, inboundMessage.data, inboundMessage.timestamp)
             else:
                 logger.info("Received non J1939 message (ignoring)")
 
+    def ingest(self, buffer, timestamp=None):
+        """
+        Run a buffer of packed Linux ``struct can_frame`` records through
+        the receive path, as if the frames had been received one by one.
+
+        The records are read through memoryviews and no :class:`can.Message`
+        is built; only frames somebody wants are copied out, into their PDU,
+        so ``buffer`` can be reused (e.g. by a raw socket's ``recv_into``)
+        as soon as this returns.  See :mod:`j1939.canframe`::
+
+            buffer = bytearray(CAN_FRAME_SIZE * 64)
+            n = raw_socket.recv_into(buffer)
+            bus.ingest(memoryview(buffer)[:n])
+
+        :param buffer: Any bytes-like object holding whole records.
+        :param float timestamp:
+            Timestamp given to every frame of the buffer, the records carry
+            none; defaults to the current time.
+        :return: The number of 29-bit data frames processed, standard ID,
+            remote and error frames are skipped.
+        """
+        view, ids = can_frame_views(buffer)
+        if timestamp is None:
+            timestamp = time.time()
+        receive = self._receive_frame
+        metrics = self._metrics
+        rx = metrics.rx if metrics is not None else None
+        processed = 0
+        for index in range(len(ids) >> 2):
+            can_id = ids[index << 2]
+            if can_id & (CAN_EFF_FLAG | CAN_RTR_FLAG | CAN_ERR_FLAG) != CAN_EFF_FLAG:
+                if metrics is not None:
+                    metrics.rx_other += 1
+                continue
+            can_id &= CAN_ID_MASK
+            offset = index << 4
+            data = view[offset + 8:offset + 8 + min(view[offset + 4], 8)]
+            if trace.enabled:
+                trace.emit("bus.rx", can_id=can_id, is_extended_id=True, timestamp=timestamp, data=bytes(data))
+            if rx is not None:
+                rx[can_id] = rx.get(can_id, 0) + 1
+            if profiling.enabled:
+                profiling.begin(can_id)
+                try:
+                    receive(can_id, data, timestamp)
+                finally:
+                    profiling.end()
+            else:
+                receive(can_id, data, timestamp)
+            processed += 1
+        return processed
+
+    def _receive_frame(self, can_id, data, timestamp):
+        """
+        The receive path of one 29-bit frame, shared by :meth:`notification`
+        and :meth:`ingest`.
+
+        ``data`` is only copied when the frame becomes a PDU, so it may be
+        a memoryview into a buffer that is reused afterwards.
+        """
+        if self._filter is not None and not self._filter.accepts(can_id):
+            if trace.enabled:
+                trace.emit("bus.filter", can_id=can_id)
+            return
+
+        arbitration_id = self._id_cache.lookup(can_id)
+        if trace.enabled:
+            trace.emit("bus.decode", arbitration_id=arbitration_id)
+        profiled = profiling.enabled
+        if profiled:
+            profiling.mark(profiling.STAGE_DECODE)
+
+        #
+        # Need to determine if it's a broadcast message or
+        # limit to listening nodes only
+        #
+        node_notifiers = self._node_notifiers
+        destination_address = arbitration_id.destination_address
+        to_queue = self._queue_wants(destination_address)
+
+        pgn = arbitration_id.pgn
+        subscriptions = self._subscriptions
+        correlator = self._correlator
+        if pgn == PGN_TP_DATA_TRANSFER:
+            # a stalled session must not take the packet, and without a
+            # reactor nothing else times sessions out between announces
+            tp_sessions = self._tp_sessions
+            if tp_sessions.sessions:
+                tp_sessions.expire(time.monotonic())
+            # only worth a PDU when an announce opened a session
+            wanted = tp_sessions.get(arbitration_id.source_address,
+                                     destination_address) is not None
+        elif pgn == PGN_TP_CONNECTION_MANAGEMENT:
+            # whether the announced PGN is wanted is checked when
+            # the session opens
+            wanted = to_queue or bool(subscriptions) or bool(correlator)
+        else:
+            wanted = to_queue or (node_notifiers and pgn in NETWORK_MANAGEMENT_PGNS) or \
+                (subscriptions and subscriptions.wants(pgn, arbitration_id.source_address,
+                                                       destination_address)) or \
+                (correlator and correlator.wants(pgn, arbitration_id.source_address))
+        if profiled:
+            profiling.mark(profiling.STAGE_DISPATCH)
+
+        if not wanted:
+            if trace.enabled:
+                trace.emit("bus.drop", arbitration_id=arbitration_id)
+            return
+
+        # decode once, whatever the number of interested nodes
+        rx_pdu = self._process_frame(arbitration_id, data, timestamp)
+        if profiled and pgn in TRANSPORT_PROTOCOL_PGNS:
+            profiling.mark(profiling.STAGE_TP)
+        if rx_pdu is None:
+            return
+
+        if pgn in TRANSPORT_PROTOCOL_PGNS:
+            pgn = rx_pdu.pgn
+            destination_address = rx_pdu.destination
+
+        if correlator:
+            # completes a waiting request, the PDU still goes on
+            correlator.resolve(rx_pdu)
+
+        if subscriptions:
+            for subscription in subscriptions.match(pgn, rx_pdu.source, destination_address):
+                if trace.enabled:
+                    trace.emit("bus.route", target="subscription", pdu=rx_pdu)
+                try:
+                    subscription.callback(rx_pdu)
+                except Exception:
+                    logger.exception("Subscription callback %r failed", subscription.callback)
+
+        # redirect the AC stuff to the node processors. the rest can go
+        # to the main queue.
+        if node_notifiers and pgn in NETWORK_MANAGEMENT_PGNS:
+            if trace.enabled:
+                trace.emit("bus.route", target="node", pdu=rx_pdu)
+            for l_notifier in node_notifiers:
+                l_notifier.queue.put(rx_pdu)
+            if not self._broadcast:
+                return
+
+        if to_queue:
+            if trace.enabled:
+                trace.emit("bus.route", target="queue", pdu=rx_pdu)
+            if profiled:
+                profiling.queued(rx_pdu)
+            self.queue.put(rx_pdu)
+
     def connect(self, node):
         """
         Attach a listening node (with a dest address) to the J1939 bus
@@ -234,21 +437,103 @@ class Bus(BusABC):
         if not isinstance(node, Node):
             raise ValueError("bad parameter for node, must be a J1939 node object")
 
-        notifier = Notifier(Queue(), node.on_message_received, timeout=None)
+        if self._reactor is not None:
+            notifier = InlineNotifier([node.on_message_received])
+        else:
+            notifier = Notifier(ReceiveQueue(self._queue_size, self._overflow_policy), [node.on_message_received],
+                                timeout=None)
         self.node_queue_list.append((node, notifier))
+        self._rebuild_dispatch_index()
+
+    def subscribe(self, pgn=None, source=None, destination=None, callback=None):
+        """
+        Call ``callback(pdu)`` for every received PDU matching ``pgn``,
+        ``source`` and ``destination`` (None matches anything).
+
+        Frames that neither a subscription, a Node nor the receive queue
+        wants are dropped straight after the header decode, without
+        building a PDU.  Callbacks run on the receive thread and should
+        return quickly.
+
+        :return: A :class:`j1939.Subscription` to pass to :meth:`unsubscribe`.
+        """
+        if not callable(callback):
+            raise ValueError("callback must be callable")
+        subscription = Subscription(callback, pgn=pgn, source=source, destination=destination)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Remove a subscription, returns False if it wasn't registered."""
+        return self._subscriptions.remove(subscription)
+
+    def expect(self, pgn, source=None, predicate=None):
+        """
+        Register interest in a response before sending the request.
+
+        The returned :class:`concurrent.futures.Future` is completed by
+        the receive thread with the first matching PDU, or with the
+        Acknowledgement naming ``pgn``; the PDU is still delivered to the
+        receive queue and subscriptions as usual.  Requests waiting for the
+        same response are answered in the order they were registered, so
+        several can be outstanding at once::
+
+            future = bus.expect(0xFEDA, source=0x00)    # software id
+            bus.send(request)
+            pdu = future.result(timeout=1)
+
+        :param pgn: The response PGN, or a list of them.
+        :param int source: The responder's address, None for any.
+        :param predicate: Optional callable, a PDU only matches if it returns True.
+        """
+        return self._correlator.expect(pgn, source, predicate)
+
+    def _queue_wants(self, destination_address):
+        """True if frames to ``destination_address`` go to the receive queue."""
+        if self._broadcast:
+            # the default logger Queue receives everything
+            return True
+        if destination_address is None or destination_address == DESTINATION_ADDRESS_GLOBAL:
+            return bool(self._node_notifiers)
+        return destination_address in self._address_index
+
+    def _rebuild_dispatch_index(self):
+        """
+        Rebuild the destination address -> Node index used by notification.
+
+        Called whenever a Node is connected or one of them claims an
+        address.  The new index replaces the old one in a single
+        assignment so the receive thread never sees a partial update.
+        """
+        address_index = {}
+        node_notifiers = []
+        for (node, l_notifier) in self.node_queue_list:
+            if node is None:
+                continue
+            node_notifiers.append(l_notifier)
+            addresses = set(node.address_list)
+            if node.address not in (ADDRESS_UNCLAIMED, DESTINATION_ADDRESS_NULL):
+                addresses.add(node.address)
+            for address in addresses:
+                address_index.setdefault(address, []).append(node)
+        self._address_index = address_index
+        self._node_notifiers = node_notifiers
 
     def recv(self, timeout=None):
         #logger.debug("Waiting for new message")
         #logger.debug("Timeout is {}".format(timeout))
-        logger.debug('J1939 Bus recv(), waiting on QQ=%s with timeout %s' % (self.queue, timeout))
         try:
             #m = self.rx_can_message_queue.get(timeout=timeout)
             rx_pdu = self.queue.get(timeout=timeout)
-            logger.info('J1939 Bus recv() successful QQ=%s, pdu:%s' % (self.queue, rx_pdu))
+            if profiling.enabled:
+                profiling.consumed(rx_pdu)
+            if trace.enabled:
+                trace.emit("bus.recv", pdu=rx_pdu)
             return rx_pdu
 
         except Empty:
-            logger.debug('J1939 Bus recv() timed out' % ())
+            if trace.enabled:
+                trace.emit("bus.recv", pdu=None, timeout=timeout)
             return None
 
         # TODO: Decide what to do with CAN errors
@@ -263,147 +548,95 @@ class Bus(BusABC):
         #                  listener.on_error_received(rx_error)
 
     def send(self, msg, timeout=None):
-        logger.info("j1939.send: msg={}".format(msg))
-        messages = []
+        if trace.enabled:
+            trace.emit("bus.send", pdu=msg)
+        if msg.pgn == PGN_AC_ADDRESS_CLAIMED:
+            # one of our nodes is (re)claiming an address
+            self._rebuild_dispatch_index()
         if len(msg.data) > 8:
-            logger.info("j1939.send: message is > than 8 bytes")
-            # Making a copy of the PDU so that the original
-            # is not altered by the data padding.
-            pdu = copy.deepcopy(msg)
-            pdu.data = bytearray(pdu.data)
-
-            logger.info("j1939.send: Copied msg = {}".format(pdu))
-            pdu_length_lsb, pdu_length_msb = divmod(len(pdu.data), 256)
-
-            while len(pdu.data) % 7 != 0:
-                pdu.data += b'\xFF'
-
-            logger.info("j1939.send: padded msg (mod 7) = %s" % pdu)
-            logger.info("MIL8:---------------------")
+            # Pad to a whole number of 7 byte TP.DT packets in one step and
+            # slice the packets out of a memoryview; the caller's PDU is not
+            # modified.
+            data = bytes(msg.data)
+            total_size = len(data)
+            data += b'\xFF' * (-total_size % 7)
+            view = memoryview(data)
+            num_packets = len(data) // 7
+
+            arbitration_id = msg.arbitration_id
+            source_address = arbitration_id.source_address
+            pgn = arbitration_id.pgn
+            if pgn.is_destination_specific and \
+               arbitration_id.destination_address not in (None, DESTINATION_ADDRESS_GLOBAL):
+                destination_address = arbitration_id.destination_address
+                pgn_value = pgn.value & 0x3FF00
+            else:
+                destination_address = DESTINATION_ADDRESS_GLOBAL
+                pgn_value = pgn.value & 0x3FF00 if pgn.is_destination_specific else pgn.value
 
             # 
             # segment the longer message into 7 byte segments.  We need to prefix each 
             # data[0] with a sequence number for the transfer
             #
-            for i, segment in enumerate(pdu.data_segments(segment_length=7)):
-                arbitration_id = copy.deepcopy(pdu.arbitration_id)
-                arbitration_id.pgn.value = PGN_TP_DATA_TRANSFER
-
-                logger.info("MIL8: j1939.send: i=%d, pdu.arbitration_id.pgn.is_destination_specific=%d, data=%s" % 
-                            (i,pdu.arbitration_id.pgn.is_destination_specific, segment))
-
-                if pdu.arbitration_id.pgn.is_destination_specific and \
-                   pdu.arbitration_id.destination_address != DESTINATION_ADDRESS_GLOBAL:
-
-                    arbitration_id.pgn.pdu_specific = pdu.arbitration_id.pgn.pdu_specific
+            dt_can_id = ArbitrationID(priority=arbitration_id.priority, pgn=PGN_TP_DATA_TRANSFER,
+                                      source_address=source_address,
+                                      destination_address=destination_address).can_id
+            messages = [Message(arbitration_id=dt_can_id,
+                                is_extended_id=True,
+                                dlc=8,
+                                data=bytearray((i + 1,)) + view[i * 7:i * 7 + 7])
+                        for i in range(num_packets)]
+
+            cm_data = [CM_MSG_TYPE_BAM if destination_address == DESTINATION_ADDRESS_GLOBAL else CM_MSG_TYPE_RTS,
+                       total_size & 0xFF,
+                       total_size >> 8,
+                       num_packets,
+                       0xFF,
+                       pgn_value & 0xFF,
+                       (pgn_value >> 8) & 0xFF,
+                       (pgn_value >> 16) & 0xFF]
+            cm_msg = Message(is_extended_id=True,
+                             arbitration_id=ArbitrationID(pgn=PGN_TP_CONNECTION_MANAGEMENT,
+                                                          source_address=source_address,
+                                                          destination_address=destination_address).can_id,
+                             data=cm_data,
+                             dlc=8)
+
+            if destination_address != DESTINATION_ADDRESS_GLOBAL:
+                if source_address in self._incomplete_transmitted_pdus:
+                    if destination_address in self._incomplete_transmitted_pdus[source_address]:
+                        logger.warning("Duplicate transmission of PDU:\n%s", msg)
                 else:
-                    arbitration_id.pgn.pdu_specific = DESTINATION_ADDRESS_GLOBAL
-                    arbitration_id.destination_address = DESTINATION_ADDRESS_GLOBAL
+                    self._incomplete_transmitted_pdus[source_address] = {}
 
-                logger.info("MIL8: j1939.send: segment=%d, arb = %s" % (i, arbitration_id))
-                message = Message(arbitration_id=arbitration_id.can_id,
-                                  is_extended_id=True,
-                                  dlc=(len(segment) + 1),
-                                  data=(bytearray([i + 1]) + segment))
-                messages.append(message)
+                # append the messages to the 'incomplete' list, they go out
+                # when the receiver sends its CTS
+                self._incomplete_transmitted_pdus[source_address][destination_address] = messages
 
-            #
-            # At this point we have the queued messages sequenced in 'messages'
-            #
-            logger.info("MIL8: j1939.send: is_destination_specific={}, destAddr={}".format(pdu.arbitration_id.pgn.is_destination_specific, pdu.arbitration_id.destination_address))
-            logger.info("MIL8: j1939.send: messages=%s" % messages)
-           
-            if pdu.arbitration_id.pgn.is_destination_specific and \
-               pdu.arbitration_id.destination_address != DESTINATION_ADDRESS_GLOBAL:
-
-                destination_address = pdu.arbitration_id.pgn.pdu_specific
-
-                if pdu.arbitration_id.source_address in self._incomplete_transmitted_pdus:
-                    if destination_address in self._incomplete_transmitted_pdus[pdu.arbitration_id.source_address]:
-                        logger.warning("Duplicate transmission of PDU:\n{}".format(pdu))
-                else:
-                    self._incomplete_transmitted_pdus[pdu.arbitration_id.source_address] = {}
-
-                # append the messages to the 'incomplete' list
-                self._incomplete_transmitted_pdus[pdu.arbitration_id.source_address][destination_address] = messages
-
-            else:
-                destination_address = DESTINATION_ADDRESS_GLOBAL
-
-            logger.debug("MIL8: rts arbitration id: src=%s, dest=%s" % (pdu.source, destination_address))
-            rts_arbitration_id = ArbitrationID(pgn=PGN_TP_CONNECTION_MANAGEMENT, source_address=pdu.source, destination_address=destination_address)
-            rts_arbitration_id.pgn.pdu_specific = pdu.arbitration_id.pgn.pdu_specific
-
-            temp_pgn = copy.deepcopy(pdu.arbitration_id.pgn)
-            if temp_pgn.is_destination_specific:
-                temp_pgn.value -= temp_pgn.pdu_specific
-
-            pgn_msb = ((temp_pgn.value & 0xFF0000) >> 16)
-            pgn_middle = ((temp_pgn.value & 0x00FF00) >> 8)
-            pgn_lsb = (temp_pgn.value & 0x0000FF)
-
-            if pdu.arbitration_id.pgn.is_destination_specific and \
-               pdu.arbitration_id.destination_address != DESTINATION_ADDRESS_GLOBAL:
                 # send request to send
-                logger.debug("MIL8: rts to specific dest: src=%s, dest=%s" % (pdu.source, destination_address))
-                rts_msg = Message(is_extended_id=True,
-                                  arbitration_id=rts_arbitration_id.can_id,
-                                  data=[CM_MSG_TYPE_RTS,
-                                        pdu_length_msb,
-                                        pdu_length_lsb,
-                                        len(messages),
-                                        0xFF,
-                                        pgn_lsb,
-                                        pgn_middle,
-                                        pgn_msb],
-                                  dlc=8)
+                if self._metrics is not None:
+                    self._metrics.sent(cm_msg.arbitration_id)
                 try:
-                    logger.info("MIL08: j1939.send: sending TP.RTS to %s: %s" % (destination_address, rts_msg))
-                    self.can_bus.send(rts_msg)
+                    self.can_bus.send(cm_msg)
                 except CanError:
                     if self._ignore_can_send_error:
                         pass
                     raise
             else:
-                rts_arbitration_id.pgn.pdu_specific = DESTINATION_ADDRESS_GLOBAL
-                rts_arbitration_id.destination_address = DESTINATION_ADDRESS_GLOBAL
-                logger.debug("MIL8: rts to Global dest: src=%s, dest=%s" % (pdu.source, destination_address))
-                bam_msg = Message(is_extended_id=True,
-                                  arbitration_id=rts_arbitration_id.can_id | pdu.source,
-                                  data=[CM_MSG_TYPE_BAM,
-                                        pdu_length_msb,
-                                        pdu_length_lsb, len(messages),
-                                        0xFF,
-                                        pgn_lsb,
-                                        pgn_middle,
-                                        pgn_msb],
-                                  dlc=8)
-                bam_msg.destination_address = DESTINATION_ADDRESS_GLOBAL
-                # bam_msg.arbitration_id.destination_address = DESTINATION_ADDRESS_GLOBAL
-                # send BAM
-                try:
-                    logger.info("j1939.send: sending TP.BAM to %s: %s" % (destination_address, bam_msg))
-                    self.can_bus.send(bam_msg)
-                    time.sleep(0.05)
-                except CanError:
-                    if self._ignore_can_send_error:
-                        pass
-                    raise
-
-                for message in messages:
-                    # send data messages - no flow control, so no need to wait
-                    # for receiving devices to acknowledge
-                    logger.info("j1939.send: queue TP.BAM data to %s: %s" % (destination_address, message))
-                    self._long_message_segment_queue.put_nowait(message)
+                # BAM - no flow control, the scheduler paces the announce
+                # and data packets
+                self._tx_scheduler.submit(source_address, [cm_msg] + messages)
         else:
             msg.display_radix = 'hex'
-            logger.debug("j1939.send: calling can_bus_send: j1939-msg: {}, arb-id: {:08x}".format(msg, msg.arbitration_id.can_id))
             can_message = Message(arbitration_id=msg.arbitration_id.can_id,
                                   is_extended_id=True,
                                   dlc=len(msg.data),
                                   data=msg.data)
 
-            logger.debug("j1939.send: calling can_bus_send: can-msg: {}".format(can_message))
+            if trace.enabled:
+                trace.emit("bus.tx", can_id=can_message.arbitration_id, data=bytes(can_message.data))
+            if self._metrics is not None:
+                self._metrics.sent(can_message.arbitration_id)
             try:
                 self.can_bus.send(can_message)
             except CanError:
@@ -411,8 +644,35 @@ class Bus(BusABC):
                     pass
                 raise
 
+    def _run_timers(self, now):
+        """
+        Reactor mode: send the BAM frames that are due and drop timed out
+        TP sessions.
+
+        :return: The monotonic time of the next deadline, or None.
+        """
+        deadline = self._tx_scheduler.run_due(now)
+        expiry = self._tp_sessions.next_expiry()
+        if expiry is not None and expiry < now:
+            self._tp_sessions.expire(now)
+            expiry = self._tp_sessions.next_expiry()
+        if expiry is not None and (deadline is None or expiry < deadline):
+            deadline = expiry
+        return deadline
+
     def shutdown(self):
-        self.can_notifier._running = False
+        if self._reactor is not None:
+            if self._own_reactor:
+                self._reactor.stop()
+            else:
+                self._reactor.remove(self)
+        else:
+            self.can_notifier._running = False
+        self._tx_scheduler.stop()
+        self._correlator.cancel_all()
+        if self._loop is not None:
+            # unregister the interface's file descriptor from the event loop
+            self.can_notifier.stop(timeout=0)
         self.can_bus.shutdown()
         #self.j1939_notifier.running.clear()
         super(Bus, self).shutdown()
@@ -452,41 +712,33 @@ class Bus(BusABC):
 
         return None
 
-    def _process_incoming_message(self, msg):
-        logger.info("PI01: Processing incoming message: instance={}, msg=  {}".format(self, msg))
-        arbitration_id = ArbitrationID()
-        arbitration_id.can_id = msg.arbitration_id
-        if arbitration_id.pgn.is_destination_specific:
-            arbitration_id.pgn.value -= arbitration_id.pgn.pdu_specific
-
-        pdu = self._pdu_type(timestamp=msg.timestamp, data=msg.data, info_strings=[])
-        pdu.arbitration_id.can_id = msg.arbitration_id
-        pdu.info_strings = []
+    def _process_frame(self, arbitration_id, data, timestamp):
+        pgn_value = arbitration_id.pgn_value
+        if arbitration_id.is_destination_specific:
+            pgn_value -= arbitration_id.pdu_specific
+
+        if data.__class__ is memoryview:
+            # a view into an ingested buffer, the PDU needs its own bytes
+            data = bytearray(data)
+        pdu = self._pdu_type(timestamp=timestamp,
+                             arbitration_id=ArbitrationID.from_decoded(arbitration_id),
+                             data=data)
         pdu.radix = 16
 
-        logger.debug("PI02a: arbitration_id.pgn.value = 0x{:04x} ({})".format(arbitration_id.pgn.value, arbitration_id.pgn.value))
-        logger.debug("PI02b: PGN_TP_SEED_REQUEST = {}".format(PGN_TP_SEED_REQUEST)) 
-
-        logger.debug("PI02c: self._key_generation_fcn = {}".format(self._key_generation_fcn)) 
-
-        if arbitration_id.pgn.value == PGN_TP_CONNECTION_MANAGEMENT:
-            logger.info("PGN_TP_CONNECTION_MANAGEMENT")
+        if pgn_value == PGN_TP_CONNECTION_MANAGEMENT:
             retval = self._connection_management_handler(pdu)
-        elif arbitration_id.pgn.value == PGN_TP_DATA_TRANSFER:
-            logger.info("PGN_TP_DATA_TRANSFER")
+        elif pgn_value == PGN_TP_DATA_TRANSFER:
             retval = self._data_transfer_handler(pdu)
-        elif (arbitration_id.pgn.value == PGN_TP_SEED_REQUEST) and (self._key_generation_fcn is not None):
-            logger.info("PGN_TP_SEED_REQUEST")
+        elif (pgn_value == PGN_TP_SEED_REQUEST) and (self._key_generation_fcn is not None):
             retval = self._send_key_response(pdu)
         else:
-            logger.info("PGN_PDU generic")
             retval = pdu
 
-        logger.info("_process_incoming_message: returning %s" % (retval))
+        if trace.enabled:
+            trace.emit("bus.process", pgn=pgn_value, pdu=pdu, result=retval)
         return retval
 
     def _connection_management_handler(self, msg):
-        logger.debug("MP00: _connection_management_handler: %s, cmd=%s" % (msg, msg.data[0]))
         if len(msg.data) == 0:
             msg.info_strings.append("Invalid connection management message - no data bytes")
             return msg
@@ -504,193 +756,99 @@ class Bus(BusABC):
         elif cmd == CM_MSG_TYPE_ABORT:
             retval = self._process_abort(msg)
 
-        logger.debug("_connection_management_handler: returning %s" % (retval))
         return retval
 
+    def _is_local_address(self, address):
+        """True if one of the connected Nodes owns ``address``."""
+        return address in self._address_index
+
+    def _send_connection_management(self, source, destination, data):
+        arbitration_id = ArbitrationID(pgn=PGN_TP_CONNECTION_MANAGEMENT, source_address=source,
+                                       destination_address=destination)
+        can_message = Message(arbitration_id=arbitration_id.can_id, is_extended_id=True, dlc=8, data=data)
+        if self._metrics is not None:
+            self._metrics.sent(can_message.arbitration_id)
+        try:
+            self.can_bus.send(can_message)
+        except CanError:
+            if not self._ignore_can_send_error:
+                raise
+
+    def _send_cts(self, session):
+        # clear to send the next window, restarting at the first missing packet
+        count, next_packet = session.open_window()
+        self._send_connection_management(session.destination, session.source,
+                                         [CM_MSG_TYPE_CTS, count, next_packet, 0xFF, 0xFF,
+                                          session.pgn & 0xFF, (session.pgn >> 8) & 0xFF, (session.pgn >> 16) & 0xFF])
+
+    def _send_eom_ack(self, session):
+        self._send_connection_management(session.destination, session.source,
+                                         [CM_MSG_TYPE_EOM_ACK,
+                                          session.total_size & 0xFF, session.total_size >> 8,
+                                          session.num_packets, 0xFF,
+                                          session.pgn & 0xFF, (session.pgn >> 8) & 0xFF, (session.pgn >> 16) & 0xFF])
+
     def _data_transfer_handler(self, msg):
-        logger.debug("_data_transfer_handler:")
-        msg_source = msg.arbitration_id.source_address
-        pdu_specific = msg.arbitration_id.pgn.pdu_specific
-
-        if msg_source in self._incomplete_received_pdus:
-
-            logger.debug("in self._incomplete_received_pdus:")
-            if pdu_specific in self._incomplete_received_pdus[msg_source]:
-                logger.debug("in self._incomplete_received_pdus[msg_source]:")
-                self._incomplete_received_pdus[msg_source][pdu_specific].data.extend(msg.data[1:])
-                total = self._incomplete_received_pdu_lengths[msg_source][pdu_specific]["total"]
-                if len(self._incomplete_received_pdus[msg_source][pdu_specific].data) >= total:
-                    logger.debug("allReceived: %s" % type(self._incomplete_received_pdus[msg_source]))
-                    logger.debug("allReceived: %s" % pprint.pformat(self._incomplete_received_pdus[msg_source]))
-                    logger.debug("allReceived: %s from 0x%x" % (type(self._incomplete_received_pdus[msg_source][pdu_specific]), pdu_specific))
-                    logger.debug("allReceived: %s" % (self._incomplete_received_pdus[msg_source][pdu_specific]))
-                    if pdu_specific == DESTINATION_ADDRESS_GLOBAL:
-                        logger.debug("pdu_specific == DESTINATION_ADDRESS_GLOBAL")
-                        # Looks strange but makes sense - in the absence of explicit flow control,
-                        # the last CAN packet in a long message *is* the end of message acknowledgement
-                        return self._process_eom_ack(msg)
-
-                    # Find a Node object so we can search its list of known node addresses for this node
-                    # so we can find if we are responsible for sending the EOM ACK message
-                    # TODO: Was self.j1939_notifier.listeners
-
-                    send_ack = any(True for (_listener, l_notifier) in self.node_queue_list
-                            if isinstance(_listener, Node) and
-                                (_listener.address == pdu_specific or pdu_specific in _listener.address_list))
-
-                    #send_ack = any(True for l in self.can_notifier.listeners
-                    #               if isinstance(l, Node) and (l.address == pdu_specific or
-                    #                                           pdu_specific in l.address_list))
-                    if send_ack:
-                        arbitration_id = ArbitrationID()
-                        arbitration_id.pgn.value = PGN_TP_CONNECTION_MANAGEMENT
-                        arbitration_id.pgn.pdu_specific = msg_source
-                        arbitration_id.source_address = pdu_specific
-                        arbitration_id.destination_address = 0x17
-
-                        total_length = self._incomplete_received_pdu_lengths[msg_source][pdu_specific]["total"]
-                        _num_packages = self._incomplete_received_pdu_lengths[msg_source][pdu_specific]["num_packages"]
-                        pgn = self._incomplete_received_pdus[msg_source][pdu_specific].arbitration_id.pgn
-                        pgn_msb = ((pgn.value & 0xFF0000) >> 16)
-                        _pgn_middle = ((pgn.value & 0x00FF00) >> 8)
-                        _pgn_lsb = 0
-
-                        logger.debug("in send_ack: arbitration_id=[%s], can_id=[%x], destAdder=0x%0x" %
-                                (arbitration_id, int(arbitration_id.can_id), arbitration_id.destination_address))
-                        logger.debug("in send_ack: " %
-                                ())
-                        div, mod = divmod(total_length, 256)
-                        can_message = Message(arbitration_id=arbitration_id.can_id,
-                                              is_extended_id=True,
-                                              dlc=8,
-                                              data=[CM_MSG_TYPE_EOM_ACK,
-                                                    mod,  # total_length % 256,
-                                                    div,  # total_length / 256,
-                                                    _num_packages,
-                                                    0xFF,
-                                                    _pgn_lsb,
-                                                    _pgn_middle,
-                                                    pgn_msb])
-                        try:
-                            self.can_bus.send(can_message)
-                        except CanError:
-                            if self._ignore_can_send_error:
-                                pass
-                            raise
-
-                    logger.debug("_data_transfer_handler: returning %s" % (msg))
-                    return self._process_eom_ack(msg)
+        session = self._tp_sessions.get(msg.arbitration_id.source_address, msg.arbitration_id.pgn.pdu_specific)
+        if session is None:
+            return None
+
+        # sessions run on the monotonic clock, frame timestamps may be
+        # from anywhere (ingest, replay); the PDU keeps the frame's
+        if not session.add(msg.data, time.monotonic()):
+            return None
+
+        if not session.is_complete:
+            if session.flow_control and msg.data[0] >= session.window_end:
+                self._send_cts(session)
+            return None
+
+        self._tp_sessions.close(session)
+        if trace.enabled:
+            trace.emit("tp.complete", source=session.source, destination=session.destination, pgn=session.pgn,
+                       size=session.total_size, duplicates=session.duplicates, gaps=session.gaps)
+
+        if session.flow_control:
+            self._send_eom_ack(session)
+
+        pgn = PGN.from_value(session.pgn)
+        if pgn.is_destination_specific:
+            pgn.pdu_specific = session.destination
+        arbitration_id = ArbitrationID(pgn=pgn, source_address=session.source,
+                                       destination_address=session.destination)
+        # the session buffer is handed over as is, the session is gone
+        return self._pdu_type(timestamp=msg.timestamp, arbitration_id=arbitration_id, data=session.buffer)
 
     def _process_rts(self, msg):
-        logger.debug("process_rts, source=0x%x" % (msg.arbitration_id.source_address))
-        if msg.arbitration_id.source_address not in self._incomplete_received_pdus:
-            self._incomplete_received_pdus[msg.arbitration_id.source_address] = {}
-            self._incomplete_received_pdu_lengths[msg.arbitration_id.source_address] = {}
-
-        # Delete any previous messages that were not finished correctly
-        if msg.arbitration_id.pgn.pdu_specific in self._incomplete_received_pdus[msg.arbitration_id.source_address]:
-            del self._incomplete_received_pdus[msg.arbitration_id.source_address][msg.arbitration_id.pgn.pdu_specific]
-            del self._incomplete_received_pdu_lengths[msg.arbitration_id.source_address][
-                msg.arbitration_id.pgn.pdu_specific]
-
-        if msg.data[0] == CM_MSG_TYPE_BAM:
-            logger.debug("CM_MSG_TYPE_BAM")
-            self._incomplete_received_pdus[msg.arbitration_id.source_address][0xFF] = self._pdu_type()
-            self._incomplete_received_pdus[msg.arbitration_id.source_address][0xFF].arbitration_id.pgn.value = int(
-                ("%.2X%.2X%.2X" % (msg.data[7], msg.data[6], msg.data[5])), 16)
-            if self._incomplete_received_pdus[msg.arbitration_id.source_address][
-                    0xFF].arbitration_id.pgn.is_destination_specific:
-                self._incomplete_received_pdus[msg.arbitration_id.source_address][
-                    0xFF].arbitration_id.pgn.pdu_specific = msg.arbitration_id.pgn.pdu_specific
-            self._incomplete_received_pdus[msg.arbitration_id.source_address][
-                0xFF].arbitration_id.source_address = msg.arbitration_id.source_address
-            self._incomplete_received_pdus[msg.arbitration_id.source_address][0xFF].data = []
-            _message_size = int("%.2X%.2X" % (msg.data[2], msg.data[1]), 16)
-            self._incomplete_received_pdu_lengths[msg.arbitration_id.source_address][0xFF] = {"total": _message_size,
-                                                                                              "chunk": 255,
-                                                                                              "num_packages": msg.data[
-                                                                                                  3], }
-        else:
-            logger.debug("not CM_MSG_TYPE_BAM, source=0x%x" % (msg.arbitration_id.source_address))
-            self._incomplete_received_pdus[msg.arbitration_id.source_address][
-                msg.arbitration_id.pgn.pdu_specific] = self._pdu_type()
-            self._incomplete_received_pdus[msg.arbitration_id.source_address][
-                msg.arbitration_id.pgn.pdu_specific].arbitration_id.pgn.value = int(
-                ("%.2X%.2X%.2X" % (msg.data[7], msg.data[6], msg.data[5])), 16)
-            if self._incomplete_received_pdus[msg.arbitration_id.source_address][
-                    msg.arbitration_id.pgn.pdu_specific].arbitration_id.pgn.is_destination_specific:
-                self._incomplete_received_pdus[msg.arbitration_id.source_address][
-                    msg.arbitration_id.pgn.pdu_specific].arbitration_id.pgn.pdu_specific = msg.arbitration_id.pgn.pdu_specific
-            self._incomplete_received_pdus[msg.arbitration_id.source_address][
-                msg.arbitration_id.pgn.pdu_specific].arbitration_id.source_address = msg.arbitration_id.source_address
-            self._incomplete_received_pdus[msg.arbitration_id.source_address][
-                msg.arbitration_id.pgn.pdu_specific].data = []
-        _message_size = int("%.2X%.2X" % (msg.data[2], msg.data[1]), 16)
-        self._incomplete_received_pdu_lengths[msg.arbitration_id.source_address][
-            msg.arbitration_id.pgn.pdu_specific] = {"total": _message_size, "chunk": 255, "num_packages": msg.data[3], }
-
-        if msg.data[0] != CM_MSG_TYPE_BAM:
-            logger.debug("not CM_MSG_TYPE_BAM--2")
-            logger.debug("self.can_notifier.listeners = %s" % self.can_notifier.listeners)
-            logger.debug("self.node_queue_list = %s" % self.node_queue_list)
-
-            #for _listener in self.can_notifier.listeners:
-            for (_listener, l_notifier) in self.node_queue_list:
-                logger.debug("MIL2: _listner/l_notifier = %s/%s" % (_listener, l_notifier))
-                if isinstance(_listener, Node):
-                    logger.debug("6, dest=0x%x" % (msg.arbitration_id.source_address))
-                    # find a Node object so we can search its list of known node addresses
-                    # for this node - if we find it we are responsible for sending the CTS message
-                    logger.debug("MIL3: Node: %s" % (Node))
-                    logger.debug("MIL3: _listener.address: %s" % (_listener.address))
-                    logger.debug("MIL3: msg.arbitration_id.pgn.pdu_specific: %s" % (msg.arbitration_id.pgn.pdu_specific))
-                    logger.debug("MIL3: _listener.address_list: %s" % (_listener.address_list))
-                    if _listener.address == msg.arbitration_id.pgn.pdu_specific or \
-                            msg.arbitration_id.pgn.pdu_specific in _listener.address_list:
-                        _cts_arbitration_id = ArbitrationID(source_address=msg.arbitration_id.pgn.pdu_specific)
-                        _cts_arbitration_id.pgn.value = PGN_TP_CONNECTION_MANAGEMENT
-                        _cts_arbitration_id.pgn.pdu_specific = msg.arbitration_id.source_address
-                        _cts_arbitration_id.destination_address = msg.arbitration_id.source_address
-                        _data = [0x11, msg.data[4], 0x01, 0xFF, 0xFF]
-                        _data.extend(msg.data[5:])
-                        logger.debug("send CTS: AID: %s" % _cts_arbitration_id)
-                        cts_msg = Message(is_extended_id=True, arbitration_id=_cts_arbitration_id.can_id, data=_data,
-                                          dlc=8)
-
-                        # send clear to send
-                        logger.debug("send CTS: %s" % cts_msg)
-                        try:
-                            self.can_bus.send(cts_msg)
-                        except CanError:
-                            if self._ignore_can_send_error:
-                                pass
-                            raise
-                        return
+        source = msg.arbitration_id.source_address
+        destination = msg.arbitration_id.pgn.pdu_specific
+
+        if not self._queue_wants(destination) and len(msg.data) >= 8:
+            # nobody but possibly a subscription is listening, don't
+            # reassemble what no subscription wants
+            pgn = normalize_pgn(msg.data[5] | (msg.data[6] << 8) | (msg.data[7] << 16))
+            if not self._subscriptions.wants(pgn, source, destination) and \
+                    not self._correlator.wants(pgn, source):
+                return None
+
+        session = self._tp_sessions.open(source, destination, msg.data, time.monotonic())
+        reactor = self._reactor
+        if session is not None and reactor is not None and threading.current_thread() is not reactor.thread:
+            # opened by ingest() or notification() on another thread, the
+            # reactor may be sleeping without a deadline
+            reactor.wakeup()
+        if session is None or session.is_bam:
+            return None
 
-    """
-                    #
-                    # MIL: This is the wrong way around this, I should have a node assigned.
-                    #
-                    elif _listener is None and l_notifier is not None:
-                        logger.debug("7, dest=0x%x" % (msg.arbitration_id.source_address))
-                        # find a Node object so we can search its list of known node addresses
-                        # for this node - if we find it we are responsible for sending the CTS message
-                        if msg.arbitration_id.pgn.pdu_specific :
-                            _cts_arbitration_id = ArbitrationID(source_address=msg.arbitration_id.pgn.pdu_specific)
-                            _cts_arbitration_id.pgn.value = PGN_TP_CONNECTION_MANAGEMENT
-                            _cts_arbitration_id.pgn.pdu_specific = msg.arbitration_id.source_address
-                            _cts_arbitration_id.destination_address = msg.arbitration_id.source_address
-                            _data = [0x11, msg.data[4], 0x01, 0xFF, 0xFF]
-                            _data.extend(msg.data[5:])
-                            logger.debug("send CTS: AID: %s" % _cts_arbitration_id)
-                            cts_msg = Message(is_extended_id=True, arbitration_id=_cts_arbitration_id.can_id, data=_data,
-                                              dlc=8)
-
-                            # send clear to send
-                            logger.debug("send CTS: %s" % cts_msg)
-                            self.can_bus.send(cts_msg)
-                            return
-    """
+        if trace.enabled:
+            trace.emit("tp.rts", source=source, destination=destination, pgn=session.pgn, size=session.total_size)
+
+        # If one of our nodes owns the destination we are responsible for
+        # the flow control (CTS and EOM ACK messages) of this session
+        if self._is_local_address(destination):
+            session.flow_control = True
+            self._send_cts(session)
+        return None
 
     def _process_cts(self, msg):
         logger.debug("_process_cts")
@@ -712,6 +870,8 @@ class Bus(BusABC):
                     try:
                         # Shouldent send a J1939 PDU as a CAN Message unless we are careful
                         canMessage =  Message(arbitration_id=_msg.arbitration_id, data=_msg.data)
+                        if self._metrics is not None:
+                            self._metrics.sent(canMessage.arbitration_id)
                         self.can_bus.send(canMessage)
                     except CanError:
                         
@@ -721,77 +881,60 @@ class Bus(BusABC):
         logger.debug("MIL8:    _process_cts complete")
 
     def _process_eom_ack(self, msg):
-        logger.debug("_process_eom_ack")
-        if (msg.arbitration_id.pgn.value - msg.arbitration_id.pgn.pdu_specific) == PGN_TP_DATA_TRANSFER:
-            logger.debug("_process_eom_ack: PGN_TP_DATA_TRANSFER")
-            self._incomplete_received_pdus[msg.arbitration_id.source_address][
-                msg.arbitration_id.pgn.pdu_specific].timestamp = msg.timestamp
-            retval = copy.deepcopy(
-                self._incomplete_received_pdus[msg.arbitration_id.source_address][msg.arbitration_id.pgn.pdu_specific])
-            retval.data = retval.data[:self._incomplete_received_pdu_lengths[msg.arbitration_id.source_address][
-                msg.arbitration_id.pgn.pdu_specific]["total"]]
-            del self._incomplete_received_pdus[msg.arbitration_id.source_address][msg.arbitration_id.pgn.pdu_specific]
-            del self._incomplete_received_pdu_lengths[msg.arbitration_id.source_address][
-                msg.arbitration_id.pgn.pdu_specific]
-        else:
-            logger.debug("_process_eom_ack: not PGN_TP_DATA_TRANSFER")
-            if msg.arbitration_id.pgn.pdu_specific in self._incomplete_received_pdus:
-                if msg.arbitration_id.source_address in self._incomplete_received_pdus[
-                        msg.arbitration_id.pgn.pdu_specific]:
-                    self._incomplete_received_pdus[msg.arbitration_id.pgn.pdu_specific][
-                        msg.arbitration_id.source_address].timestamp = msg.timestamp
-                    retval = copy.deepcopy(self._incomplete_received_pdus[msg.arbitration_id.pgn.pdu_specific][
-                        msg.arbitration_id.source_address])
-                    retval.data = retval.data[:
-                                              self._incomplete_received_pdu_lengths[msg.arbitration_id.pgn.pdu_specific][
-                                                  msg.arbitration_id.source_address]["total"]]
-                    del self._incomplete_received_pdus[msg.arbitration_id.pgn.pdu_specific][
-                        msg.arbitration_id.source_address]
-                    del self._incomplete_received_pdu_lengths[msg.arbitration_id.pgn.pdu_specific][
-                        msg.arbitration_id.source_address]
-                else:
-                    retval = None
-            else:
-                retval = None
-            if msg.arbitration_id.pgn.pdu_specific in self._incomplete_transmitted_pdus:
-                if msg.arbitration_id.source_address in self._incomplete_transmitted_pdus[
-                        msg.arbitration_id.pgn.pdu_specific]:
-                    del self._incomplete_transmitted_pdus[msg.arbitration_id.pgn.pdu_specific][
-                        msg.arbitration_id.source_address]
-
-        logger.debug("_process_eom_ack: returning %s" % (retval))
-        return retval
+        # The receiver acknowledged one of our RTS/CTS transmissions
+        destination = msg.arbitration_id.pgn.pdu_specific
+        if destination in self._incomplete_transmitted_pdus:
+            self._incomplete_transmitted_pdus[destination].pop(msg.arbitration_id.source_address, None)
+        return None
 
     def _process_bam(self, msg):
-        self._process_rts(msg)
+        if trace.enabled:
+            trace.emit("tp.bam", source=msg.arbitration_id.source_address, data=bytes(msg.data))
+        return self._process_rts(msg)
 
     def _process_abort(self, msg):
-        if msg.arbitration_id.pgn.pdu_specific in self._incomplete_received_pdus:
-            if msg.source in self._incomplete_received_pdus[msg.arbitration_id.pgn.pdu_specific]:
-                del self._incomplete_received_pdus[msg.arbitration_id.pgn.pdu_specific][
-                    msg.arbitration_id.source_address]
-
-    def _throttler_function(self):
-        while self.can_notifier._running:
-            _msg = None
-            try:
-                _msg = self._long_message_segment_queue.get(timeout=0.1)
-            except Empty:
-                pass
-            if _msg is not None:
-                try:
-                    self.can_bus.send(_msg)
-                    time.sleep(0.05)
-                except CanError:
-                    if self._ignore_can_send_error:
-                        pass
-                    raise
+        # either end of a session may abort it
+        source = msg.arbitration_id.source_address
+        destination = msg.arbitration_id.pgn.pdu_specific
+        if not self._tp_sessions.abort(source, destination):
+            self._tp_sessions.abort(destination, source)
+        if destination in self._incomplete_transmitted_pdus:
+            self._incomplete_transmitted_pdus[destination].pop(source, None)
+        return None
+
+    def _send_tp_frame(self, message):
+        if self._metrics is not None:
+            self._metrics.sent(message.arbitration_id)
+        try:
+            self.can_bus.send(message)
+        except CanError:
+            if not self._ignore_can_send_error:
+                raise
+
+    @property
+    def metrics(self):
+        """The :class:`j1939.MetricsRegistry`, None unless created with ``metrics=True``."""
+        return self._metrics
+
+    @property
+    def filter_stats(self):
+        """Frames accepted and rejected by the j1939_filters, None without filters."""
+        return None if self._filter is None else self._filter.stats()
+
+    @property
+    def queue_stats(self):
+        """Depth, high-water mark and drops of the receive queue and each Node queue."""
+        stats = {"bus": self.queue.stats()}
+        for (node, l_notifier) in self.node_queue_list:
+            if node is not None and hasattr(l_notifier.queue, "stats"):
+                stats["node 0x%.2x" % node.address] = l_notifier.queue.stats()
+        return stats
 
     @property
     def transmissions_in_progress(self):
         retval = 0
         for _tx_address in self._incomplete_transmitted_pdus:
             retval += len(self._incomplete_transmitted_pdus[_tx_address])
-        for _rx_address in self._incomplete_received_pdus:
-            retval += len(self._incomplete_received_pdus[_rx_address])
+        retval += len(self._tp_sessions)
+        retval += len(self._tx_scheduler)
         return retval
@@ -1,14 +1,17 @@
 import logging
-import inspect
 
 
+from j1939 import trace
 from j1939.pgn import PGN
 from j1939.constants import *
+from j1939.decodecache import default_cache
 import logging
 logger = logging.getLogger("j1939")
 
 class ArbitrationID(object):
 
+    __slots__ = ("priority", "_pgn", "destination_address_value", "source_address")
+
     def __init__(self, priority=7, pgn=None, source_address=0, destination_address=None):
         """
         :param int priority:
@@ -28,8 +31,6 @@ class ArbitrationID(object):
         self.priority = priority
         self.destination_address_value = None
 
-        logger.debug("ArbitrationID:__init__: self._pgn=%s, type %s" % (pgn, type(pgn)))
-
         if pgn is None:
             self._pgn = PGN()
         elif pgn and isinstance(pgn, int):
@@ -42,7 +43,6 @@ class ArbitrationID(object):
 
         #self.pgn = pgn
 
-        logger.debug("ArbitrationID:__init__: self._pgn=%s, type %s" % (self._pgn, type(self._pgn)))
         if self._pgn:
             if self._pgn.is_destination_specific:
                 if destination_address is None:
@@ -51,8 +51,8 @@ class ArbitrationID(object):
                     if destination_address >= 0 and destination_address <= 255:
                         self.destination_address_value = destination_address
                         if  self.destination_address_value != self._pgn.pdu_specific:
-                                logger.debug("self._pgn=%s, self.destination_address_value = %x, pgn.pdu_specific = %x" %
-                                        (self._pgn, self.destination_address_value, self._pgn.pdu_specific))
+                                logger.debug("self._pgn=%s, self.destination_address_value = %x, pgn.pdu_specific = %x",
+                                        self._pgn, self.destination_address_value, self._pgn.pdu_specific)
 #                        assert( self.destination_address_value == pgn.pdu_specific)
                     else:
                         raise ValueError("destination address must be in range (0-255)")
@@ -61,54 +61,51 @@ class ArbitrationID(object):
 
     @property
     def can_id(self):
-        logger.info("{} property: self._pgn.is_destination_specific={}/pgn={}".format(inspect.stack()[0][3], self._pgn.is_destination_specific, self._pgn))
-
         if self._pgn.is_destination_specific:
-            logger.info("can_id: self._pgn.is_destination_specific, dest={}, pgn_value={}, pdu_format=0x{:04x}, pdu_specific=0x{:02x}, pri={}".format(
-                    self.destination_address_value,
-                    self._pgn.value,
-                    self._pgn.pdu_format,
-                    self._pgn.pdu_specific,
-                    self.priority))
-
             if self.destination_address_value:
-                logger.info("can_id: self.destination_address_value: pgn_value: {:04x}".format(self._pgn.value))
-                logger.info("         (self._pgn.value & 0x3ff00): {:04x}".format((self._pgn.value & 0x3ff00)))
-                logger.info("         (self.destination_address_value): {:04x}".format((self.destination_address_value)))
                 retval = (self.source_address +
                          ((self._pgn.value & 0x3ff00) + (self.destination_address_value) << 8) +
                          (self.priority << 26))
             else:
-                logger.info("can_id: NOT self.destination_address_value:")
                 retval = (self.source_address +
                          ((self._pgn.value & 0x3ff00) << 8)+
                          (self.priority << 26))
-
-            logger.info("can_id: retval=0x{:08x}".format(retval))
-            return retval
         else:
-            logger.info("can_id: NOT! self._pgn.is_destination_specific")
-            return (self.source_address + (self._pgn.value << 8) + (self.priority << 26))
+            retval = (self.source_address + (self._pgn.value << 8) + (self.priority << 26))
+
+        if trace.enabled:
+            trace.emit("arbitration_id.can_id", can_id=retval, priority=self.priority,
+                       pgn=self._pgn.value, destination_address=self.destination_address_value,
+                       source_address=self.source_address)
+        return retval
 
     @can_id.setter
     def can_id(self, canid):
         """
         Int between 0 and (2**29) - 1
         """
-        logger.info("{} setter: canid=0x{:08x}".format(inspect.stack()[0][3], canid))
-        self.priority = (canid & 0x1C000000) >> 26
-        self._pgn = PGN().from_can_id(canid)
-        self.source_address = canid & 0x000000FF
-        if self._pgn.is_destination_specific:
-            self.destination_address_value = (canid & 0x0000FF00) >> 8
-
+        decoded = default_cache.lookup(canid)
+        if trace.enabled:
+            trace.emit("arbitration_id.set_can_id", decoded=decoded)
+        self._apply_decoded(decoded)
+
+    def _apply_decoded(self, decoded):
+        self.priority = decoded.priority
+        self._pgn = PGN.from_value(decoded.pgn_value)
+        self.source_address = decoded.source_address
+        if decoded.is_destination_specific:
+            self.destination_address_value = decoded.destination_address
+
+    @staticmethod
+    def from_decoded(decoded):
+        """
+        Build an ArbitrationID from a :class:`j1939.decodecache.DecodedArbitrationID`
+        without decoding the CAN ID again.
+        """
+        arbitration_id = ArbitrationID()
+        arbitration_id._apply_decoded(decoded)
+        return arbitration_id
 
-        logger.info("{} setter: canid=0x{:08x}, priority={:x}, pdu_format={:x}, pdu_specific={:x}, src={:x}".format(inspect.stack()[0][3],
-                canid,
-                self.priority,
-                self._pgn.pdu_format,
-                self._pgn.pdu_specific,
-                self.source_address))
     @property
     def destination_address(self):
         if self._pgn.is_destination_specific:
@@ -138,9 +135,6 @@ class ArbitrationID(object):
             self._pgn = other
 
     def __str__(self):
-        logger.debug("arbitrationid.__str__: ids:%d, pri:%s, pgn:%s, dest:%s, src:%s, ids:%d" %
-                (self._pgn.is_destination_specific, self.priority, self._pgn, self.destination_address_value, self.source_address, self._pgn.is_destination_specific))
-
         if self._pgn.is_destination_specific:
             if self.destination_address_value is not None:
                 retval = "PRI=%d PGN=%6s DST=0x%.2x SRC=0x%.2x" % (
@@ -0,0 +1,203 @@
+import asyncio
+import logging
+
+import j1939
+from j1939.constants import *
+from j1939.memory import MemoryAccessError, DM15_PROCEED, DM15_BUSY, DM15_COMPLETED, _key_request
+from j1939.receivequeue import OVERFLOW_DROP_NEWEST
+from j1939.utils import _request_pdu, _dm14_pdu, DM14_READ, decode_mem_object
+
+logger = logging.getLogger("j1939")
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class _LoopQueue(object):
+    """
+    Stands in for :attr:`j1939.Bus.queue` and hands every received PDU to
+    an :class:`AsyncBus` on its event loop.  The PDUs are taken from
+    there, :meth:`j1939.Bus.recv` of the wrapped bus raises.
+    """
+
+    def __init__(self, async_bus):
+        self._async_bus = async_bus
+
+    def put(self, pdu, block=True, timeout=None):
+        async_bus = self._async_bus
+        if _running_loop() is async_bus.loop:
+            async_bus._on_pdu(pdu)
+        else:
+            async_bus.loop.call_soon_threadsafe(async_bus._on_pdu, pdu)
+
+    def get(self, block=True, timeout=None):
+        raise RuntimeError("the bus delivers its PDUs to an AsyncBus, await AsyncBus.recv() instead")
+
+    def qsize(self):
+        return self._async_bus._queue.qsize()
+
+    def stats(self):
+        async_bus = self._async_bus
+        return {"depth": async_bus._queue.qsize(), "high_water": async_bus.high_water,
+                "dropped": async_bus.dropped, "maxsize": async_bus._queue.maxsize,
+                "policy": OVERFLOW_DROP_NEWEST}
+
+
+class AsyncBus(object):
+    """
+    asyncio front end to a :class:`j1939.Bus`::
+
+        bus = j1939.AsyncBus(channel='can0', bustype='socketcan')
+        value = await bus.request_pgn(0xFEDA, dest=0x17)
+        async for pdu in bus:
+            ...
+
+    The receive path runs on the event loop: python-can watches the
+    interface's file descriptor from the loop where the interface has one,
+    otherwise its receive thread hands each message over to the loop.
+    Outstanding requests are futures completed by the bus's request
+    correlator (see :meth:`j1939.Bus.expect`), not threads.
+
+    :param j1939.Bus bus:
+        An existing bus to wrap, otherwise one is created from ``kwargs``.
+    :param asyncio.AbstractEventLoop loop:
+        Defaults to the running event loop; required when the bus is
+        created outside a coroutine.
+    :param int maxsize:
+        Bound of the receive queue, 0 for unbounded.  When it is full new
+        PDUs are dropped and counted in :attr:`dropped`.
+    """
+
+    def __init__(self, bus=None, loop=None, maxsize=0, **kwargs):
+        if loop is None:
+            loop = _running_loop()
+            if loop is None:
+                raise RuntimeError("no running event loop, pass loop=")
+        self.loop = loop
+        if bus is None:
+            bus = j1939.Bus(loop=loop, **kwargs)
+        self.bus = bus
+        self.dropped = 0
+        self.high_water = 0
+        self._queue = asyncio.Queue(maxsize)
+        self._closed = False
+        bus.queue = _LoopQueue(self)
+
+    def _on_pdu(self, pdu):
+        try:
+            self._queue.put_nowait(pdu)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return
+        depth = self._queue.qsize()
+        if depth > self.high_water:
+            self.high_water = depth
+
+    def expect(self, pgn, source=None, predicate=None):
+        """
+        Future for the next PDU with ``pgn`` (or an Acknowledgement naming
+        ``pgn``) from ``source``; None matches any source.  Register before
+        sending the request so a fast response can't be missed.
+        Cancelling it withdraws the request from the bus.
+        """
+        return asyncio.wrap_future(self.bus.expect(pgn, source, predicate), loop=self.loop)
+
+    async def send(self, pdu):
+        if len(pdu.data) > 8:
+            # transport protocol sends may pace their packets
+            await self.loop.run_in_executor(None, self.bus.send, pdu)
+        else:
+            self.bus.send(pdu)
+
+    async def recv(self, timeout=None):
+        """Next received PDU, or None after ``timeout`` seconds."""
+        try:
+            pdu = await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        return pdu
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        pdu = await self._queue.get()
+        if pdu is None:
+            raise StopAsyncIteration
+        return pdu
+
+    async def request_pgn(self, requested_pgn, src=0, dest=0x17, timeout=10):
+        """Awaitable :func:`j1939.utils.request_pgn`."""
+        if not isinstance(requested_pgn, int):
+            raise ValueError("pgn must be an integer.")
+        future = self.expect(requested_pgn, None if dest == DESTINATION_ADDRESS_GLOBAL else dest)
+        await self.send(_request_pdu(requested_pgn, src, dest))
+        try:
+            pdu = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise IOError(" no CAN response")
+        return list(pdu.data)
+
+    async def get_mem_object(self, pointer, extension, length=4, src=0, dest=0x17, timeout=10):
+        """
+        Awaitable :func:`j1939.utils.get_mem_object`.
+
+        Raises :class:`j1939.memory.MemoryAccessError` as soon as the ECU
+        answers with a DM15 other than proceed or completed.  A seed is
+        answered once with the bus's ``keygen``, as
+        :class:`j1939.memory.MemoryAccess` does.
+        """
+        deadline = self.loop.time() + timeout
+        is_dm15 = lambda pdu: pdu.pgn == PGN_DM15_MEMORY_ACCESS_RESPONSE
+        transfer = self.expect(PGN_DM16_BINARY_DATA_TRANSFER, dest,
+                               lambda pdu: pdu.pgn == PGN_DM16_BINARY_DATA_TRANSFER)
+        response = self.expect(PGN_DM15_MEMORY_ACCESS_RESPONSE, dest, is_dm15)
+        request = _dm14_pdu(pointer, extension, length, DM14_READ, src, dest)
+        keygen = self.bus._key_generation_fcn
+        keyed = False
+        try:
+            await self.send(request)
+            while True:
+                done, _ = await asyncio.wait((transfer, response), timeout=max(0, deadline - self.loop.time()),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if transfer in done:
+                    return decode_mem_object(transfer.result().data)
+                if not done:
+                    raise IOError(" no CAN response")
+                data = response.result().data
+                if len(data) < 8:
+                    raise MemoryAccessError("malformed DM15 %s" % list(data))
+                status = (data[1] >> 1) & 7
+                if status not in (DM15_PROCEED, DM15_COMPLETED):
+                    error_code = data[2] | (data[3] << 8) | (data[4] << 16)
+                    reason = "busy" if status == DM15_BUSY else "rejected"
+                    raise MemoryAccessError("%s, error indicator 0x%.6x" % (reason, error_code), status, error_code)
+                response = self.expect(PGN_DM15_MEMORY_ACCESS_RESPONSE, dest, is_dm15)
+                if status == DM15_PROCEED and (data[6] != 0xFF or data[7] != 0xFF):
+                    seed = data[6] | (data[7] << 8)
+                    if keygen is None or keyed:
+                        raise MemoryAccessError(
+                            "ECU asks for a seed/key exchange" if keygen is None else "key not accepted",
+                            status, seed)
+                    # the ECU proceeds again once it has the key
+                    keyed = True
+                    await self.send(_key_request(request, seed, keygen))
+                # else the DM16 follows
+        finally:
+            transfer.cancel()
+            response.cancel()
+
+    def shutdown(self):
+        if self._closed:
+            return
+        self._closed = True
+        # cancels the outstanding requests
+        self.bus.shutdown()
+        # wake up any "async for" consumer, room made on a full queue
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
@@ -0,0 +1,60 @@
+"""
+Vectorized decoding of J1939 headers for offline analysis.
+
+Requires numpy, which is an optional dependency of python-j1939
+(``pip install python-j1939[numpy]``).
+"""
+
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+#: Value used in the ``destination`` array for PDU2 (broadcast) PGNs, where
+#: the object path reports ``None``.
+NO_DESTINATION = -1
+
+DecodedHeaders = namedtuple("DecodedHeaders", [
+    "priority",                 # uint8
+    "pgn",                      # uint32, PDU1 destination stripped like PDU.pgn
+    "source",                   # uint8
+    "destination",              # int16, NO_DESTINATION for PDU2
+    "is_destination_specific",  # bool
+])
+
+
+def decode_can_ids(can_ids):
+    """
+    Decode an array of 29-bit CAN identifiers in one pass.
+
+    Applies the same rules as :class:`j1939.ArbitrationID` and
+    :attr:`j1939.PDU.pgn`: a PGN is destination specific (PDU1) when its
+    pdu_format is below 240 or the reserved bit is set, and then its
+    pdu_specific byte is the destination address and is stripped from
+    the PGN together with the data page and reserved bits.
+
+    :param can_ids:
+        Anything :func:`numpy.asarray` accepts, holding integer CAN IDs.
+
+    :return: A :class:`DecodedHeaders` of arrays, each the length of ``can_ids``.
+    """
+    if np is None:
+        raise ImportError("j1939.batch requires numpy")
+
+    ids = np.asarray(can_ids).astype(np.uint32, copy=False)
+
+    pgn_value = (ids >> 8) & 0x3FFFF
+    is_destination_specific = (pgn_value & 0xFF00) < 0xF000
+    is_destination_specific |= (pgn_value & 0x20000) != 0
+
+    pgn = np.where(is_destination_specific, pgn_value & 0xFF00, pgn_value)
+    destination = np.where(is_destination_specific, pgn_value & 0xFF, NO_DESTINATION).astype(np.int16)
+
+    return DecodedHeaders(
+        ((ids >> 26) & 0x07).astype(np.uint8),
+        pgn.astype(np.uint32, copy=False),
+        (ids & 0xFF).astype(np.uint8),
+        destination,
+        is_destination_specific)
@@ -0,0 +1,59 @@
+"""
+Packed Linux ``struct can_frame`` records, the form classic CAN frames
+take on a raw SocketCAN socket (and in many capture tools and shared
+memory rings)::
+
+    can_id   uint32   identifier, with the CAN_*_FLAG bits above bit 28
+    len      uint8    data length
+    pad, res0, res1
+    data     8 bytes
+
+in host byte order, 16 bytes per frame.  :meth:`j1939.Bus.ingest` runs a
+buffer of them through the receive path without building a
+:class:`can.Message` per frame; :func:`pack_can_frames` builds such a
+buffer, e.g. for tests and benchmarks.
+"""
+
+import struct
+
+from j1939.capture import CAN_EFF_FLAG, CAN_RTR_FLAG, CAN_ERR_FLAG, CAN_ID_MASK
+
+CAN_FRAME = struct.Struct("=IB3x8s")
+CAN_FRAME_SIZE = CAN_FRAME.size
+
+_PADDING = b"\x00" * 8
+
+
+def pack_can_frames(frames):
+    """
+    Pack ``(can_id, data)`` pairs into a buffer of can_frame records.
+
+    IDs above 0x7FF get the extended frame flag unless they already carry
+    flag bits.
+
+    :return: A bytearray of ``len(frames) * CAN_FRAME_SIZE`` bytes.
+    """
+    buffer = bytearray()
+    for can_id, data in frames:
+        data = bytes(data)
+        if len(data) > 8:
+            raise ValueError("A can_frame carries at most 8 bytes, not %d" % len(data))
+        if can_id > 0x7FF and not can_id & ~CAN_ID_MASK:
+            can_id |= CAN_EFF_FLAG
+        buffer += CAN_FRAME.pack(can_id, len(data), data + _PADDING[len(data):])
+    return buffer
+
+
+def can_frame_views(buffer):
+    """
+    The byte view of ``buffer`` and, over the same memory, a view of it as
+    uint32 words; record ``i``'s can_id is word ``4 * i``, its length byte
+    ``16 * i + 4`` and its data starts at byte ``16 * i + 8``.
+    """
+    view = memoryview(buffer)
+    if view.format != "B" or view.ndim != 1:
+        view = view.cast("B")
+    if len(view) % CAN_FRAME_SIZE:
+        raise ValueError("%d bytes is not a whole number of %d byte can_frame records"
+                         % (len(view), CAN_FRAME_SIZE))
+    return view, view.cast("I")
@@ -0,0 +1,275 @@
+"""
+Compact binary recording of raw CAN frames.
+
+A capture file is a header followed by blocks of fixed size frame records::
+
+    header  "<8sBBHd"   magic, version, flags, record size, reserved float
+    block   "<BxHId"    flags (bit 0: zlib), record count, stored length,
+                        timestamp of the block's first frame
+    record  "<IIB8s"    microseconds since the previous frame of the block,
+                        CAN ID with the flag bits below, DLC, data padded to 8
+
+Timestamps are delta encoded against an absolute timestamp per block, so
+every block decodes on its own and rounding never accumulates across
+blocks.  A capture is written by :class:`CaptureWriter`, usually attached
+as a listener to a python-can notifier, and read back through a memory
+map by :class:`CaptureReader`; :func:`replay` feeds it into
+:meth:`j1939.Bus.notification`.
+"""
+
+import logging
+import mmap
+import struct
+import time
+import weakref
+import zlib
+
+import can
+
+logger = logging.getLogger("j1939")
+
+MAGIC = b"J1939CAP"
+VERSION = 1
+
+FILE_HEADER = struct.Struct("<8sBBHd")
+BLOCK_HEADER = struct.Struct("<BxHId")
+RECORD = struct.Struct("<IIB8s")
+
+BLOCK_ZLIB = 0x01
+
+# flag bits stored above the 29-bit identifier, as SocketCAN does
+CAN_EFF_FLAG = 0x80000000
+CAN_RTR_FLAG = 0x40000000
+CAN_ERR_FLAG = 0x20000000
+CAN_ID_MASK = 0x1FFFFFFF
+
+#: Records per block unless the writer is told otherwise.
+DEFAULT_BLOCK_RECORDS = 4096
+
+_MAX_DELTA_US = 0xFFFFFFFF
+_PADDING = b"\x00" * 8
+
+
+class CaptureWriter(can.Listener):
+    """
+    Write frames to a capture file.
+
+    :param file: A path, or a binary file object opened for writing.
+    :param bool compress: zlib compress each block.
+    :param int block_records: Frames per block.
+    :param accept:
+        Optional callable taking a CAN ID; frames it returns False for are
+        not recorded (e.g. :meth:`j1939.filters.FilterSet.accepts`).
+    """
+
+    def __init__(self, file, compress=True, block_records=DEFAULT_BLOCK_RECORDS, accept=None):
+        if hasattr(file, "write"):
+            self._file = file
+            self._close_file = False
+        else:
+            self._file = open(file, "wb")
+            self._close_file = True
+        self.compress = compress
+        self.block_records = block_records
+        self._accept = accept
+        self._records = []
+        self._base = None
+        self._last_us = 0
+        self.frames = 0
+        self.blocks = 0
+        self._file.write(FILE_HEADER.pack(MAGIC, VERSION, 0, RECORD.size, 0.0))
+
+    def on_message_received(self, msg):
+        self.write(msg)
+
+    def write(self, msg):
+        if msg.is_fd or msg.dlc > 8:
+            raise ValueError("Only classic CAN frames can be captured")
+        can_id = msg.arbitration_id
+        if self._accept is not None and not self._accept(can_id):
+            return
+        if msg.is_extended_id:
+            can_id |= CAN_EFF_FLAG
+        if msg.is_remote_frame:
+            can_id |= CAN_RTR_FLAG
+        if msg.is_error_frame:
+            can_id |= CAN_ERR_FLAG
+
+        timestamp = msg.timestamp
+        if self._base is None:
+            self._base = timestamp
+            self._last_us = 0
+        offset_us = int(round((timestamp - self._base) * 1e6))
+        delta = offset_us - self._last_us
+        if delta > _MAX_DELTA_US:
+            self.flush()
+            self._base = timestamp
+            offset_us = delta = 0
+        elif delta < 0:
+            # timestamps that go backwards are stored as simultaneous
+            offset_us, delta = self._last_us, 0
+        self._last_us = offset_us
+
+        data = bytes(msg.data)
+        self._records.append(RECORD.pack(delta, can_id, msg.dlc, data + _PADDING[len(data):]))
+        self.frames += 1
+        if len(self._records) >= self.block_records:
+            self.flush()
+
+    def flush(self):
+        """Write out the current block."""
+        if self._records:
+            payload = b"".join(self._records)
+            flags = 0
+            if self.compress:
+                payload = zlib.compress(payload)
+                flags |= BLOCK_ZLIB
+            self._file.write(BLOCK_HEADER.pack(flags, len(self._records), len(payload), self._base))
+            self._file.write(payload)
+            self.blocks += 1
+            self._records = []
+            self._base = None
+        self._file.flush()
+
+    def stop(self):
+        self.flush()
+        if self._close_file:
+            self._file.close()
+
+    close = stop
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class CaptureReader(object):
+    """
+    Read a capture file through a memory map.
+
+    Uncompressed blocks are decoded straight out of the map; iterating
+    yields :class:`can.Message` objects with the recorded timestamps, and
+    :meth:`frames` yields plain tuples for code that doesn't need them.
+
+    :meth:`close` ends the iterations still running, they hold views of
+    the map.
+    """
+
+    def __init__(self, path):
+        self._closed = False
+        self._iterations = weakref.WeakSet()
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # mmap refuses empty files
+            self._file.close()
+            raise ValueError("%s is not a J1939 capture" % path)
+        self._view = memoryview(self._map)
+        if len(self._map) < FILE_HEADER.size:
+            self.close()
+            raise ValueError("%s is not a J1939 capture" % path)
+        magic, version, _, record_size, _ = FILE_HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or record_size != RECORD.size:
+            self.close()
+            raise ValueError("%s is not a J1939 capture" % path)
+        if version > VERSION:
+            self.close()
+            raise ValueError("%s is capture version %d, this reader handles %d" % (path, version, VERSION))
+        self.blocks = self._index_blocks()
+
+    def _index_blocks(self):
+        """(offset, flags, count, length, base timestamp) of every complete block."""
+        blocks = []
+        offset = FILE_HEADER.size
+        size = len(self._map)
+        while offset + BLOCK_HEADER.size <= size:
+            flags, count, length, base = BLOCK_HEADER.unpack_from(self._map, offset)
+            offset += BLOCK_HEADER.size
+            if offset + length > size:
+                logger.warning("Capture is truncated, ignoring the last block")
+                break
+            blocks.append((offset, flags, count, length, base))
+            offset += length
+        return blocks
+
+    def __len__(self):
+        return sum(block[2] for block in self.blocks)
+
+    def _block_records(self, block):
+        offset, flags, count, length, _ = block
+        payload = self._view[offset:offset + length]
+        if flags & BLOCK_ZLIB:
+            payload = zlib.decompress(payload)
+        return RECORD.iter_unpack(payload)
+
+    def frames(self):
+        """Yield (timestamp, can_id, flags, dlc, data) for every frame; flags are the CAN_*_FLAG bits."""
+        if self._closed:
+            raise ValueError("capture is closed")
+        iteration = self._frames()
+        self._iterations.add(iteration)
+        return iteration
+
+    def _frames(self):
+        for block in self.blocks:
+            offset_us = 0
+            base = block[4]
+            for delta, can_id, dlc, data in self._block_records(block):
+                offset_us += delta
+                yield base + offset_us * 1e-6, can_id & CAN_ID_MASK, can_id & ~CAN_ID_MASK, dlc, data[:dlc]
+
+    def __iter__(self):
+        Message = can.Message
+        for timestamp, can_id, flags, dlc, data in self.frames():
+            yield Message(timestamp=timestamp, arbitration_id=can_id,
+                          is_extended_id=bool(flags & CAN_EFF_FLAG),
+                          is_remote_frame=bool(flags & CAN_RTR_FLAG),
+                          is_error_frame=bool(flags & CAN_ERR_FLAG),
+                          dlc=dlc, data=data)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        for iteration in list(self._iterations):
+            # drops the iteration's slice of the map
+            iteration.close()
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def replay(messages, target, speed=1.0):
+    """
+    Feed recorded frames to ``target``.
+
+    :param messages: An iterable of :class:`can.Message`, e.g. a :class:`CaptureReader`.
+    :param target: A :class:`j1939.Bus` (frames go to its notification) or any callable.
+    :param float speed:
+        1.0 replays with the original timing, 2.0 twice as fast, 0 or None
+        as fast as possible.  Frames are released against deadlines from
+        the start of the replay, so the timing doesn't drift.
+    :return: The number of frames replayed.
+    """
+    deliver = getattr(target, "notification", target)
+    count = 0
+    start = first = None
+    for msg in messages:
+        if speed:
+            if first is None:
+                first, start = msg.timestamp, time.monotonic()
+            wait = start + (msg.timestamp - first) / speed - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+        deliver(msg)
+        count += 1
+    return count
@@ -8,6 +8,21 @@ PGN_AC_ADDRESS_CLAIMED = 0xee00
 PGN_AC_COMMANDED_ADDRESS = 0xfed8
 
 PGN_REQUEST_FOR_PGN = 0xea00
+PGN_ACKNOWLEDGEMENT = 0xe800
+
+# memory access PGNs (J1939-73)
+PGN_DM14_MEMORY_ACCESS_REQUEST = 0xd900
+PGN_DM15_MEMORY_ACCESS_RESPONSE = 0xd800
+PGN_DM16_BINARY_DATA_TRANSFER = 0xd700
+
+# diagnostic trouble code PGNs (J1939-73)
+PGN_DM1_ACTIVE_DTCS = 0xfeca
+PGN_DM2_PREVIOUSLY_ACTIVE_DTCS = 0xfecb
+
+# PGNs handled by the Node network management (address claiming) logic
+NETWORK_MANAGEMENT_PGNS = frozenset([PGN_AC_ADDRESS_CLAIMED, PGN_AC_COMMANDED_ADDRESS, PGN_REQUEST_FOR_PGN])
+
+TRANSPORT_PROTOCOL_PGNS = frozenset([PGN_TP_CONNECTION_MANAGEMENT, PGN_TP_DATA_TRANSFER])
 
 pgn_strings = {
     PGN_TP_CONNECTION_MANAGEMENT: "PGN_TP_CONNECTION_MANAGEMENT",
@@ -15,6 +30,12 @@ pgn_strings = {
     PGN_AC_ADDRESS_CLAIMED: "PGN_AC_ADDRESS_CLAIMED",
     PGN_AC_COMMANDED_ADDRESS: "PGN_AC_COMMANDED_ADDRESS",
     PGN_REQUEST_FOR_PGN: "PGN_REQUEST_FOR_PGN",
+    PGN_ACKNOWLEDGEMENT: "PGN_ACKNOWLEDGEMENT",
+    PGN_DM14_MEMORY_ACCESS_REQUEST: "PGN_DM14_MEMORY_ACCESS_REQUEST",
+    PGN_DM15_MEMORY_ACCESS_RESPONSE: "PGN_DM15_MEMORY_ACCESS_RESPONSE",
+    PGN_DM16_BINARY_DATA_TRANSFER: "PGN_DM16_BINARY_DATA_TRANSFER",
+    PGN_DM1_ACTIVE_DTCS: "PGN_DM1_ACTIVE_DTCS",
+    PGN_DM2_PREVIOUSLY_ACTIVE_DTCS: "PGN_DM2_PREVIOUSLY_ACTIVE_DTCS",
     PGN_TP_SEED_REQUEST: "PGN_TP_SEED_REQUEST"
 }
 
@@ -30,6 +51,18 @@ CM_MSG_TYPE_EOM_ACK = 0x13
 CM_MSG_TYPE_BAM = 0x20
 CM_MSG_TYPE_ABORT = 0xff
 
+# transport protocol timeouts in seconds (J1939-21)
+TP_TIMEOUT_TR = 0.2
+TP_TIMEOUT_TH = 0.5
+TP_TIMEOUT_T1 = 0.75
+TP_TIMEOUT_T2 = 1.25
+TP_TIMEOUT_T3 = 1.25
+TP_TIMEOUT_T4 = 1.05
+
+# time between BAM packets in seconds, J1939-21 allows 50 to 200 ms
+TP_BAM_GAP_MIN = 0.05
+TP_BAM_GAP_MAX = 0.2
+
 # connection abort reasons
 CM_ABORT_UNKNOWN = 0
 CM_ABORT_SESSION_IN_PROGRESS = 1
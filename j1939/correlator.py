@@ -0,0 +1,141 @@
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+from j1939.constants import *
+from j1939.subscription import normalize_pgn
+
+logger = logging.getLogger("j1939")
+
+
+class _PendingRequest(object):
+    __slots__ = ("future", "keys", "predicate", "claimed")
+
+    def __init__(self, future, keys, predicate):
+        self.future = future
+        self.keys = keys
+        self.predicate = predicate
+        # taken out of the table by the resolve() completing it
+        self.claimed = False
+
+
+class RequestCorrelator(object):
+    """
+    Matches received PDUs to outstanding requests.
+
+    Each request waits for a response PGN from a responder address (None
+    for any responder) and is completed through a
+    :class:`concurrent.futures.Future`.  An Acknowledgement (PGN 0xE800)
+    completes the request waiting for the PGN it names in bytes 5-7, so a
+    NACK ends a request straight away.  Requests waiting for the same
+    (PGN, responder) are completed in the order they were made.
+
+    Matching only looks at PDUs on their way through the receive path; it
+    never takes them away from the receive queue or other consumers.
+    Predicates and the futures' callbacks run without the lock held, and
+    PDUs may be resolved from several threads at once (e.g. the notifier
+    and :meth:`j1939.Bus.ingest`).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.completed = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(set(id(p) for waiting in self._pending.values() for p in waiting))
+
+    def __bool__(self):
+        return bool(self._pending)
+
+    __nonzero__ = __bool__
+
+    def expect(self, pgn, source=None, predicate=None):
+        """
+        Register a request before sending it.
+
+        :param pgn: The response PGN, or a list of PGNs any of which completes the request.
+        :param int source: The responder's address, None for any.
+        :param predicate: Optional callable; a PDU only completes the request if it returns True.
+        :return: A :class:`concurrent.futures.Future` resolved with the response PDU.
+                 Cancel it to give up on the request.
+        """
+        pgns = (pgn,) if isinstance(pgn, int) else tuple(pgn)
+        future = Future()
+        pending = _PendingRequest(future, [(normalize_pgn(p), source) for p in pgns], predicate)
+        with self._lock:
+            for key in pending.keys:
+                self._pending.setdefault(key, deque()).append(pending)
+        future.add_done_callback(lambda f: self._remove(pending))
+        return future
+
+    def _remove(self, pending):
+        with self._lock:
+            self._unlink(pending)
+
+    def _unlink(self, pending):
+        for key in pending.keys:
+            waiting = self._pending.get(key)
+            if waiting is None:
+                continue
+            try:
+                waiting.remove(pending)
+            except ValueError:
+                pass
+            if not waiting:
+                del self._pending[key]
+
+    def _claim(self, pending):
+        """Take ``pending`` out of the table; False if another resolve() already did."""
+        with self._lock:
+            if pending.claimed:
+                return False
+            pending.claimed = True
+            self._unlink(pending)
+        return True
+
+    def wants(self, pgn, source):
+        """True if a received ``pgn`` from ``source`` could complete a request."""
+        pending = self._pending
+        return bool(pending) and (pgn == PGN_ACKNOWLEDGEMENT or (pgn, source) in pending or (pgn, None) in pending)
+
+    def resolve(self, pdu):
+        """
+        Complete the oldest request the PDU answers.
+
+        :return: True if a request was completed.
+        """
+        if not self._pending:
+            return False
+        pgn, source = pdu.pgn, pdu.source
+        keys = [(pgn, source), (pgn, None)]
+        data = pdu.data
+        if pgn == PGN_ACKNOWLEDGEMENT and len(data) >= 8:
+            acknowledged_pgn = normalize_pgn(data[5] | (data[6] << 8) | (data[7] << 16))
+            keys += [(acknowledged_pgn, source), (acknowledged_pgn, None)]
+
+        with self._lock:
+            candidates = [pending for key in keys for pending in self._pending.get(key, ())]
+        for pending in candidates:
+            future = pending.future
+            if future.done() or future.running():
+                continue
+            if pending.predicate is not None and not pending.predicate(pdu):
+                continue
+            if not self._claim(pending):
+                continue
+            # a request cancelled meanwhile can't take the response
+            if future.set_running_or_notify_cancel():
+                future.set_result(pdu)
+                with self._lock:
+                    self.completed += 1
+                return True
+        return False
+
+    def cancel_all(self):
+        with self._lock:
+            pending = set(p for waiting in self._pending.values() for p in waiting)
+        for p in pending:
+            p.future.cancel()
@@ -0,0 +1,91 @@
+import functools
+from collections import namedtuple
+
+#
+# A J1939 bus only ever carries a few hundred distinct 29-bit identifiers, so
+# the result of splitting an ID into priority/PGN/source/destination is cached
+# and shared between frames instead of being re-derived for every message.
+#
+DEFAULT_CACHE_SIZE = 1024
+
+DecodedArbitrationID = namedtuple("DecodedArbitrationID", [
+    "can_id",                   # the raw 29-bit CAN identifier
+    "priority",                 # 0 (highest) to 7
+    "pgn",                      # PGN with a PDU1 destination stripped, same as PDU.pgn
+    "pgn_value",                # full 18-bit PGN including pdu_specific, same as PGN.value
+    "pdu_format",
+    "pdu_specific",
+    "is_destination_specific",  # same rules as PGN.is_destination_specific
+    "source_address",
+    "destination_address",      # None for PDU2 (broadcast) PGNs
+])
+
+
+def decode_can_id(can_id):
+    """
+    Split a 29-bit CAN identifier into an immutable
+    :class:`DecodedArbitrationID`.  This is the uncached decoder, use an
+    :class:`ArbitrationIDCache` on the receive path.
+    """
+    pgn_value = (can_id >> 8) & 0x3FFFF
+    pdu_format = (pgn_value >> 8) & 0xFF
+    pdu_specific = pgn_value & 0xFF
+    is_destination_specific = pdu_format < 240 or bool(pgn_value & 0x20000)
+    if is_destination_specific:
+        pgn = pgn_value & 0xFF00
+        destination_address = pdu_specific
+    else:
+        pgn = pgn_value
+        destination_address = None
+
+    return DecodedArbitrationID(
+        can_id,
+        (can_id & 0x1C000000) >> 26,
+        pgn,
+        pgn_value,
+        pdu_format,
+        pdu_specific,
+        is_destination_specific,
+        can_id & 0xFF,
+        destination_address)
+
+
+class ArbitrationIDCache(object):
+    """
+    Bounded LRU cache of :class:`DecodedArbitrationID` records keyed by
+    the raw 29-bit CAN identifier.
+
+    :param int maxsize:
+        Number of distinct identifiers kept before the least recently
+        used one is evicted.
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        if maxsize is None or maxsize <= 0:
+            raise ValueError("maxsize must be a positive integer")
+        self.maxsize = maxsize
+        self.lookup = functools.lru_cache(maxsize=maxsize)(decode_can_id)
+
+    @property
+    def hits(self):
+        return self.lookup.cache_info().hits
+
+    @property
+    def misses(self):
+        return self.lookup.cache_info().misses
+
+    @property
+    def currsize(self):
+        return self.lookup.cache_info().currsize
+
+    def clear(self):
+        """Drop all cached records and reset the hit/miss counters."""
+        self.lookup.cache_clear()
+
+    def __str__(self):
+        return "ArbitrationIDCache(hits={}, misses={}, size={}/{})".format(
+            self.hits, self.misses, self.currsize, self.maxsize)
+
+
+# Shared cache used by ArbitrationID.can_id
+default_cache = ArbitrationIDCache()
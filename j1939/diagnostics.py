@@ -0,0 +1,183 @@
+"""
+DM1 (active) and DM2 (previously active) diagnostic trouble codes.
+
+:func:`decode_dm` decodes the lamp status and the SPN/FMI/occurrence count
+tuples of a DM1/DM2 payload.  :class:`DTCTracker` keeps the fault state
+of every source address and only reports what changed::
+
+    tracker = DTCTracker(callback=print)
+    tracker.attach(bus)        # subscribes to DM1 and DM2
+
+Most DM1s repeat the previous one byte for byte (they are sent every
+second), those are recognised by comparing payloads and never decoded.
+"""
+
+import logging
+from collections import namedtuple
+
+from j1939.constants import *
+
+logger = logging.getLogger("j1939")
+
+# lamp states
+LAMP_OFF = 0
+LAMP_ON = 1
+LAMP_ERROR = 2
+LAMP_NOT_AVAILABLE = 3
+
+LampStatus = namedtuple("LampStatus", [
+    "malfunction_indicator", "red_stop", "amber_warning", "protect",
+    # flash codes: 0 slow flash, 1 fast flash, 2 reserved, 3 unavailable / do not flash
+    "malfunction_indicator_flash", "red_stop_flash", "amber_warning_flash", "protect_flash",
+])
+
+DTC = namedtuple("DTC", ["spn", "fmi", "occurrence_count", "conversion_method"])
+
+DiagnosticMessage = namedtuple("DiagnosticMessage", ["lamps", "dtcs"])
+
+# event kinds
+FAULT_APPEARED = "appeared"
+FAULT_CLEARED = "cleared"
+OCCURRENCE_CHANGED = "occurrence_changed"
+LAMPS_CHANGED = "lamps_changed"
+
+DTCEvent = namedtuple("DTCEvent", [
+    "kind",         # one of the event kinds above
+    "source",
+    "pgn",          # PGN_DM1_ACTIVE_DTCS or PGN_DM2_PREVIOUSLY_ACTIVE_DTCS
+    "dtc",          # the DTC now, None for cleared faults and lamp changes
+    "previous",     # the DTC before, None for new faults and lamp changes
+    "lamps",        # the lamp status now
+    "timestamp",
+])
+
+
+def _lamps(status, flash):
+    return LampStatus((status >> 6) & 3, (status >> 4) & 3, (status >> 2) & 3, status & 3,
+                      (flash >> 6) & 3, (flash >> 4) & 3, (flash >> 2) & 3, flash & 3)
+
+
+def decode_dm(data):
+    """
+    Decode a DM1/DM2 payload.
+
+    Each DTC is 4 bytes: the 19-bit SPN (conversion method 4), the 5-bit
+    FMI, the conversion method bit and the 7-bit occurrence count.  The
+    all zero "no active faults" entry and 0xFF padding are left out.
+
+    :return: A :class:`DiagnosticMessage`.
+    """
+    data = bytes(data)
+    if len(data) < 2:
+        raise ValueError("DM1/DM2 needs at least the 2 lamp status bytes")
+    dtcs = []
+    for i in range(2, len(data) - 3, 4):
+        b0, b1, b2, b3 = data[i], data[i + 1], data[i + 2], data[i + 3]
+        spn = b0 | (b1 << 8) | ((b2 & 0xE0) << 11)
+        fmi = b2 & 0x1F
+        if (spn == 0 and fmi == 0) or (spn == 0x7FFFF and fmi == 0x1F):
+            continue
+        dtcs.append(DTC(spn, fmi, b3 & 0x7F, b3 >> 7))
+    return DiagnosticMessage(_lamps(data[0], data[1]), tuple(dtcs))
+
+
+class _SourceState(object):
+    __slots__ = ("payload", "lamps", "dtcs")
+
+    def __init__(self):
+        self.payload = None
+        self.lamps = None
+        self.dtcs = {}
+
+
+class DTCTracker(object):
+    """
+    Per source address DM1/DM2 state, reporting changes as :class:`DTCEvent`.
+
+    :param callback: Optional callable receiving each event.
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self._states = {}
+        self.messages = 0
+        self.decoded = 0
+        self._subscriptions = []
+
+    def attach(self, bus):
+        """Subscribe to DM1 and DM2 on a :class:`j1939.Bus`."""
+        for pgn in (PGN_DM1_ACTIVE_DTCS, PGN_DM2_PREVIOUSLY_ACTIVE_DTCS):
+            self._subscriptions.append((bus, bus.subscribe(pgn=pgn, callback=self.update)))
+
+    def detach(self):
+        for bus, subscription in self._subscriptions:
+            bus.unsubscribe(subscription)
+        self._subscriptions = []
+
+    def update(self, pdu):
+        """
+        Feed a DM1 or DM2 PDU.
+
+        :return: The list of events it caused, empty when nothing changed.
+        """
+        pgn = pdu.pgn
+        if pgn not in (PGN_DM1_ACTIVE_DTCS, PGN_DM2_PREVIOUSLY_ACTIVE_DTCS):
+            return []
+        self.messages += 1
+        key = (pdu.source, pgn)
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _SourceState()
+
+        payload = bytes(pdu.data)
+        if payload == state.payload:
+            return []
+        try:
+            message = decode_dm(payload)
+        except ValueError:
+            logger.warning("Malformed DM from 0x%.2x: %s", pdu.source, payload)
+            return []
+        self.decoded += 1
+        state.payload = payload
+
+        events = []
+        source, timestamp = pdu.source, pdu.timestamp
+        if message.lamps != state.lamps:
+            events.append(DTCEvent(LAMPS_CHANGED, source, pgn, None, None, message.lamps, timestamp))
+
+        dtcs = dict(((dtc.spn, dtc.fmi), dtc) for dtc in message.dtcs)
+        for fault, dtc in dtcs.items():
+            previous = state.dtcs.get(fault)
+            if previous is None:
+                events.append(DTCEvent(FAULT_APPEARED, source, pgn, dtc, None, message.lamps, timestamp))
+            elif previous.occurrence_count != dtc.occurrence_count:
+                events.append(DTCEvent(OCCURRENCE_CHANGED, source, pgn, dtc, previous, message.lamps, timestamp))
+        for fault, previous in state.dtcs.items():
+            if fault not in dtcs:
+                events.append(DTCEvent(FAULT_CLEARED, source, pgn, None, previous, message.lamps, timestamp))
+
+        state.lamps = message.lamps
+        state.dtcs = dtcs
+
+        if self.callback is not None:
+            for event in events:
+                self.callback(event)
+        return events
+
+    def active(self, source, pgn=PGN_DM1_ACTIVE_DTCS):
+        """The DTCs ``source`` last reported in ``pgn``."""
+        state = self._states.get((source, pgn))
+        return [] if state is None else list(state.dtcs.values())
+
+    def lamps(self, source, pgn=PGN_DM1_ACTIVE_DTCS):
+        state = self._states.get((source, pgn))
+        return None if state is None else state.lamps
+
+    @property
+    def sources(self):
+        return sorted(set(source for source, _ in self._states))
+
+    def forget(self, source):
+        """Drop the state of a source address, e.g. when it leaves the bus."""
+        for pgn in (PGN_DM1_ACTIVE_DTCS, PGN_DM2_PREVIOUSLY_ACTIVE_DTCS):
+            self._states.pop((source, pgn), None)
@@ -0,0 +1,193 @@
+"""
+Compiled ``j1939_filters``.
+
+A filter is a dict with any of these keys, all of which must match; a
+frame is accepted when any filter in the list matches:
+
+* ``pgn`` - a PGN or list of PGNs.  PDU1 PGNs are compared by their
+  pdu_format alone (like :attr:`j1939.PDU.pgn`).
+* ``pgn_range`` - an inclusive ``(low, high)`` pair or list of pairs,
+  compared as full 18-bit PGNs: the destination address of a PDU1 PGN
+  is stripped, its data page and reserved bits are kept.
+* ``source`` - a source address or list of them.
+* ``destination`` - a destination address or list of them; only PDU1
+  (destination specific) frames have one.
+* ``priority`` - a priority (0-7) or list of them.
+
+The filters are compiled once into sets and the decision for each 29-bit
+CAN ID is remembered, so a frame costs one dict lookup.
+"""
+
+import logging
+
+from j1939.subscription import normalize_pgn
+
+logger = logging.getLogger("j1939")
+
+FILTER_KEYS = ("pgn", "pgn_range", "source", "destination", "priority")
+
+#: Distinct CAN IDs whose decisions are remembered before the memo is reset.
+MEMO_SIZE = 8192
+
+
+def _as_set(value, key):
+    if isinstance(value, int):
+        return frozenset((value,))
+    try:
+        return frozenset(int(v) for v in value)
+    except (TypeError, ValueError):
+        raise ValueError("j1939 filter %r must be an int or a list of ints, got %r" % (key, value))
+
+
+def _as_ranges(value):
+    if len(value) == 2 and all(isinstance(v, int) for v in value):
+        value = [value]
+    ranges = []
+    for low, high in value:
+        if low > high:
+            raise ValueError("j1939 filter pgn_range (%d, %d) is empty" % (low, high))
+        ranges.append((_range_pgn(low), _range_pgn(high)))
+    return tuple(ranges)
+
+
+def _is_pdu1(pgn):
+    return (pgn & 0xFF00) < 0xF000 or bool(pgn & 0x20000)
+
+
+def _range_pgn(pgn):
+    """``pgn`` the way ``pgn_range`` compares it, only the destination stripped."""
+    pgn &= 0x3FFFF
+    return pgn & 0x3FF00 if _is_pdu1(pgn) else pgn
+
+
+class CompiledFilter(object):
+    """One filter dict, held as sets of accepted field values (None for any)."""
+
+    __slots__ = ("pgns", "pgn_ranges", "sources", "destinations", "priorities")
+
+    def __init__(self, spec):
+        unknown = set(spec) - set(FILTER_KEYS)
+        if unknown:
+            raise ValueError("Unknown j1939 filter keys: %s" % ", ".join(sorted(unknown)))
+        self.pgns = None
+        if "pgn" in spec:
+            self.pgns = frozenset(normalize_pgn(pgn) for pgn in _as_set(spec["pgn"], "pgn"))
+        self.pgn_ranges = _as_ranges(spec["pgn_range"]) if "pgn_range" in spec else None
+        self.sources = _as_set(spec["source"], "source") if "source" in spec else None
+        self.destinations = _as_set(spec["destination"], "destination") if "destination" in spec else None
+        self.priorities = _as_set(spec["priority"], "priority") if "priority" in spec else None
+
+    def matches(self, priority, pgn, range_pgn, source, destination):
+        if self.priorities is not None and priority not in self.priorities:
+            return False
+        if self.sources is not None and source not in self.sources:
+            return False
+        if self.destinations is not None and destination not in self.destinations:
+            return False
+        if self.pgns is not None or self.pgn_ranges is not None:
+            if self.pgns is not None and pgn in self.pgns:
+                return True
+            if self.pgn_ranges is not None:
+                for low, high in self.pgn_ranges:
+                    if low <= range_pgn <= high:
+                        return True
+            return False
+        return True
+
+    def can_filters(self):
+        """
+        python-can ``can_filters`` accepting a superset of this filter,
+        for interfaces that filter in hardware or in the kernel.
+        """
+        can_id, can_mask = 0, 0
+        if self.priorities is not None and len(self.priorities) == 1:
+            can_id |= next(iter(self.priorities)) << 26
+            can_mask |= 0x1C000000
+        if self.sources is not None and len(self.sources) == 1:
+            can_id |= next(iter(self.sources))
+            can_mask |= 0xFF
+        if self.destinations is not None and len(self.destinations) == 1:
+            can_id |= next(iter(self.destinations)) << 8
+            can_mask |= 0xFF00
+        if self.pgns is None or self.pgn_ranges is not None:
+            return [{"can_id": can_id, "can_mask": can_mask, "extended": True}]
+
+        filters = []
+        for pgn in sorted(self.pgns):
+            if _is_pdu1(pgn):
+                # pdu_format only; pdu_specific is the destination and
+                # either data page matches
+                filters.append({"can_id": can_id | (pgn << 8), "can_mask": can_mask | 0xFF0000,
+                                "extended": True})
+                continue
+            if self.destinations is None:
+                filters.append({"can_id": can_id | (pgn << 8), "can_mask": can_mask | 0x3FFFF00,
+                                "extended": True})
+            if not pgn & 0x100FF:
+                # the reserved bit makes any pdu_format PDU1, and such a
+                # frame reports this PGN too
+                filters.append({"can_id": can_id | 0x2000000 | (pgn << 8), "can_mask": can_mask | 0x2FF0000,
+                                "extended": True})
+        return filters
+
+
+class FilterSet(object):
+    """
+    A compiled list of ``j1939_filters``.
+
+    :attr:`accepted` and :attr:`rejected` count the frames seen by
+    :meth:`accepts`.
+    """
+
+    def __init__(self, filters):
+        self.filters = tuple(CompiledFilter(spec) for spec in filters)
+        self._memo = {}
+        self.accepted = 0
+        self.rejected = 0
+
+    def _evaluate(self, can_id):
+        priority = (can_id >> 26) & 0x7
+        pgn_value = (can_id >> 8) & 0x3FFFF
+        source = can_id & 0xFF
+        if _is_pdu1(pgn_value):
+            pgn, range_pgn, destination = pgn_value & 0xFF00, pgn_value & 0x3FF00, pgn_value & 0xFF
+        else:
+            pgn, range_pgn, destination = pgn_value, pgn_value, None
+        for compiled in self.filters:
+            if compiled.matches(priority, pgn, range_pgn, source, destination):
+                return True
+        return False
+
+    def accepts(self, can_id):
+        try:
+            result = self._memo[can_id]
+        except KeyError:
+            result = self._evaluate(can_id)
+            if len(self._memo) >= MEMO_SIZE:
+                self._memo.clear()
+            self._memo[can_id] = result
+        if result:
+            self.accepted += 1
+        else:
+            self.rejected += 1
+        return result
+
+    def can_filters(self):
+        """python-can ``can_filters`` accepting a superset of the compiled filters."""
+        can_filters = []
+        for compiled in self.filters:
+            can_filters.extend(compiled.can_filters())
+        return can_filters
+
+    def stats(self):
+        return {"accepted": self.accepted, "rejected": self.rejected}
+
+
+def compile_filters(filters):
+    """
+    :param list filters: ``j1939_filters`` dicts, see the module docstring.
+    :return: A :class:`FilterSet`, or None for an empty filter list.
+    """
+    if not filters:
+        return None
+    return FilterSet(filters)
@@ -0,0 +1,315 @@
+"""
+Bulk memory access over DM14 (request), DM15 (response) and DM16 (binary
+data transfer).
+
+:class:`MemoryAccess` keeps up to ``window`` DM14 read requests to one ECU
+in flight and yields a :class:`MemoryResult` for every object as it
+completes::
+
+    memory = MemoryAccess(bus, src=0x00, dest=0x17, window=8)
+    for result in memory.read([(0x1000, 0, 4), (0x1004, 0, 2), (0x2000, 0, 200)]):
+        if result.error is not None:
+            print(hex(result.pointer), result.error)
+        else:
+            print(hex(result.pointer), result.value)
+
+DM15/DM16 responses don't say which request they answer, the ECU handles
+requests in the order it receives them and so are responses matched; an
+ECU that drops a request therefore shifts the responses of the requests
+in flight behind it.  Only reads of up to 7 bytes are pipelined: a
+write's DM15 proceed, completed and failed responses can't be told apart
+from those to the next request, and objects longer than 7 bytes travel
+in DM16s sent with the transport protocol, which a single frame response
+could overtake.  The bus needs a :class:`j1939.Node` at ``src`` to do
+the flow control of the ECU's RTS/CTS sessions.
+
+An ECU may answer a request with a DM15 proceed carrying a seed; the
+request is then sent again with the key from the bus's ``keygen`` (or
+the one given to :class:`MemoryAccess`) in its key field.  Without a key
+generator, or when the ECU asks again, the object fails right away.
+"""
+
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+
+try:
+    from queue import Queue, Empty
+except ImportError:
+    from Queue import Queue, Empty
+
+import j1939
+from j1939.constants import *
+from j1939.node import J1939Error
+
+logger = logging.getLogger("j1939")
+
+# DM15 status, bits 2-4 of the second byte
+DM15_PROCEED = 0
+DM15_BUSY = 1
+DM15_COMPLETED = 4
+DM15_FAILED = 5
+
+# a DM16 carries a count byte, the transport protocol 1785 bytes
+MEMORY_OBJECT_MAX = 1784
+
+MemoryResult = namedtuple("MemoryResult", [
+    "index",        # position of the object in the request list
+    "pointer",
+    "extension",
+    "length",
+    "value",        # read value (int for 1, 2 and 4 bytes, else bytes), None after a write or an error
+    "error",        # None, or a MemoryAccessError
+])
+
+
+class MemoryAccessError(J1939Error):
+    """
+    A memory object that could not be read or written.
+
+    :attr:`status` is the DM15 status (None for timeouts and malformed
+    responses) and :attr:`error_code` the DM15 error indicator.
+    """
+
+    def __init__(self, message, status=None, error_code=None):
+        super(MemoryAccessError, self).__init__(message)
+        self.status = status
+        self.error_code = error_code
+
+
+class _Operation(object):
+    __slots__ = ("index", "pointer", "extension", "length", "request", "transfer", "proceeded", "keyed",
+                 "deadline", "exclusive")
+
+    def __init__(self, index, pointer, extension, length, request, transfer=None):
+        self.index = index
+        self.pointer = pointer
+        self.extension = extension
+        self.length = length
+        self.request = request
+        # the DM16 of a write, sent on the DM15 proceed
+        self.transfer = transfer
+        self.proceeded = False
+        # the request was sent again with a key
+        self.keyed = False
+        self.deadline = None
+        # a transport protocol session could be overtaken by a single
+        # frame response, and a write's DM15s can't be told apart from
+        # the next request's; these don't share the bus with others
+        self.exclusive = length > 7 or transfer is not None
+
+    def result(self, value=None, error=None):
+        return MemoryResult(self.index, self.pointer, self.extension, self.length, value, error)
+
+
+def _check_length(length):
+    if not 1 <= length <= MEMORY_OBJECT_MAX:
+        raise ValueError("Memory objects are 1 to %d bytes, not %d" % (MEMORY_OBJECT_MAX, length))
+
+
+def _request(pointer, extension, length, command, src, dest):
+    # lengths above 255 continue in the top 3 bits of the command byte
+    return j1939.utils._dm14_pdu(pointer, extension, length & 0xFF, command | ((length >> 8) << 5), src, dest)
+
+
+def _key_request(request, seed, keygen):
+    """``request`` again, with the key for ``seed`` in its key/user level field."""
+    key = keygen(seed) & 0xFFFF
+    data = list(request.data)
+    data[6] = key & 0xFF
+    data[7] = key >> 8
+    pdu = j1939.PDU(timestamp=0.0, arbitration_id=request.arbitration_id, data=data)
+    pdu.display_radix = 'hex'
+    return pdu
+
+
+def _transfer_data(value, length):
+    """The DM16 data writing ``value``, count byte first, the way set_mem_object encodes it."""
+    if isinstance(value, int):
+        if length >= 8:
+            raise ValueError("Don't know how to send a %d byte integer" % length)
+        return [length] + [(value >> (8 * i)) & 0xFF for i in range(length)]
+    if isinstance(value, str):
+        if len(value) > length:
+            raise ValueError("%r is longer than %d bytes" % (value, length))
+        # the count includes the terminating NUL the ECU stores
+        return [min(length + 1, 0xFF)] + [ord(c) for c in value]
+    data = list(value)
+    return [min(len(data), 0xFF)] + data
+
+
+class MemoryAccess(object):
+    """
+    Pipelined DM14 reads and writes to one ECU.
+
+    :param j1939.Bus bus: The bus, with a Node at ``src``.
+    :param int src: Our source address.
+    :param int dest: The ECU's address.
+    :param int window: Reads in flight at once.
+    :param float timeout:
+        Seconds to wait for the response to the oldest request in flight
+        before reporting it as timed out.
+    :param keygen:
+        Seed to key function for ECUs that ask for one, defaults to the
+        bus's ``keygen``.
+
+    One run (:meth:`read` or :meth:`write`) at a time per ECU; responses
+    are taken from the bus with a subscription.
+    """
+
+    def __init__(self, bus, src=0, dest=0x17, window=4, timeout=10, keygen=None):
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        self.bus = bus
+        self.keygen = keygen if keygen is not None else getattr(bus, "_key_generation_fcn", None)
+        self.src = src
+        self.dest = dest
+        self.window = window
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._in_flight = deque()
+        self._done = Queue()
+
+    def read(self, objects):
+        """
+        Read ``(pointer, extension, length)`` objects.
+
+        :return: A generator of :class:`MemoryResult` in completion order.
+        """
+        operations = []
+        for index, (pointer, extension, length) in enumerate(objects):
+            _check_length(length)
+            request = _request(pointer, extension, length, j1939.utils.DM14_READ, self.src, self.dest)
+            operations.append(_Operation(index, pointer, extension, length, request))
+        return self._run(operations)
+
+    def write(self, objects):
+        """
+        Write ``(pointer, extension, length, value)`` objects; ``value`` is
+        an int (little endian), a str or a list/bytes.
+
+        :return: A generator of :class:`MemoryResult` in completion order.
+        """
+        operations = []
+        for index, (pointer, extension, length, value) in enumerate(objects):
+            _check_length(length)
+            transfer = self._pdu(PGN_DM16_BINARY_DATA_TRANSFER, _transfer_data(value, length))
+            request = _request(pointer, extension, length, j1939.utils.DM14_WRITE, self.src, self.dest)
+            operations.append(_Operation(index, pointer, extension, length, request, transfer))
+        return self._run(operations)
+
+    def _pdu(self, pgn_value, data):
+        pgn = j1939.PGN(pdu_format=pgn_value >> 8, pdu_specific=self.dest)
+        aid = j1939.ArbitrationID(pgn=pgn, source_address=self.src, destination_address=self.dest)
+        pdu = j1939.PDU(timestamp=0.0, arbitration_id=aid, data=data)
+        pdu.display_radix = 'hex'
+        return pdu
+
+    def _run(self, operations):
+        pending = deque(operations)
+        remaining = len(operations)
+        subscriptions = [self.bus.subscribe(pgn=pgn, source=self.dest, destination=self.src, callback=self._on_pdu)
+                         for pgn in (PGN_DM15_MEMORY_ACCESS_RESPONSE, PGN_DM16_BINARY_DATA_TRANSFER)]
+        try:
+            while remaining:
+                while pending and len(self._in_flight) < self.window:
+                    if self._in_flight and (pending[0].exclusive or self._in_flight[-1].exclusive):
+                        break
+                    operation = pending.popleft()
+                    with self._lock:
+                        if not self._in_flight:
+                            operation.deadline = time.time() + self.timeout
+                        self._in_flight.append(operation)
+                    self.bus.send(operation.request)
+
+                with self._lock:
+                    head = self._in_flight[0] if self._in_flight else None
+                try:
+                    result = self._done.get(timeout=None if head is None else max(0, head.deadline - time.time()))
+                except Empty:
+                    result = None
+                if result is not None:
+                    remaining -= 1
+                    yield result
+                    continue
+                with self._lock:
+                    if not self._in_flight or self._in_flight[0] is not head:
+                        continue
+                    self._finish_head()
+                logger.info("DM14 request for 0x%.6x timed out", head.pointer)
+                remaining -= 1
+                yield head.result(error=MemoryAccessError("no DM15/DM16 response"))
+        finally:
+            for subscription in subscriptions:
+                self.bus.unsubscribe(subscription)
+            with self._lock:
+                self._in_flight.clear()
+            while not self._done.empty():
+                self._done.get_nowait()
+
+    def _finish_head(self):
+        self._in_flight.popleft()
+        if self._in_flight:
+            # the next request's wait starts now
+            self._in_flight[0].deadline = time.time() + self.timeout
+
+    def _on_pdu(self, pdu):
+        """Subscription callback, runs on the receive thread."""
+        data = pdu.data
+        send = None
+        with self._lock:
+            if not self._in_flight:
+                logger.debug("Unexpected memory access response %s", pdu)
+                return
+            operation = self._in_flight[0]
+            result = None
+            if pdu.pgn == PGN_DM16_BINARY_DATA_TRANSFER:
+                if operation.transfer is not None:
+                    return
+                payload = bytes(data[1:1 + operation.length])
+                if len(payload) < operation.length:
+                    result = operation.result(error=MemoryAccessError(
+                        "DM16 carried %d of %d bytes" % (len(payload), operation.length)))
+                elif operation.length in (1, 2, 4):
+                    result = operation.result(value=int.from_bytes(payload, "little"))
+                else:
+                    result = operation.result(value=payload)
+            elif len(data) >= 8:
+                status = (data[1] >> 1) & 7
+                if status == DM15_PROCEED:
+                    if data[6] != 0xFF or data[7] != 0xFF:
+                        seed = data[6] | (data[7] << 8)
+                        if self.keygen is None or operation.keyed:
+                            result = operation.result(error=MemoryAccessError(
+                                "ECU asks for a seed/key exchange" if self.keygen is None else "key not accepted",
+                                status, seed))
+                        else:
+                            # the ECU proceeds again once it has the key; the
+                            # head's deadline keeps running
+                            logger.debug("DM15 seed 0x%.4x for 0x%.6x", seed, operation.pointer)
+                            operation.keyed = True
+                            send = _key_request(operation.request, seed, self.keygen)
+                    elif operation.transfer is not None and not operation.proceeded:
+                        operation.proceeded = True
+                        send = operation.transfer
+                    else:
+                        # a read's DM16 follows
+                        return
+                elif status == DM15_COMPLETED and operation.transfer is not None and operation.proceeded:
+                    result = operation.result()
+                elif status == DM15_COMPLETED:
+                    return
+                else:
+                    error_code = data[2] | (data[3] << 8) | (data[4] << 16)
+                    reason = "busy" if status == DM15_BUSY else "rejected"
+                    result = operation.result(error=MemoryAccessError(
+                        "%s, error indicator 0x%.6x" % (reason, error_code), status, error_code))
+            else:
+                result = operation.result(error=MemoryAccessError("malformed DM15 %s" % list(data)))
+            if result is not None:
+                self._finish_head()
+        if send is not None:
+            self.bus.send(send)
+        if result is not None:
+            self._done.put(result)
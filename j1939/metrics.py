@@ -0,0 +1,324 @@
+"""
+Metrics of a :class:`j1939.Bus`: frames per PGN and source address,
+transport protocol sessions, queue depths and the time spent in the
+receive path.
+
+Collection is enabled with ``j1939.Bus(..., metrics=True)`` (or an own
+:class:`MetricsRegistry`) and read back as a snapshot or in the
+Prometheus text format::
+
+    bus = j1939.Bus(channel='can0', bustype='socketcan', metrics=True)
+    bus.metrics.snapshot()["rx_by_pgn"]
+    PrometheusFileWriter(bus.metrics, "/var/lib/node_exporter/j1939.prom").start()
+
+To stay cheap enough to leave on, the receive path only counts frames by
+their raw CAN ID and times one in ``notification_sample`` frames of each
+ID; splitting the IDs into PGN and source address is left to
+:meth:`MetricsRegistry.snapshot` and queue depths are read when a
+snapshot is taken.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from time import perf_counter
+
+from can.listener import Listener
+
+from j1939 import profiling
+from j1939.decodecache import decode_can_id
+
+logger = logging.getLogger("j1939")
+
+#: Seconds, upper bounds of the notification time histogram.
+NOTIFICATION_BUCKETS = (5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 1e-3, 1e-2)
+#: Seconds, upper bounds of the TP session duration histograms.
+TP_DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+TP_EVENTS = ("started", "completed", "aborted", "timed_out")
+
+
+class Histogram(object):
+    """Counts of observed values per bucket, with their sum."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        # the last count is the +Inf bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def reset(self):
+        self.counts[:] = [0] * len(self.counts)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        """``{"buckets": [(upper bound, cumulative count), ...], "sum": .., "count": ..}``"""
+        cumulative = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return {"buckets": cumulative, "sum": self.sum, "count": self.count}
+
+
+class MetricsRegistry(object):
+    """
+    The counters and histograms of one bus.
+
+    :param int notification_sample:
+        Time every n-th frame of each CAN ID in the receive path, a power
+        of two.
+    :attr:`queue_stats` is a callable returning ``{queue name: stats}``
+    in the form of :attr:`j1939.Bus.queue_stats`, set by the bus.
+    """
+
+    def __init__(self, notification_buckets=NOTIFICATION_BUCKETS, tp_buckets=TP_DURATION_BUCKETS,
+                 notification_sample=64):
+        if notification_sample < 1 or notification_sample & (notification_sample - 1):
+            raise ValueError("notification_sample must be a power of two")
+        self.notification_sample = notification_sample
+        self._tx_lock = threading.Lock()
+        self.queue_stats = None
+        self.started = time.time()
+        # frames by raw CAN ID
+        self.rx = {}
+        self.tx = {}
+        # 11-bit and error frames, not J1939
+        self.rx_other = 0
+        self.notification = Histogram(notification_buckets)
+        self.tp = {}
+        for kind in ("bam", "rts"):
+            self.tp[kind] = dict((event, 0) for event in TP_EVENTS)
+            self.tp[kind]["duration"] = Histogram(tp_buckets)
+
+    def reset(self):
+        # in place, the receive path holds on to the containers
+        self.started = time.time()
+        self.rx.clear()
+        self.rx_other = 0
+        with self._tx_lock:
+            self.tx.clear()
+        self.notification.reset()
+        for counters in self.tp.values():
+            for event in TP_EVENTS:
+                counters[event] = 0
+            counters["duration"].reset()
+
+    def sent(self, can_id):
+        # sends come from the caller's thread as well as the receive
+        # thread (flow control) and the BAM scheduler
+        with self._tx_lock:
+            self.tx[can_id] = self.tx.get(can_id, 0) + 1
+
+    def tp_session(self, session, event):
+        """Observer of a :class:`j1939.transport.TransportReassembler`."""
+        counters = self.tp["bam" if session.is_bam else "rts"]
+        counters[event] += 1
+        if event == "completed":
+            counters["duration"].observe(session.last_update - session.started)
+
+    @staticmethod
+    def _aggregate(frames):
+        by_pgn = {}
+        by_source = {}
+        by_pair = {}
+        for can_id, count in frames.items():
+            decoded = decode_can_id(can_id)
+            by_pgn[decoded.pgn] = by_pgn.get(decoded.pgn, 0) + count
+            by_source[decoded.source_address] = by_source.get(decoded.source_address, 0) + count
+            key = (decoded.pgn, decoded.source_address)
+            by_pair[key] = by_pair.get(key, 0) + count
+        return by_pgn, by_source, by_pair
+
+    def snapshot(self):
+        """The current values as plain dicts, lists and numbers."""
+        rx_by_pgn, rx_by_source, rx_by_pair = self._aggregate(dict(self.rx))
+        with self._tx_lock:
+            tx = dict(self.tx)
+        tx_by_pgn, tx_by_source, tx_by_pair = self._aggregate(tx)
+        tp = {}
+        for kind, counters in self.tp.items():
+            tp[kind] = dict((event, counters[event]) for event in TP_EVENTS)
+            tp[kind]["duration"] = counters["duration"].snapshot()
+        return {
+            "timestamp": time.time(),
+            "started": self.started,
+            "rx_frames": sum(rx_by_pgn.values()),
+            "rx_by_pgn": rx_by_pgn,
+            "rx_by_source": rx_by_source,
+            "rx_by_pgn_source": rx_by_pair,
+            "rx_other_frames": self.rx_other,
+            "tx_frames": sum(tx_by_pgn.values()),
+            "tx_by_pgn": tx_by_pgn,
+            "tx_by_source": tx_by_source,
+            "tx_by_pgn_source": tx_by_pair,
+            "tp": tp,
+            "queues": self.queue_stats() if self.queue_stats is not None else {},
+            "notification": self.notification.snapshot(),
+        }
+
+    def prometheus_text(self, prefix="j1939", labels=None):
+        """
+        The snapshot in the Prometheus text exposition format.
+
+        :param dict labels: Extra labels for every sample, e.g. ``{"channel": "can0"}``.
+        """
+        snapshot = self.snapshot()
+        extra = "".join(',%s="%s"' % (k, v) for k, v in sorted((labels or {}).items()))
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append("# HELP %s_%s %s" % (prefix, name, help_text))
+            lines.append("# TYPE %s_%s %s" % (prefix, name, kind))
+
+        def sample(name, value, **sample_labels):
+            text = (",".join('%s="%s"' % item for item in sorted(sample_labels.items())) + extra).lstrip(",")
+            if text:
+                lines.append("%s_%s{%s} %s" % (prefix, name, text, _number(value)))
+            else:
+                lines.append("%s_%s %s" % (prefix, name, _number(value)))
+
+        def histogram(name, snap, **sample_labels):
+            for bound, count in snap["buckets"]:
+                sample(name + "_bucket", count, le="+Inf" if bound == float("inf") else repr(bound), **sample_labels)
+            sample(name + "_sum", snap["sum"], **sample_labels)
+            sample(name + "_count", snap["count"], **sample_labels)
+
+        for direction, key in (("received", "rx_by_pgn_source"), ("sent", "tx_by_pgn_source")):
+            header("frames_%s_total" % direction, "counter", "Frames %s by PGN and source address." % direction)
+            for (pgn, source), count in sorted(snapshot[key].items()):
+                sample("frames_%s_total" % direction, count, pgn="0x%05x" % pgn, source="0x%02x" % source)
+        header("frames_other_received_total", "counter", "Frames received that aren't J1939 (11-bit and error frames).")
+        sample("frames_other_received_total", snapshot["rx_other_frames"])
+
+        header("tp_sessions_total", "counter", "Inbound transport protocol sessions by event.")
+        for kind, counters in sorted(snapshot["tp"].items()):
+            for event in TP_EVENTS:
+                sample("tp_sessions_total", counters[event], kind=kind, event=event)
+        header("tp_session_duration_seconds", "histogram", "Duration of completed inbound TP sessions.")
+        for kind, counters in sorted(snapshot["tp"].items()):
+            histogram("tp_session_duration_seconds", counters["duration"], kind=kind)
+
+        for name, key, kind, help_text in (("queue_depth", "depth", "gauge", "PDUs waiting in a receive queue."),
+                                           ("queue_high_water", "high_water", "gauge", "Deepest a receive queue got."),
+                                           ("queue_dropped_total", "dropped", "counter", "PDUs a full queue dropped.")):
+            header(name, kind, help_text)
+            for queue, stats in sorted(snapshot["queues"].items()):
+                sample(name, stats.get(key, 0), queue=queue)
+
+        header("notification_seconds", "histogram", "Time spent in the receive path per frame, sampled.")
+        histogram("notification_seconds", snapshot["notification"])
+        return "\n".join(lines) + "\n"
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class MeasuredListener(Listener):
+    """
+    Hands received frames to ``handler`` (the bus's notification) like
+    the plain listener does, counting every J1939 frame by CAN ID in
+    ``registry`` and timing a sample of them.  11-bit and error frames
+    are only counted, in :attr:`MetricsRegistry.rx_other`.
+    """
+
+    def __init__(self, handler, registry):
+        self.handler = handler
+        self._registry = registry
+        self._rx = registry.rx
+        self._observe = registry.notification.observe
+        self._mask = registry.notification_sample - 1
+
+    def on_message_received(self, msg):
+        if msg.is_error_frame or not msg.is_extended_id:
+            self._registry.rx_other += 1
+            self.handler(msg)
+            return
+        rx = self._rx
+        can_id = msg.arbitration_id
+        count = rx.get(can_id, 0) + 1
+        rx[can_id] = count
+        if profiling.enabled:
+            profiling.begin(can_id)
+            try:
+                self.handler(msg)
+            finally:
+                profiling.end()
+        elif count & self._mask:
+            self.handler(msg)
+        else:
+            start = perf_counter()
+            self.handler(msg)
+            self._observe(perf_counter() - start)
+
+    def stop(self):
+        pass
+
+
+class PrometheusFileWriter(object):
+    """
+    Writes :meth:`MetricsRegistry.prometheus_text` to ``path`` every
+    ``interval`` seconds, e.g. for the node_exporter textfile collector.
+    The file is replaced atomically so a scrape never sees half of it.
+    """
+
+    def __init__(self, registry, path, interval=15.0, labels=None):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.labels = labels
+        self._stop = threading.Event()
+        self._thread = None
+
+    def write(self):
+        text = self.registry.prometheus_text(labels=self.labels)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".j1939-metrics-", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(text)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="j1939-metrics-writer")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        # leave the final values behind
+        self.write()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.write()
+            except Exception:
+                logger.exception("Writing metrics to %s failed", self.path)
+            self._stop.wait(self.interval)
@@ -0,0 +1,195 @@
+"""
+Several J1939 segments behind one receive stream.
+
+:class:`MultiChannelBus` opens a :class:`j1939.Bus` per python-can channel,
+each with its own receive worker, receive queue and transport protocol
+state, and merges what they receive into one stream of
+:class:`ChannelPDU` in timestamp order::
+
+    bus = MultiChannelBus({
+        "powertrain": dict(channel="can0", bustype="socketcan"),
+        "chassis": dict(channel="can1", bustype="socketcan"),
+        "body": dict(channel="can2", bustype="socketcan"),
+    }, max_latency=0.05)
+    for channel, pdu in bus:
+        print(channel, pdu)
+
+The merge is a k-way merge over the oldest PDU of each channel.  A PDU is
+released once no channel can still deliver an older one: every other
+channel has a PDU waiting, has already delivered a newer one, or has been
+quiet for ``max_latency`` seconds past the PDU's timestamp.  A quiet
+channel therefore holds the others back by at most ``max_latency``; a
+frame delivered later than that is passed on out of order and counted in
+:attr:`MultiChannelBus.late`.  This needs the channels to timestamp
+frames with the host clock, which SocketCAN and the virtual interface do.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import j1939
+
+logger = logging.getLogger("j1939")
+
+ChannelPDU = namedtuple("ChannelPDU", [
+    "channel",      # name of the channel the PDU was received on
+    "pdu",
+])
+
+
+class _Channel(object):
+    __slots__ = ("name", "bus", "head", "last")
+
+    def __init__(self, name, bus):
+        self.name = name
+        self.bus = bus
+        # the channel's oldest PDU not yet released
+        self.head = None
+        # timestamp of the newest PDU taken from the channel's queue
+        self.last = float("-inf")
+
+
+class MultiChannelBus(object):
+    """
+    A :class:`j1939.Bus` per channel and their time ordered merge.
+
+    :param channels:
+        A mapping of channel name to :class:`j1939.Bus` keyword arguments
+        (``channel``, ``bustype``, ``bitrate``, ...), or a list of such
+        dicts, named by their ``channel``.
+    :param float max_latency:
+        Seconds a PDU waits at most for a quiet channel.
+    :param kwargs:
+        :class:`j1939.Bus` arguments shared by all channels, e.g.
+        ``queue_size`` or ``reactor=j1939.Reactor()`` to serve every
+        channel from one thread.
+    """
+
+    def __init__(self, channels, max_latency=0.05, clock=time.time, **kwargs):
+        if max_latency < 0:
+            raise ValueError("max_latency can't be negative")
+        if not isinstance(channels, dict):
+            channels = OrderedDict((str(options["channel"]), options) for options in channels)
+        if not channels:
+            raise ValueError("at least one channel is needed")
+        self.max_latency = max_latency
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._closed = False
+        self.released = 0
+        self.late = 0
+        self._released_timestamp = float("-inf")
+
+        self._channels = []
+        try:
+            for name, options in channels.items():
+                arguments = dict(kwargs)
+                arguments.update(options)
+                bus = j1939.Bus(**arguments)
+                self._channels.append(_Channel(name, bus))
+                bus.queue.on_put = self._ready.set
+        except Exception:
+            for channel in self._channels:
+                channel.bus.shutdown()
+            raise
+        self.buses = OrderedDict((channel.name, channel.bus) for channel in self._channels)
+
+    def __getitem__(self, name):
+        return self.buses[name]
+
+    @property
+    def channels(self):
+        return list(self.buses)
+
+    def connect(self, channel, node):
+        self.buses[channel].connect(node)
+
+    def send(self, channel, msg, timeout=None):
+        self.buses[channel].send(msg, timeout)
+
+    def _fill(self):
+        for channel in self._channels:
+            if channel.head is None:
+                pdu = channel.bus.recv(timeout=0)
+                if pdu is not None:
+                    channel.head = pdu
+                    if pdu.timestamp > channel.last:
+                        channel.last = pdu.timestamp
+
+    def _release(self):
+        """
+        Take the next PDU off the merge.
+
+        :return: ``(ChannelPDU, None)``, or ``(None, seconds)`` to wait for
+            a quiet channel (None for as long as nothing arrives).
+        """
+        first = None
+        for channel in self._channels:
+            if channel.head is not None and (first is None or channel.head.timestamp < first.head.timestamp):
+                first = channel
+        if first is None:
+            return None, None
+        timestamp = first.head.timestamp
+        horizon = self._clock() - self.max_latency
+        if horizon < timestamp:
+            for channel in self._channels:
+                if channel.head is None and channel.last < timestamp:
+                    # could still deliver an older PDU
+                    return None, timestamp - horizon
+
+        pdu = first.head
+        first.head = None
+        self.released += 1
+        if timestamp < self._released_timestamp:
+            self.late += 1
+        else:
+            self._released_timestamp = timestamp
+        return ChannelPDU(first.name, pdu), None
+
+    def recv(self, timeout=None):
+        """
+        The next PDU of the merged stream.
+
+        :param float timeout: Seconds to wait, None to wait until one is released.
+        :return: A :class:`ChannelPDU`, or None on timeout or after :meth:`shutdown`.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while not self._closed:
+                # cleared first, a put after this sets it again
+                self._ready.clear()
+                self._fill()
+                item, wait = self._release()
+                if item is not None:
+                    return item
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._ready.wait(wait)
+        return None
+
+    def __iter__(self):
+        """Yield the merged stream until :meth:`shutdown`."""
+        while True:
+            item = self.recv()
+            if item is None:
+                return
+            yield item
+
+    @property
+    def queue_stats(self):
+        """:attr:`j1939.Bus.queue_stats` of every channel, by channel name."""
+        return OrderedDict((name, bus.queue_stats) for name, bus in self.buses.items())
+
+    def shutdown(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._ready.set()
+        for bus in self.buses.values():
+            bus.shutdown()
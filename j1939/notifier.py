@@ -59,8 +59,12 @@ class CanNotifier(canNotifier):
             while self._running:
                 if msg is not None:
                     with self._lock:
-                        for callback in self.listeners:
-                            callback(msg)
+                        if self._loop is not None:
+                            # deliver on the asyncio event loop thread
+                            self._loop.call_soon_threadsafe(self._on_message_received, msg)
+                        else:
+                            for callback in self.listeners:
+                                callback(msg)
                 msg = bus.recv(self.timeout)
                 logger.debug('CanNotifier: {}\n'.format(msg))
 
@@ -77,3 +81,27 @@ class CanNotifier(canNotifier):
         except Exception as exc:
             self.exception = exc
             raise    
+
+
+class InlineNotifier(object):
+    """
+    Stands in for a :class:`Notifier` in reactor mode: the PDUs put into
+    :attr:`queue` are handed to the listeners right away, on the thread
+    putting them, instead of waking a thread of their own.
+    """
+
+    def __init__(self, listeners):
+        self.listeners = listeners
+        self.queue = self
+
+    def put(self, msg, block=True, timeout=None):
+        for callback in self.listeners:
+            try:
+                callback(msg)
+            except Exception:
+                logger.exception("Listener %r failed", callback)
+
+    def stop(self):
+        for listener in self.listeners:
+            if hasattr(listener, "stop"):
+                listener.stop()
@@ -0,0 +1,242 @@
+"""
+Offline decoding of recorded J1939 traffic.
+
+:func:`decode_messages` runs frames through the same header decode and
+transport protocol reassembly as :class:`j1939.Bus`, without an interface,
+threads or queues.  Recorded traffic shows both ends of every RTS/CTS
+session, so sessions are reassembled passively, whoever the destination.
+
+:func:`decode_file` streams any python-can log format (ASC, BLF, CSV,
+SQLite, candump .log) or a :mod:`j1939.capture` file, and with
+``processes`` > 1 shards the frames over worker processes and merges the
+decoded PDUs back in timestamp order.  Frames are sharded by source
+address, TP.CM and TP.DT frames by the pair of addresses they pass
+between, so a session's CTS and aborts from the receiving end meet it in
+the same shard.
+"""
+
+import heapq
+import logging
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+
+import can
+
+from j1939.constants import *
+from j1939.arbitrationid import ArbitrationID
+from j1939.capture import CaptureReader, CaptureWriter, MAGIC
+from j1939.decodecache import ArbitrationIDCache
+from j1939.pdu import PDU
+from j1939.pgn import PGN
+from j1939.transport import TransportReassembler, TP_TIMEOUT_T1, TP_TIMEOUT_T2
+
+logger = logging.getLogger("j1939")
+
+# PDUs per pickle written by a worker
+_RESULT_BATCH = 1024
+
+
+class OfflineDecoder(object):
+    """
+    Turns frames into PDUs one at a time.
+
+    :param pdu_type: The PDU class to build.
+    :param bool include_transport:
+        Also return the TP.CM/TP.DT frames themselves, not only the
+        reassembled PDUs.
+    """
+
+    def __init__(self, pdu_type=PDU, include_transport=False,
+                 bam_timeout=TP_TIMEOUT_T1, rts_timeout=TP_TIMEOUT_T2):
+        self._pdu_type = pdu_type
+        self.include_transport = include_transport
+        self._id_cache = ArbitrationIDCache()
+        self.sessions = TransportReassembler(bam_timeout=bam_timeout, rts_timeout=rts_timeout)
+        self.frames = 0
+        self.pdus = 0
+
+    def decode(self, msg):
+        """
+        :param can.Message msg: A received frame.
+        :return: A PDU, or None for frames that don't produce one (yet).
+        """
+        self.frames += 1
+        if not msg.is_extended_id or msg.is_error_frame:
+            return None
+
+        decoded = self._id_cache.lookup(msg.arbitration_id)
+        pgn = decoded.pgn
+        if pgn == PGN_TP_CONNECTION_MANAGEMENT:
+            self._connection_management(decoded, msg)
+            result = self._build(decoded, msg) if self.include_transport else None
+        elif pgn == PGN_TP_DATA_TRANSFER:
+            result = self._data_transfer(decoded, msg)
+            if result is None and self.include_transport:
+                result = self._build(decoded, msg)
+        else:
+            result = self._build(decoded, msg)
+        if result is not None:
+            self.pdus += 1
+        return result
+
+    def _build(self, decoded, msg):
+        pdu = self._pdu_type(timestamp=msg.timestamp, arbitration_id=ArbitrationID.from_decoded(decoded),
+                             data=msg.data)
+        pdu.radix = 16
+        return pdu
+
+    def _connection_management(self, decoded, msg):
+        data = msg.data
+        if not data:
+            return
+        command = data[0]
+        source, destination = decoded.source_address, decoded.pdu_specific
+        if command in (CM_MSG_TYPE_RTS, CM_MSG_TYPE_BAM):
+            self.sessions.open(source, destination, data, msg.timestamp)
+        elif command == CM_MSG_TYPE_ABORT:
+            # either end of a session may abort it
+            if not self.sessions.abort(source, destination):
+                self.sessions.abort(destination, source)
+
+    def _data_transfer(self, decoded, msg):
+        session = self.sessions.get(decoded.source_address, decoded.pdu_specific)
+        if session is None or not session.add(msg.data, msg.timestamp) or not session.is_complete:
+            return None
+        self.sessions.close(session)
+
+        pgn = PGN.from_value(session.pgn)
+        if pgn.is_destination_specific:
+            pgn.pdu_specific = session.destination
+        arbitration_id = ArbitrationID(pgn=pgn, source_address=session.source,
+                                       destination_address=session.destination)
+        pdu = self._pdu_type(timestamp=msg.timestamp, arbitration_id=arbitration_id, data=session.buffer)
+        pdu.radix = 16
+        return pdu
+
+
+def decode_messages(messages, **kwargs):
+    """
+    Yield the PDUs decoded from an iterable of :class:`can.Message`.
+
+    Keyword arguments are passed to :class:`OfflineDecoder`.
+    """
+    decode = OfflineDecoder(**kwargs).decode
+    for msg in messages:
+        pdu = decode(msg)
+        if pdu is not None:
+            yield pdu
+
+
+def read_messages(path):
+    """Stream the frames of a python-can log file or a j1939 capture."""
+    with open(path, "rb") as f:
+        is_capture = f.read(len(MAGIC)) == MAGIC
+    if is_capture:
+        reader = CaptureReader(path)
+        try:
+            for msg in reader:
+                yield msg
+        finally:
+            reader.close()
+    else:
+        for msg in can.LogReader(path):
+            yield msg
+
+
+def _shard_key(can_id):
+    source = can_id & 0xFF
+    if (can_id >> 8) & 0xFF00 in (PGN_TP_CONNECTION_MANAGEMENT, PGN_TP_DATA_TRANSFER):
+        destination = (can_id >> 8) & 0xFF
+        return (min(source, destination) << 8) | max(source, destination)
+    return source
+
+
+def _decode_shard(args):
+    shard_path, result_path, kwargs = args
+    reader = CaptureReader(shard_path)
+    count = 0
+    try:
+        with open(result_path, "wb") as f:
+            batch = []
+            for pdu in decode_messages(reader, **kwargs):
+                # the PDUs leave this process, don't pickle memoryviews
+                pdu.data = bytes(pdu.data)
+                batch.append(pdu)
+                if len(batch) >= _RESULT_BATCH:
+                    pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+                count += len(batch)
+    finally:
+        reader.close()
+    return count
+
+
+def _read_results(path, shard):
+    with open(path, "rb") as f:
+        sequence = 0
+        while True:
+            try:
+                batch = pickle.load(f)
+            except EOFError:
+                return
+            for pdu in batch:
+                # shard and sequence keep ties in a stable order and stop
+                # heapq.merge from ever comparing PDUs
+                yield (pdu.timestamp, shard, sequence, pdu)
+                sequence += 1
+
+
+def decode_file(path, processes=None, **kwargs):
+    """
+    Yield the PDUs in a recording, in timestamp order.
+
+    :param str path: A python-can log file or a :mod:`j1939.capture` file.
+    :param int processes:
+        Worker processes, defaults to the number of CPUs; 1 decodes in
+        this process as the file is read.
+    :param kwargs: Passed to :class:`OfflineDecoder`.
+
+    Shards are written in the :mod:`j1939.capture` format, so with more
+    than one process timestamps are rounded to the microsecond.
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if processes <= 1:
+        for pdu in decode_messages(read_messages(path), **kwargs):
+            yield pdu
+        return
+
+    workdir = tempfile.mkdtemp(prefix="j1939-offline-")
+    try:
+        # Shard into compact capture files, see _shard_key; non J1939
+        # frames produce no PDUs and are left out
+        shard_paths = [os.path.join(workdir, "shard%d.j1939" % i) for i in range(processes)]
+        writers = [CaptureWriter(p, compress=False) for p in shard_paths]
+        try:
+            for msg in read_messages(path):
+                if msg.is_extended_id and not msg.is_error_frame:
+                    writers[_shard_key(msg.arbitration_id) % processes].write(msg)
+        finally:
+            for writer in writers:
+                writer.stop()
+
+        jobs = [(shard_path, shard_path + ".pdus", kwargs) for shard_path in shard_paths]
+        pool = multiprocessing.Pool(processes)
+        try:
+            counts = pool.map(_decode_shard, jobs)
+        finally:
+            pool.close()
+            pool.join()
+        logger.info("Decoded %d PDUs from %s in %d shards", sum(counts), path, processes)
+
+        results = [_read_results(job[1], shard) for shard, job in enumerate(jobs)]
+        for _, _, _, pdu in heapq.merge(*results):
+            yield pdu
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -17,25 +17,26 @@ class PDU(object):
     J1939 ensures that long messages are taken care of.
     """
 
+    __slots__ = ("timestamp", "_arbitration_id", "_data", "_info_strings", "radix")
+
     def __init__(self, timestamp=0.0, arbitration_id=None, data=None, info_strings=None):
         """
         :param float timestamp:
             Bus time in seconds.
         :param :class:`can.protocols.j1939.ArbitrationID` arbitration_id:
 
-        :param bytes/bytearray/list data:
-            With length up to 1785.
+        :param bytes/bytearray/memoryview/list data:
+            With length up to 1785.  bytes-like data is kept without copying.
         """
         if data is None:
             data = []
-        if info_strings is None:
-            info_strings = []
         self.timestamp = timestamp
         if arbitration_id:
             assert(isinstance(arbitration_id, ArbitrationID))
         self.arbitration_id = arbitration_id
         self._data = self._check_data(data)
-        self.info_strings = info_strings
+        # Only allocated when somebody actually records an info string
+        self._info_strings = info_strings
         self.radix=RADIX_DECIMAL
 
     def __eq__(self, other):
@@ -44,7 +45,7 @@ class PDU(object):
             return False
         if self.pgn != other.pgn:
             return False
-        if self._data != other.data:
+        if bytes(self._data) != bytes(other.data):
             return False
         if self.source != other.source:
             return False
@@ -52,6 +53,16 @@ class PDU(object):
             return False
         return True
 
+    @property
+    def info_strings(self):
+        if self._info_strings is None:
+            self._info_strings = []
+        return self._info_strings
+
+    @info_strings.setter
+    def info_strings(self, info_strings):
+        self._info_strings = info_strings
+
     @property
     def data(self):
         return self._data
@@ -105,22 +116,31 @@ class PDU(object):
             assert(0)
 
     def _check_data(self, value):
-        assert isinstance(value, (list, bytearray)), 'Needs to be list received {}, {}'.format(type(value), value)
-        assert len(value) <= 1785, 'Too much data to fit in a j1939 CAN message. Got {0} bytes'.format(len(value))
-        if len(value) > 0:
-            for element in value:
-                if isinstance(element, str):
-                    element = int(element)
-                #logger.warn("!!! element=%s type(element)=%s" % (element, type(element)))
-                assert element >= 0, 'Data values must be between 0 and 255, element={}'.format(element)
-                assert element <= 255, 'Data values must be between 0 and 255'
+        """
+        bytes, bytearray and memoryview payloads are stored as given, their
+        element type already guarantees 0-255; lists are checked in one
+        pass by converting them to bytes.
+        """
+        if isinstance(value, memoryview):
+            if value.ndim != 1 or value.format != 'B':
+                value = value.cast('B')
+        elif isinstance(value, list):
+            try:
+                bytes(value)
+            except (TypeError, ValueError):
+                raise ValueError('Data values must be ints between 0 and 255, got {}'.format(value))
+        elif not isinstance(value, (bytes, bytearray)):
+            raise TypeError('Needs to be bytes, bytearray, memoryview or list, received {}'.format(type(value)))
+        if len(value) > 1785:
+            raise ValueError('Too much data to fit in a j1939 CAN message. Got {0} bytes'.format(len(value)))
         return value
 
     def data_segments(self, segment_length=8):
-        retval = []
-        for i in range(0, len(self.data), segment_length):
-            retval.append(self.data[i:i + min(segment_length, (len(self.data) - i))])
-        return retval
+        if isinstance(self.data, list):
+            data = self.data
+        else:
+            data = memoryview(self.data)
+        return [data[i:i + segment_length] for i in range(0, len(data), segment_length)]
 
     def check_equality(self, other, fields, debug=False):
         """
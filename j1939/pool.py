@@ -0,0 +1,190 @@
+"""
+Process-wide pool of open buses for the :mod:`j1939.utils` helpers.
+
+Opening a :class:`j1939.Bus` starts an interface, a receive thread, a
+transport scheduler thread and a :class:`j1939.Node`; a helper called
+without a ``bus`` used to do all of that for a single request.  The pool
+keeps one bus per (channel, bustype, speed, source address and the
+other :class:`j1939.Bus` arguments), counts the callers using it and closes it once it has been idle for
+``idle_timeout`` seconds::
+
+    bus = bus_pool.acquire('can0', 'socketcan', 250, 0x00)
+    try:
+        ...
+    finally:
+        bus_pool.release(bus)
+
+or ``with bus_pool.bus('can0', 'socketcan', 250, 0x00) as bus:``.
+"""
+
+import atexit
+import contextlib
+import logging
+import threading
+
+import j1939
+from j1939.receivequeue import OVERFLOW_DROP_OLDEST
+
+logger = logging.getLogger("j1939")
+
+DEFAULT_IDLE_TIMEOUT = 30.0
+
+# nothing reads the receive queue of a pooled bus, the helpers wait on
+# the request correlator; keep only the most recent PDUs
+POOLED_QUEUE_SIZE = 1000
+
+
+def _options_key(kwargs):
+    options = []
+    for name, value in sorted(kwargs.items()):
+        try:
+            hash(value)
+        except TypeError:
+            # e.g. a list of j1939_filters
+            value = repr(value)
+        options.append((name, value))
+    return tuple(options)
+
+
+class _PooledBus(object):
+    __slots__ = ("key", "bus", "users", "timer")
+
+    def __init__(self, key, bus):
+        self.key = key
+        self.bus = bus
+        self.users = 0
+        self.timer = None
+
+
+class BusPool(object):
+    """
+    Reference counted buses keyed by (channel, bustype, speed, source
+    address, other :class:`j1939.Bus` arguments).
+
+    :param float idle_timeout:
+        Seconds an unused bus stays open, None to keep it until
+        :meth:`close`, 0 to close it as soon as the last user releases it.
+    """
+
+    def __init__(self, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._by_bus = {}
+        self.opened = 0
+        self.reused = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def acquire(self, channel, bustype, speed, src, **kwargs):
+        """
+        A bus with a :class:`j1939.Node` at ``src``, opened if the pool has none.
+
+        ``kwargs`` (e.g. ``keygen``) are passed to :class:`j1939.Bus` and
+        are part of the key: a bus opened with other arguments, say
+        without a seed/key responder, is not handed out.  Every acquire
+        must be matched by a :meth:`release`.
+        """
+        speed = int(speed)
+        key = (channel, bustype, speed, src, _options_key(kwargs))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.timer is not None:
+                    entry.timer.cancel()
+                    entry.timer = None
+                entry.users += 1
+                self.reused += 1
+                return entry.bus
+
+        # opening an interface can take a while, don't hold the lock
+        bus = self._open(channel, bustype, speed, src, kwargs)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _PooledBus(key, bus)
+                self._by_bus[id(bus)] = entry
+                self.opened += 1
+                bus = None
+            elif entry.timer is not None:
+                entry.timer.cancel()
+                entry.timer = None
+            entry.users += 1
+        if bus is not None:
+            # another thread opened the same one meanwhile
+            bus.shutdown()
+        return entry.bus
+
+    def _open(self, channel, bustype, speed, src, kwargs):
+        logger.debug("BusPool: opening %s/%s at %s kbit/s for 0x%.2x", bustype, channel, speed, src)
+        kwargs.setdefault("timeout", 0.01)
+        kwargs.setdefault("queue_size", POOLED_QUEUE_SIZE)
+        kwargs.setdefault("overflow_policy", OVERFLOW_DROP_OLDEST)
+        bus = j1939.Bus(channel=channel, bustype=bustype, speed=speed, bitrate=(int(speed) * 1000),
+                        broadcast=False, **kwargs)
+        bus.connect(j1939.Node(bus, j1939.NodeName(), [src]))
+        return bus
+
+    def release(self, bus):
+        """Give back a bus from :meth:`acquire`; the last user starts its idle timeout."""
+        close = False
+        with self._lock:
+            entry = self._by_bus.get(id(bus))
+            if entry is None or entry.users <= 0:
+                raise ValueError("bus was not acquired from this pool")
+            entry.users -= 1
+            if entry.users == 0:
+                if self.idle_timeout is not None and self.idle_timeout <= 0:
+                    self._forget(entry)
+                    close = True
+                elif self.idle_timeout is not None:
+                    entry.timer = threading.Timer(self.idle_timeout, self._expire, (entry,))
+                    entry.timer.daemon = True
+                    entry.timer.start()
+        if close:
+            self._close(entry)
+
+    @contextlib.contextmanager
+    def bus(self, channel, bustype, speed, src, **kwargs):
+        bus = self.acquire(channel, bustype, speed, src, **kwargs)
+        try:
+            yield bus
+        finally:
+            self.release(bus)
+
+    def _expire(self, entry):
+        with self._lock:
+            # reacquired (or closed) since the timer started
+            if entry.users or self._entries.get(entry.key) is not entry:
+                return
+            self._forget(entry)
+        self._close(entry)
+
+    def _forget(self, entry):
+        del self._entries[entry.key]
+        del self._by_bus[id(entry.bus)]
+
+    def _close(self, entry):
+        logger.debug("BusPool: closing %s/%s", entry.key[1], entry.key[0])
+        try:
+            entry.bus.shutdown()
+        except Exception:
+            logger.exception("BusPool: shutting down %s/%s failed", entry.key[1], entry.key[0])
+
+    def close(self):
+        """Close every bus in the pool, whether or not it is in use."""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+            self._by_bus.clear()
+        for entry in entries:
+            if entry.timer is not None:
+                entry.timer.cancel()
+            self._close(entry)
+
+
+#: The pool used by :mod:`j1939.utils` when no ``bus`` is given.
+bus_pool = BusPool()
+atexit.register(bus_pool.close)
@@ -0,0 +1,261 @@
+"""
+Per-stage latency profiling of the receive path.
+
+Each received frame is stamped with :func:`time.perf_counter_ns` as it
+passes the stages between the python-can notifier and :meth:`j1939.Bus.recv`:
+
+* ``frame_in``      the listener got the frame
+* ``decode``        arbitration ID decoded
+* ``dispatch``      decided who wants it
+* ``tp``            transport protocol handler done (TP.CM/TP.DT frames)
+* ``queue_put``     the PDU is handed to the receive queue
+* ``consumer_get``  :meth:`j1939.Bus.recv` returned it
+
+and handed as a :class:`FrameProfile` to the registered hooks when it
+leaves the stack.  Like :mod:`j1939.trace`, profiling is off by default
+and a disabled hook point costs a single flag check::
+
+    collector = LatencyCollector()
+    profiling.add_hook(collector)
+    ...
+    collector.stats()   # {"decode": {"p50_us": .., "p99_us": ..}, ...}
+
+:class:`ChromeTraceRecorder` keeps the frames of a bounded window and
+writes them in the Chrome trace event format (chrome://tracing, Perfetto,
+speedscope).
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import deque
+from time import perf_counter_ns
+
+logger = logging.getLogger("j1939")
+
+STAGE_FRAME_IN = "frame_in"
+STAGE_DECODE = "decode"
+STAGE_DISPATCH = "dispatch"
+STAGE_TP = "tp"
+STAGE_QUEUE_PUT = "queue_put"
+STAGE_CONSUMER_GET = "consumer_get"
+
+STAGES = (STAGE_FRAME_IN, STAGE_DECODE, STAGE_DISPATCH, STAGE_TP, STAGE_QUEUE_PUT, STAGE_CONSUMER_GET)
+
+#: Checked by every hook point before doing any work.
+enabled = False
+
+_hooks = []
+_local = threading.local()
+
+# frames whose PDU waits in a receive queue, by id(pdu)
+_pending = {}
+MAX_PENDING = 65536
+
+
+class FrameProfile(object):
+    """
+    The stage stamps of one frame.
+
+    :attr:`stamps` is a list of ``(stage, perf_counter_ns)`` in the order
+    the stages were passed; ``consumer_get`` is stamped on
+    :attr:`consumer_thread`, everything else on :attr:`thread`.
+    """
+
+    __slots__ = ("can_id", "thread", "consumer_thread", "stamps", "queued")
+
+    def __init__(self, can_id, thread, start):
+        self.can_id = can_id
+        self.thread = thread
+        self.consumer_thread = None
+        self.stamps = [(STAGE_FRAME_IN, start)]
+        self.queued = False
+
+    @property
+    def total_ns(self):
+        return self.stamps[-1][1] - self.stamps[0][1]
+
+    def durations(self):
+        """``(stage, ns since the previous stamp)`` for every stage after ``frame_in``."""
+        stamps = self.stamps
+        return [(stamps[i][0], stamps[i][1] - stamps[i - 1][1]) for i in range(1, len(stamps))]
+
+    def __repr__(self):
+        return "FrameProfile(0x%.8x, %s)" % (self.can_id, self.durations())
+
+
+def add_hook(hook):
+    """Turn profiling on and add ``hook``, a callable taking a :class:`FrameProfile`."""
+    global enabled
+    if hook not in _hooks:
+        _hooks.append(hook)
+    enabled = True
+
+
+def remove_hook(hook=None):
+    """Remove ``hook`` (or all hooks when None); profiling is off once none are left."""
+    global enabled
+    if hook is None:
+        del _hooks[:]
+    elif hook in _hooks:
+        _hooks.remove(hook)
+    enabled = bool(_hooks)
+    if not enabled:
+        _pending.clear()
+
+
+def _emit(profile):
+    for hook in _hooks:
+        try:
+            hook(profile)
+        except Exception:
+            logger.exception("Profiling hook %r failed", hook)
+
+
+def begin(can_id):
+    _local.current = FrameProfile(can_id, threading.current_thread().ident, perf_counter_ns())
+
+
+def mark(stage):
+    current = getattr(_local, "current", None)
+    if current is not None:
+        current.stamps.append((stage, perf_counter_ns()))
+
+
+def queued(pdu):
+    """The current frame's PDU went into the receive queue, it is finished by :func:`consumed`."""
+    current = getattr(_local, "current", None)
+    if current is None:
+        return
+    current.stamps.append((STAGE_QUEUE_PUT, perf_counter_ns()))
+    current.queued = True
+    if len(_pending) >= MAX_PENDING:
+        # nobody is reading the queue, forget the oldest
+        _pending.pop(next(iter(_pending)), None)
+    _pending[id(pdu)] = (pdu, current)
+
+
+def end():
+    """The receive path is done with the current frame."""
+    current = getattr(_local, "current", None)
+    _local.current = None
+    if current is not None and not current.queued:
+        _emit(current)
+
+
+def consumed(pdu):
+    """A consumer took ``pdu`` out of the receive queue."""
+    entry = _pending.pop(id(pdu), None)
+    if entry is None or entry[0] is not pdu:
+        return
+    profile = entry[1]
+    profile.stamps.append((STAGE_CONSUMER_GET, perf_counter_ns()))
+    profile.consumer_thread = threading.current_thread().ident
+    _emit(profile)
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class LatencyCollector(object):
+    """
+    Hook aggregating the time spent in each stage, and in total, over the
+    most recent ``maxlen`` frames.
+    """
+
+    def __init__(self, maxlen=100000):
+        self.maxlen = maxlen
+        self._samples = {}
+        self.frames = 0
+
+    def __call__(self, profile):
+        self.frames += 1
+        samples = self._samples
+        for stage, ns in profile.durations():
+            stage_samples = samples.get(stage)
+            if stage_samples is None:
+                stage_samples = samples[stage] = deque(maxlen=self.maxlen)
+            stage_samples.append(ns)
+        total = samples.get("total")
+        if total is None:
+            total = samples["total"] = deque(maxlen=self.maxlen)
+        total.append(profile.total_ns)
+
+    def clear(self):
+        self._samples = {}
+        self.frames = 0
+
+    def stats(self):
+        """``{stage: {count, p50_us, p90_us, p99_us, max_us}}``, plus ``total``."""
+        result = {}
+        for stage, samples in list(self._samples.items()):
+            ordered = sorted(samples)
+            if not ordered:
+                continue
+            result[stage] = {
+                "count": len(ordered),
+                "p50_us": _percentile(ordered, 0.50) / 1000.0,
+                "p90_us": _percentile(ordered, 0.90) / 1000.0,
+                "p99_us": _percentile(ordered, 0.99) / 1000.0,
+                "max_us": ordered[-1] / 1000.0,
+            }
+        return result
+
+
+class ChromeTraceRecorder(object):
+    """
+    Hook keeping the frames of a bounded capture window for
+    :meth:`write`, in the Chrome trace event format.
+
+    Each frame is a span on the receive thread with a nested span per
+    stage; the time a PDU waited in the queue is a span on the consumer's
+    thread.
+
+    :param float window: Seconds to record from the first frame on.
+    :param int max_frames: Frames recorded at most.
+    """
+
+    def __init__(self, window=10.0, max_frames=100000):
+        self.window_ns = int(window * 1e9)
+        self.max_frames = max_frames
+        self.profiles = []
+        self._start = None
+
+    @property
+    def full(self):
+        return len(self.profiles) >= self.max_frames
+
+    def __call__(self, profile):
+        start = profile.stamps[0][1]
+        if self._start is None:
+            self._start = start
+        if self.full or start - self._start > self.window_ns:
+            return
+        self.profiles.append(profile)
+
+    def events(self):
+        pid = os.getpid()
+        origin = self._start or 0
+        events = []
+        for profile in self.profiles:
+            stamps = profile.stamps
+            # the frame span ends where the receive thread let go of it
+            end = stamps[-2][1] if profile.consumer_thread is not None else stamps[-1][1]
+            events.append({"name": "frame 0x%.8x" % profile.can_id, "cat": "j1939", "ph": "X", "pid": pid,
+                           "tid": profile.thread, "ts": (stamps[0][1] - origin) / 1000.0,
+                           "dur": (end - stamps[0][1]) / 1000.0})
+            for i in range(1, len(stamps)):
+                stage, ns = stamps[i]
+                tid = profile.thread
+                if stage == STAGE_CONSUMER_GET:
+                    stage, tid = "queue wait", profile.consumer_thread
+                events.append({"name": stage, "cat": "j1939", "ph": "X", "pid": pid, "tid": tid,
+                               "ts": (stamps[i - 1][1] - origin) / 1000.0,
+                               "dur": (ns - stamps[i - 1][1]) / 1000.0})
+        return events
+
+    def write(self, path):
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.events(), "displayTimeUnit": "ns"}, f)
@@ -0,0 +1,250 @@
+"""
+Single threaded reactor for one or more :class:`j1939.Bus` objects.
+
+By default every bus runs a python-can notifier thread, a BAM scheduler
+thread and a thread per connected :class:`j1939.Node`.  With
+``j1939.Bus(..., reactor=True)`` one reactor thread does all of it
+instead: it waits on the interface's file descriptor with a selector,
+runs the receive path, calls the Nodes inline, sends the BAM frames that
+are due and times out stalled transport sessions, sleeping exactly until
+the next of those deadlines.  Several buses can share a reactor, so
+simulating many ECUs doesn't cost a thread each::
+
+    reactor = Reactor()
+    buses = [j1939.Bus(channel='vcan0', bustype='socketcan', reactor=reactor) for _ in range(40)]
+
+Interfaces without a file descriptor (``virtual``, most USB adapters)
+get a reader thread that blocks in their ``recv`` and hands the frames
+over to the reactor.
+
+Node and subscription callbacks run on the reactor thread and hold up
+every bus on it while they do; they must not block.
+"""
+
+import logging
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+
+from can import CanError
+
+logger = logging.getLogger("j1939")
+
+# frames read from one interface before the others and the timers get a turn
+MAX_BATCH = 64
+
+
+class _Entry(object):
+    __slots__ = ("bus", "listener", "active", "reader")
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.listener = bus._listener
+        self.active = True
+        self.reader = None
+
+
+class Reactor(object):
+    """
+    The thread serving the buses added with :meth:`add`.
+
+    It starts with the first bus; :meth:`stop` ends it.
+    """
+
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_rx, self._wakeup_tx = socket.socketpair()
+        self._wakeup_rx.setblocking(False)
+        self._wakeup_tx.setblocking(False)
+        self._selector.register(self._wakeup_rx, selectors.EVENT_READ, None)
+        self._wakeup_pending = False
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._changes = deque()
+        # frames from the reader threads of interfaces without a file descriptor
+        self._inbox = deque()
+        self._thread = None
+        self._running = False
+        self._stopped = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def thread(self):
+        return self._thread
+
+    def add(self, bus):
+        """Serve ``bus`` from now on."""
+        entry = _Entry(bus)
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError("reactor is stopped")
+            if id(bus) in self._entries:
+                raise ValueError("bus already added to this reactor")
+            self._entries[id(bus)] = entry
+            self._changes.append(entry)
+            if self._thread is None:
+                self._running = True
+                self._thread = threading.Thread(target=self._run, name="j1939-reactor")
+                self._thread.daemon = True
+                self._thread.start()
+        self.wakeup()
+
+    def remove(self, bus):
+        """Stop serving ``bus``; returns False if it wasn't added."""
+        with self._lock:
+            entry = self._entries.pop(id(bus), None)
+            if entry is None:
+                return False
+            entry.active = False
+            self._changes.append(entry)
+        self.wakeup()
+        return True
+
+    def wakeup(self):
+        """Make the reactor thread recompute its deadlines, callable from any thread."""
+        if self._wakeup_pending:
+            return
+        self._wakeup_pending = True
+        try:
+            self._wakeup_tx.send(b"\0")
+        except (BlockingIOError, OSError):
+            # full (it will wake up anyway) or closed
+            pass
+
+    def stop(self, timeout=None):
+        with self._lock:
+            self._running = False
+            self._stopped = True
+            entries = list(self._entries.values())
+            self._entries.clear()
+            thread = self._thread
+        for entry in entries:
+            entry.active = False
+        self.wakeup()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def _apply_changes(self):
+        while self._changes:
+            entry = self._changes.popleft()
+            try:
+                if entry.active:
+                    self._register(entry)
+                else:
+                    self._unregister(entry)
+            except Exception:
+                logger.exception("Reactor: (un)registering %s failed", entry.bus.can_bus.channel_info)
+
+    def _register(self, entry):
+        # python-can only has BusABC.fileno from 4.0 on
+        fileno = getattr(entry.bus.can_bus, "fileno", None)
+        try:
+            fileno = fileno() if fileno is not None else -1
+        except NotImplementedError:
+            fileno = -1
+        if fileno is not None and fileno >= 0:
+            logger.debug("Reactor: selecting on fd %d of %s", fileno, entry.bus.can_bus.channel_info)
+            self._selector.register(fileno, selectors.EVENT_READ, entry)
+        else:
+            logger.debug("Reactor: %s has no file descriptor, reading it on a thread",
+                         entry.bus.can_bus.channel_info)
+            entry.reader = threading.Thread(target=self._read, args=(entry,), name="j1939-reactor-reader")
+            entry.reader.daemon = True
+            entry.reader.start()
+
+    def _unregister(self, entry):
+        if entry.reader is None:
+            for key in list(self._selector.get_map().values()):
+                if key.data is entry:
+                    self._selector.unregister(key.fileobj)
+
+    def _read(self, entry):
+        """Reader thread of an interface without a file descriptor."""
+        recv = entry.bus.can_bus.recv
+        inbox = self._inbox
+        while entry.active:
+            try:
+                msg = recv(entry.bus.timeout)
+            except (CanError, ValueError, OSError):
+                # shutting down the interface under a blocked recv
+                if entry.active:
+                    logger.exception("Reactor: receiving from %s failed", entry.bus.can_bus.channel_info)
+                return
+            if msg is not None:
+                inbox.append((entry, msg))
+                self.wakeup()
+
+    def _dispatch(self, entry, msg):
+        try:
+            entry.listener(msg)
+        except Exception:
+            logger.exception("Reactor: handling %s failed", msg)
+
+    def _drain(self, entry):
+        recv = entry.bus.can_bus.recv
+        for _ in range(MAX_BATCH):
+            try:
+                msg = recv(0)
+            except (CanError, ValueError, OSError):
+                if entry.active:
+                    logger.exception("Reactor: receiving from %s failed", entry.bus.can_bus.channel_info)
+                return
+            if msg is None:
+                return
+            self._dispatch(entry, msg)
+
+    def _run_timers(self):
+        """Runs what is due, returns the seconds to the next deadline or None."""
+        now = time.monotonic()
+        deadline = None
+        for entry in list(self._entries.values()):
+            try:
+                due = entry.bus._run_timers(now)
+            except Exception:
+                logger.exception("Reactor: timers of %s failed", entry.bus.can_bus.channel_info)
+                continue
+            if due is not None and (deadline is None or due < deadline):
+                deadline = due
+        if deadline is None:
+            return None
+        return max(0.0, deadline - time.monotonic())
+
+    def _run(self):
+        selector = self._selector
+        inbox = self._inbox
+        try:
+            while self._running:
+                self._apply_changes()
+                timeout = self._run_timers()
+                if inbox:
+                    timeout = 0
+                for key, _ in selector.select(timeout):
+                    entry = key.data
+                    if entry is None:
+                        try:
+                            while self._wakeup_rx.recv(4096):
+                                pass
+                        except BlockingIOError:
+                            pass
+                        # only now, a wakeup after this sends a new byte and
+                        # whatever it announces is picked up below or on the
+                        # next turn
+                        self._wakeup_pending = False
+                    elif entry.active:
+                        self._drain(entry)
+                for _ in range(len(inbox)):
+                    entry, msg = inbox.popleft()
+                    if entry.active:
+                        self._dispatch(entry, msg)
+        finally:
+            self._changes.clear()
+            for entry in list(self._entries.values()):
+                entry.active = False
+            selector.close()
+            self._wakeup_rx.close()
+            self._wakeup_tx.close()
+            self._thread = None
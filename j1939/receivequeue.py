@@ -0,0 +1,160 @@
+import logging
+from collections import deque
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+logger = logging.getLogger("j1939")
+
+#: Wait for room, pushing back on the receive thread (the default).
+OVERFLOW_BLOCK = "block"
+#: Discard the oldest queued PDU to make room.
+OVERFLOW_DROP_OLDEST = "drop-oldest"
+#: Discard the PDU being added.
+OVERFLOW_DROP_NEWEST = "drop-newest"
+#: Discard the oldest PDU of the lowest J1939 priority (highest priority
+#: number) queued, or the new PDU if its priority is lower than all of them.
+OVERFLOW_PRIORITY = "priority"
+
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_PRIORITY)
+
+# J1939 priorities run from 0 (highest) to 7 (lowest)
+_LOWEST_PRIORITY = 7
+
+
+def _priority(item):
+    try:
+        return item.arbitration_id.priority
+    except AttributeError:
+        return _LOWEST_PRIORITY
+
+
+class ReceiveQueue(Queue):
+    """
+    A :class:`queue.Queue` of received PDUs with an optional bound and a
+    policy for what happens when it is full.
+
+    :param int maxsize:
+        Maximum number of queued PDUs, 0 for unbounded.
+    :param str policy:
+        One of :data:`OVERFLOW_POLICIES`.
+
+    Counters, read without locking:
+
+    * :attr:`depth` - PDUs currently queued
+    * :attr:`high_water` - largest depth seen
+    * :attr:`dropped` - PDUs discarded by the overflow policy, with
+      :attr:`dropped_by_priority` breaking them down per J1939 priority
+
+    :attr:`on_put`, when set, is called without arguments after every
+    put, outside the queue's lock, for a consumer waiting on several
+    queues at once.
+    """
+
+    def __init__(self, maxsize=0, policy=OVERFLOW_BLOCK):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError("overflow policy must be one of %s" % (OVERFLOW_POLICIES,))
+        self.policy = policy
+        self.high_water = 0
+        self.dropped = 0
+        self.dropped_by_priority = [0] * (_LOWEST_PRIORITY + 1)
+        self.on_put = None
+        Queue.__init__(self, maxsize)
+
+    @property
+    def depth(self):
+        return self._qsize()
+
+    # The priority policy keeps one FIFO per priority, tagged with an
+    # arrival number so get() still returns PDUs in arrival order, and
+    # finds the PDU to shed without scanning the queue.
+
+    def _init(self, maxsize):
+        if self.policy == OVERFLOW_PRIORITY:
+            self._lanes = [deque() for _ in range(_LOWEST_PRIORITY + 1)]
+            self._arrival = 0
+            self._count = 0
+        else:
+            self.queue = deque()
+
+    def _qsize(self):
+        if self.policy == OVERFLOW_PRIORITY:
+            return self._count
+        return len(self.queue)
+
+    def _put(self, item):
+        if self.policy == OVERFLOW_PRIORITY:
+            priority = min(_priority(item), _LOWEST_PRIORITY)
+            self._lanes[priority].append((self._arrival, item))
+            self._arrival += 1
+            self._count += 1
+        else:
+            self.queue.append(item)
+        depth = self._qsize()
+        if depth > self.high_water:
+            self.high_water = depth
+
+    def _get(self):
+        if self.policy == OVERFLOW_PRIORITY:
+            oldest = None
+            for lane in self._lanes:
+                if lane and (oldest is None or lane[0][0] < oldest[0][0]):
+                    oldest = lane
+            self._count -= 1
+            return oldest.popleft()[1]
+        return self.queue.popleft()
+
+    def _drop(self, item):
+        self.dropped += 1
+        self.dropped_by_priority[min(_priority(item), _LOWEST_PRIORITY)] += 1
+
+    def _make_room(self, item):
+        """
+        Apply the overflow policy to a full queue, called with the mutex held.
+
+        :return: False if ``item`` itself should be dropped.
+        """
+        if self.policy == OVERFLOW_DROP_NEWEST:
+            return False
+        if self.policy == OVERFLOW_DROP_OLDEST:
+            evicted = self._get()
+        else:
+            priority = min(_priority(item), _LOWEST_PRIORITY)
+            worst = _LOWEST_PRIORITY
+            while not self._lanes[worst]:
+                worst -= 1
+            if priority > worst:
+                return False
+            evicted = self._lanes[worst].popleft()[1]
+            self._count -= 1
+        self.unfinished_tasks -= 1
+        self._drop(evicted)
+        return True
+
+    def put(self, item, block=True, timeout=None):
+        if self.policy == OVERFLOW_BLOCK:
+            Queue.put(self, item, block, timeout)
+        else:
+            with self.not_full:
+                if 0 < self.maxsize <= self._qsize() and not self._make_room(item):
+                    self._drop(item)
+                    return
+                self._put(item)
+                self.unfinished_tasks += 1
+                self.not_empty.notify()
+        if self.on_put is not None:
+            self.on_put()
+
+    def clear(self):
+        """Discard everything queued, without counting it as dropped."""
+        with self.mutex:
+            while self._qsize():
+                self._get()
+            self.unfinished_tasks = 0
+            self.all_tasks_done.notify_all()
+            self.not_full.notify_all()
+
+    def stats(self):
+        return {"depth": self.depth, "high_water": self.high_water, "dropped": self.dropped,
+                "maxsize": self.maxsize, "policy": self.policy}
@@ -0,0 +1,357 @@
+"""
+Decoding of suspect parameters (SPNs) from PDU payloads.
+
+An :class:`SPNDatabase` holds :class:`SPNDefinition` objects loaded from
+a CSV file (plain columns or J1939 digital annex style) or a DBC file.
+The definitions of each PGN are compiled once into a :class:`PGNExtractor`
+which turns a payload into ``{name: value}`` with scaled engineering
+values::
+
+    db = SPNDatabase.from_csv("j1939da.csv")
+    values = db.decode(pdu)    # {"Engine Speed": 1200.5, ...}
+
+Raw values in the ranges J1939-71 reserves for "error" and "not
+available" decode to :data:`ERROR` and :data:`NOT_AVAILABLE` instead of a
+number; so do parameters that lie beyond the end of a short payload.
+"""
+
+import csv
+import io
+import logging
+import re
+from collections import namedtuple
+
+from j1939.subscription import normalize_pgn
+
+logger = logging.getLogger("j1939")
+
+
+class _Indicator(object):
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+    def __bool__(self):
+        return False
+
+    __nonzero__ = __bool__
+
+
+#: Value of a parameter the sender reports as not available (J1939-71).
+NOT_AVAILABLE = _Indicator("NOT_AVAILABLE")
+#: Value of a parameter the sender reports as in error (J1939-71).
+ERROR = _Indicator("ERROR")
+
+SPNDefinition = namedtuple("SPNDefinition", [
+    "spn",          # suspect parameter number, None if unknown
+    "name",
+    "pgn",          # PDU1 PGNs without the destination address
+    "start_bit",    # bit offset in the payload, little endian (J1939) bit order
+    "length",       # bits
+    "scale",        # resolution per bit
+    "offset",
+    "units",
+    "signed",       # two's complement; J1939-71 parameters are unsigned
+])
+SPNDefinition.__new__.__defaults__ = (1.0, 0.0, "", False)
+
+
+def _special_values(length, signed):
+    """
+    (largest valid raw value, first "not available" raw value) for a
+    parameter of ``length`` bits; raw values in between are errors.
+    """
+    mask = (1 << length) - 1
+    if signed or length == 1:
+        return mask, mask + 1
+    if length < 8:
+        # discrete parameters: all ones is not available, all ones - 1 error
+        return mask - 2, mask
+    # the most significant byte decides: 0x00-0xFA valid, 0xFB-0xFE
+    # error (0xFB-0xFD are reserved indicators), 0xFF not available
+    shift = length - 8
+    return (0xFB << shift) - 1, 0xFF << shift
+
+
+class PGNExtractor(object):
+    """
+    Decodes the parameters of one PGN.
+
+    The payload is read as a single little endian integer and each
+    parameter is a precomputed shift and mask of it, with its scaling and
+    J1939-71 special value thresholds looked up in a tuple.
+    """
+
+    __slots__ = ("pgn", "definitions", "_fields")
+
+    def __init__(self, pgn, definitions):
+        self.pgn = pgn
+        self.definitions = tuple(sorted(definitions, key=lambda d: d.start_bit))
+        fields = []
+        for d in self.definitions:
+            mask = (1 << d.length) - 1
+            valid_max, not_available = _special_values(d.length, d.signed)
+            sign_bit = (1 << (d.length - 1)) if d.signed else 0
+            fields.append((d.name, d.start_bit, d.start_bit + d.length, mask, valid_max, not_available,
+                           sign_bit, d.scale, d.offset))
+        self._fields = tuple(fields)
+
+    def __call__(self, data):
+        value = int.from_bytes(bytes(data), "little")
+        size = len(data) * 8
+        values = {}
+        for name, shift, end, mask, valid_max, not_available, sign_bit, scale, offset in self._fields:
+            if end > size:
+                values[name] = NOT_AVAILABLE
+                continue
+            raw = (value >> shift) & mask
+            if raw > valid_max:
+                values[name] = NOT_AVAILABLE if raw >= not_available else ERROR
+                continue
+            if raw & sign_bit:
+                raw -= mask + 1
+            values[name] = raw * scale + offset
+        return values
+
+
+class SPNDatabase(object):
+    """
+    SPN definitions grouped by PGN, with a compiled extractor per PGN.
+    """
+
+    def __init__(self, definitions=()):
+        self._definitions = {}
+        self._extractors = {}
+        for definition in definitions:
+            self.add(definition)
+
+    def __len__(self):
+        return sum(len(d) for d in self._definitions.values())
+
+    def __contains__(self, pgn):
+        return normalize_pgn(pgn) in self._definitions
+
+    @property
+    def pgns(self):
+        return sorted(self._definitions)
+
+    def add(self, definition):
+        if definition.length < 1:
+            raise ValueError("SPN %s has no length" % (definition.spn,))
+        definition = definition._replace(pgn=normalize_pgn(definition.pgn))
+        self._definitions.setdefault(definition.pgn, []).append(definition)
+        # extractors are cached under the PGN they were asked for
+        self._extractors.clear()
+
+    def definitions(self, pgn):
+        return list(self._definitions.get(normalize_pgn(pgn), ()))
+
+    def extractor(self, pgn):
+        """The compiled :class:`PGNExtractor` for ``pgn``, None if it has no definitions."""
+        try:
+            return self._extractors[pgn]
+        except KeyError:
+            definitions = self._definitions.get(normalize_pgn(pgn))
+            if definitions is None:
+                return None
+            extractor = self._extractors[pgn] = PGNExtractor(normalize_pgn(pgn), definitions)
+            return extractor
+
+    def decode(self, pdu):
+        """
+        :return: ``{name: value}`` for the parameters of ``pdu``'s PGN, or
+                 None when the PGN has no definitions.
+        """
+        extractor = self.extractor(pdu.pgn)
+        if extractor is None:
+            return None
+        return extractor(pdu.data)
+
+    def decode_data(self, pgn, data):
+        extractor = self.extractor(pgn)
+        if extractor is None:
+            return None
+        return extractor(data)
+
+    # ---- loaders ----
+
+    @classmethod
+    def from_csv(cls, path_or_file):
+        """
+        Load definitions from a CSV file with a header row.
+
+        Both plain columns (``pgn, spn, name, start_bit, length, scale,
+        offset, units``, length in bits) and the digital annex columns
+        (``PGN, SPN, SPN Name, SPN Position in PG, SPN Length,
+        Resolution, Offset, Units``, e.g. ``4-5``, ``2 bytes``, ``0.125
+        rpm/bit``) are understood.  Rows without a fixed position or
+        length (variable length text parameters) are skipped.
+        """
+        db = cls()
+        if hasattr(path_or_file, "read"):
+            _load_csv(db, path_or_file)
+        else:
+            with io.open(path_or_file, newline="", encoding="utf-8-sig") as f:
+                _load_csv(db, f)
+        return db
+
+    @classmethod
+    def from_dbc(cls, path_or_file):
+        """
+        Load definitions from a DBC file.
+
+        Message IDs are taken as 29-bit J1939 identifiers, the SPN number
+        from ``BA_ "SPN"`` attributes when present.  Only little endian
+        (``@1``) signals are supported, as used by J1939.
+        """
+        db = cls()
+        if hasattr(path_or_file, "read"):
+            _load_dbc(db, path_or_file)
+        else:
+            with io.open(path_or_file, encoding="latin-1") as f:
+                _load_dbc(db, f)
+        return db
+
+
+_NUMBER = re.compile(r"^\s*([-+]?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)(?:\s*/\s*(\d+(?:\.\d*)?))?")
+
+_CSV_COLUMNS = {
+    "pgn": ("pgn", "parameter group number"),
+    "spn": ("spn", "sp", "spn number"),
+    "name": ("name", "spn name", "sp label", "spn label", "sp name", "label"),
+    "start_bit": ("start_bit", "start bit"),
+    "position": ("spn position in pg", "sp position in pg", "position"),
+    "length": ("length", "spn length", "sp length"),
+    "scale": ("scale", "resolution", "factor"),
+    "offset": ("offset",),
+    "units": ("units", "unit"),
+}
+
+
+def _number(text, default=None):
+    """Leading number of a cell, e.g. 0.125 from "0.125 rpm/bit" or 1/128 from "1/128 km/h per bit"."""
+    if text is None:
+        return default
+    text = text.replace(",", "")
+    match = _NUMBER.match(text)
+    if match is None:
+        return default
+    value = float(match.group(1))
+    if match.group(2):
+        value /= float(match.group(2))
+    return value
+
+
+def _scale(text):
+    """Resolution per bit; state, ASCII and binary parameters are unscaled."""
+    if text is None or re.search(r"state|ascii|binary", text, re.IGNORECASE):
+        return 1.0
+    return _number(text, 1.0)
+
+
+def _length_bits(text):
+    text = text.strip().lower()
+    number = _number(text)
+    if number is None:
+        return None
+    if "byte" in text:
+        return int(number * 8)
+    return int(number)
+
+
+def _position_bit(text):
+    """Bit offset of a digital annex position, "4-5" -> 24, "1.5" -> 4 (bytes and bits count from 1)."""
+    first = text.strip().split("-")[0].strip()
+    if not first:
+        return None
+    if "." in first:
+        byte, bit = first.split(".", 1)
+        return (int(byte) - 1) * 8 + int(bit) - 1
+    return (int(first) - 1) * 8
+
+
+def _load_csv(db, f):
+    reader = csv.reader(f)
+    try:
+        header = [h.strip().lower() for h in next(reader)]
+    except StopIteration:
+        return
+    columns = {}
+    for key, names in _CSV_COLUMNS.items():
+        for name in names:
+            if name in header:
+                columns[key] = header.index(name)
+                break
+    if "pgn" not in columns or "length" not in columns or \
+       ("start_bit" not in columns and "position" not in columns):
+        raise ValueError("CSV needs pgn, length and start_bit or position columns, got %s" % header)
+
+    def cell(row, key):
+        index = columns.get(key)
+        if index is None or index >= len(row):
+            return None
+        return row[index].strip()
+
+    for row in reader:
+        if not row or not cell(row, "pgn"):
+            continue
+        try:
+            pgn = int(cell(row, "pgn"), 0)
+            if "start_bit" in columns:
+                start_bit = int(cell(row, "start_bit"))
+            else:
+                start_bit = _position_bit(cell(row, "position") or "")
+            length = _length_bits(cell(row, "length") or "")
+        except ValueError:
+            start_bit = length = None
+        if start_bit is None or not length:
+            logger.debug("Skipping SPN row without a fixed position and length: %s", row)
+            continue
+        spn = cell(row, "spn")
+        db.add(SPNDefinition(spn=int(spn) if spn and spn.isdigit() else None,
+                             name=cell(row, "name") or "SPN %s" % spn,
+                             pgn=pgn,
+                             start_bit=start_bit,
+                             length=length,
+                             scale=_scale(cell(row, "scale")),
+                             offset=_number(cell(row, "offset"), 0.0),
+                             units=cell(row, "units") or ""))
+
+
+_DBC_MESSAGE = re.compile(r"^BO_\s+(\d+)\s+(\w+)\s*:")
+_DBC_SIGNAL = re.compile(r"^SG_\s+(\w+)\s*(?:[mM]\d*\s*)?:\s*(\d+)\|(\d+)@([01])([+-])\s*"
+                         r"\(\s*([^,]+),\s*([^)]+)\)\s*\[[^\]]*\]\s*\"([^\"]*)\"")
+_DBC_SPN = re.compile(r"^BA_\s+\"SPN\"\s+SG_\s+(\d+)\s+(\w+)\s+(\d+)\s*;")
+
+
+def _load_dbc(db, f):
+    signals = []
+    spns = {}
+    message_id = None
+    for line in f:
+        line = line.strip()
+        match = _DBC_MESSAGE.match(line)
+        if match:
+            message_id = int(match.group(1)) & 0x1FFFFFFF
+            continue
+        match = _DBC_SIGNAL.match(line)
+        if match and message_id is not None:
+            name, start, length, byte_order, sign, scale, offset, units = match.groups()
+            if byte_order == "0":
+                logger.warning("Skipping big endian DBC signal %s", name)
+                continue
+            signals.append((message_id, name, int(start), int(length), sign == "-",
+                            float(scale), float(offset), units))
+            continue
+        match = _DBC_SPN.match(line)
+        if match:
+            spns[(int(match.group(1)) & 0x1FFFFFFF, match.group(2))] = int(match.group(3))
+
+    for message_id, name, start, length, signed, scale, offset, units in signals:
+        db.add(SPNDefinition(spn=spns.get((message_id, name)), name=name,
+                             pgn=(message_id >> 8) & 0x3FFFF, start_bit=start, length=length,
+                             scale=scale, offset=offset, units=units, signed=signed))
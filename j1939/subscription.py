@@ -0,0 +1,109 @@
+import logging
+import threading
+
+logger = logging.getLogger("j1939")
+
+
+def normalize_pgn(pgn):
+    """
+    The PGN the way :attr:`j1939.PDU.pgn` reports it: a PDU1 PGN keeps
+    only its pdu_format, without destination address, data page and
+    reserved bits.
+    """
+    pgn &= 0x3FFFF
+    if (pgn & 0xFF00) < 0xF000 or pgn & 0x20000:
+        pgn &= 0xFF00
+    return pgn
+
+
+class Subscription(object):
+    """
+    A callback registered with :meth:`j1939.Bus.subscribe`.
+
+    ``pgn``, ``source`` and ``destination`` are None to match anything.
+    PDU2 (broadcast) PGNs carry no destination, so a subscription with a
+    destination only ever matches PDU1 traffic.
+    """
+
+    __slots__ = ("pgn", "source", "destination", "callback")
+
+    def __init__(self, callback, pgn=None, source=None, destination=None):
+        self.callback = callback
+        self.pgn = None if pgn is None else normalize_pgn(pgn)
+        self.source = source
+        self.destination = destination
+
+    def matches(self, source, destination):
+        return ((self.source is None or self.source == source) and
+                (self.destination is None or self.destination == destination))
+
+    def __repr__(self):
+        return "Subscription(pgn=%s, source=%s, destination=%s, callback=%r)" % (
+            self.pgn, self.source, self.destination, self.callback)
+
+
+class SubscriptionIndex(object):
+    """
+    Subscriptions grouped by PGN for the receive path.
+
+    The lookup tables are rebuilt on every change and swapped in with
+    single assignments, so the receive thread reads them without locking.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = []
+        self._by_pgn = {}
+        self._any_pgn = ()
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    def __bool__(self):
+        return bool(self._subscriptions)
+
+    __nonzero__ = __bool__
+
+    def add(self, subscription):
+        with self._lock:
+            self._subscriptions.append(subscription)
+            self._rebuild()
+
+    def remove(self, subscription):
+        with self._lock:
+            try:
+                self._subscriptions.remove(subscription)
+            except ValueError:
+                return False
+            self._rebuild()
+        return True
+
+    def _rebuild(self):
+        by_pgn = {}
+        any_pgn = []
+        for subscription in self._subscriptions:
+            if subscription.pgn is None:
+                any_pgn.append(subscription)
+            else:
+                by_pgn.setdefault(subscription.pgn, []).append(subscription)
+        self._by_pgn = dict((pgn, tuple(subscriptions)) for pgn, subscriptions in by_pgn.items())
+        self._any_pgn = tuple(any_pgn)
+
+    def match(self, pgn, source, destination):
+        """
+        :param int pgn: The PGN with any PDU1 destination stripped.
+        :return: A list of the matching subscriptions, possibly empty.
+        """
+        candidates = self._by_pgn.get(pgn, ())
+        if self._any_pgn:
+            candidates += self._any_pgn
+        return [s for s in candidates if s.matches(source, destination)]
+
+    def wants(self, pgn, source, destination):
+        candidates = self._by_pgn.get(pgn, ())
+        if self._any_pgn:
+            candidates += self._any_pgn
+        for subscription in candidates:
+            if subscription.matches(source, destination):
+                return True
+        return False
@@ -0,0 +1,78 @@
+"""
+Structured trace points for the J1939 receive/transmit hot path.
+
+Tracing is off by default and a disabled trace point costs a single flag
+check::
+
+    if trace.enabled:
+        trace.emit("bus.rx", can_id=msg.arbitration_id)
+
+When enabled every trace point is handed to the registered sinks as a
+:class:`TraceRecord` holding the raw field values; nothing is formatted
+unless a sink decides to format it.
+"""
+
+import logging
+import time
+from collections import deque, namedtuple
+
+logger = logging.getLogger("j1939")
+
+TraceRecord = namedtuple("TraceRecord", ["timestamp", "point", "fields"])
+
+#: Checked by every trace point before doing any work.
+enabled = False
+
+_sinks = []
+
+
+def log_sink(record):
+    """Forward a record to the "j1939" logger at DEBUG level, structured fields in ``extra``."""
+    logger.debug("trace %s %s", record.point, record.fields, extra={"trace": record})
+
+
+class TraceBuffer(object):
+    """
+    Sink that keeps the most recent trace records in memory.
+
+    :param int maxlen:
+        Number of records kept, older ones are discarded.
+    """
+
+    def __init__(self, maxlen=10000):
+        self.records = deque(maxlen=maxlen)
+
+    def __call__(self, record):
+        self.records.append(record)
+
+    def clear(self):
+        self.records.clear()
+
+
+def enable(sink=log_sink):
+    """
+    Turn tracing on and add ``sink``, a callable taking a :class:`TraceRecord`.
+    """
+    global enabled
+    if sink not in _sinks:
+        _sinks.append(sink)
+    enabled = True
+
+
+def disable(sink=None):
+    """
+    Remove ``sink`` (or all sinks when None); tracing is turned off once
+    no sinks are left.
+    """
+    global enabled
+    if sink is None:
+        del _sinks[:]
+    elif sink in _sinks:
+        _sinks.remove(sink)
+    enabled = bool(_sinks)
+
+
+def emit(point, **fields):
+    record = TraceRecord(time.time(), point, fields)
+    for sink in _sinks:
+        sink(record)
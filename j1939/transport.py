@@ -0,0 +1,403 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+
+from j1939.constants import *
+
+logger = logging.getLogger("j1939")
+
+# payload bytes carried by one TP.DT packet (the first byte is the sequence number)
+TP_PACKET_SIZE = 7
+
+
+class ReassemblySession(object):
+    """
+    One inbound transport protocol session (BAM or RTS/CTS).
+
+    The whole message is preallocated from the size announced in the
+    RTS/BAM and each TP.DT packet is written at the offset given by its
+    sequence number, so packets can be checked for duplicates and gaps and
+    the finished buffer is handed out without copying.
+    """
+
+    __slots__ = ("source", "destination", "pgn", "total_size", "num_packets", "packets_per_cts",
+                 "is_bam", "flow_control", "started", "last_update", "buffer", "_view",
+                 "_received", "received_count", "next_sequence", "window_end",
+                 "duplicates", "gaps", "malformed")
+
+    def __init__(self, source, destination, pgn, total_size, num_packets, is_bam,
+                 packets_per_cts=0xFF, timestamp=0.0):
+        self.source = source
+        self.destination = destination
+        self.pgn = pgn
+        self.total_size = total_size
+        self.num_packets = num_packets
+        self.packets_per_cts = packets_per_cts or 0xFF
+        self.is_bam = is_bam
+        # set by the owner when it has to send the CTS/EOM ACK for this session
+        self.flow_control = False
+        self.started = timestamp
+        self.last_update = timestamp
+
+        self.buffer = bytearray(total_size)
+        self._view = memoryview(self.buffer)
+        self._received = bytearray(num_packets)
+        self.received_count = 0
+        self.next_sequence = 1
+        self.window_end = num_packets
+        self.duplicates = 0
+        self.gaps = 0
+        self.malformed = 0
+
+    @property
+    def is_complete(self):
+        return self.received_count == self.num_packets
+
+    @property
+    def window_complete(self):
+        """True when every packet up to the end of the current CTS window has arrived."""
+        return self.next_sequence > self.window_end
+
+    def add(self, data, timestamp=0.0):
+        """
+        Store one TP.DT packet.
+
+        :param data: The 8 TP.DT data bytes, sequence number first.
+        :return: False when the packet was a duplicate, out of range or
+            too short for its part of the message.
+        """
+        if not data:
+            self.malformed += 1
+            return False
+        sequence = data[0]
+        if not 1 <= sequence <= self.num_packets:
+            logger.debug("TP.DT sequence %d out of range for %s", sequence, self)
+            return False
+        if self._received[sequence - 1]:
+            self.duplicates += 1
+            return False
+        if sequence != self.next_sequence:
+            self.gaps += 1
+
+        offset = (sequence - 1) * TP_PACKET_SIZE
+        length = min(TP_PACKET_SIZE, self.total_size - offset)
+        if len(data) - 1 < length:
+            # a short last packet is fine as long as it carries the rest
+            logger.debug("TP.DT packet %d of %s has %d of %d bytes", sequence, self, len(data) - 1, length)
+            self.malformed += 1
+            return False
+        self._view[offset:offset + length] = memoryview(data)[1:1 + length]
+        self._received[sequence - 1] = 1
+        self.received_count += 1
+        self.last_update = timestamp
+
+        # next_sequence is the first packet we are still waiting for
+        if sequence == self.next_sequence:
+            next_sequence = sequence
+            while next_sequence <= self.num_packets and self._received[next_sequence - 1]:
+                next_sequence += 1
+            self.next_sequence = next_sequence
+        return True
+
+    def open_window(self):
+        """
+        Start a new CTS window at the first missing packet.
+
+        :return: (number of packets, next packet number) for the CTS message.
+        """
+        count = min(self.packets_per_cts, self.num_packets - self.next_sequence + 1)
+        self.window_end = self.next_sequence + count - 1
+        return count, self.next_sequence
+
+    def __str__(self):
+        return "TP session SRC=0x%.2x DST=0x%.2x PGN=0x%.5x %d/%d packets" % (
+            self.source, self.destination, self.pgn, self.received_count, self.num_packets)
+
+
+class TransportReassembler(object):
+    """
+    Inbound transport protocol sessions, keyed by (source, destination).
+
+    TP.DT packets only carry the source and destination addresses, and
+    J1939-21 allows one session per address pair at a time, so that pair
+    identifies the session; each session records the PGN announced in its
+    RTS/BAM.
+
+    The timestamps given to :meth:`open`, :meth:`ReassemblySession.add`
+    and :meth:`expire` may come from any clock, as long as it is the
+    same one: :class:`j1939.Bus` uses :func:`time.monotonic`, the offline
+    decoder the frame timestamps.
+
+    :attr:`observer`, when set, is called as ``observer(session, event)``
+    with event "started", "completed", "aborted" or "timed_out".
+    """
+
+    def __init__(self, bam_timeout=TP_TIMEOUT_T1, rts_timeout=TP_TIMEOUT_T2):
+        self.sessions = {}
+        self.bam_timeout = bam_timeout
+        self.rts_timeout = rts_timeout
+
+        self.started = 0
+        self.completed = 0
+        self.aborted = 0
+        self.timed_out = 0
+        self.rejected = 0
+        self.observer = None
+        # no session times out before this, expire() returns right away
+        self._next_sweep = float("inf")
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def open(self, source, destination, data, timestamp=0.0):
+        """
+        Start a session from an RTS or BAM connection management message.
+
+        Any unfinished session between the same pair of addresses is
+        dropped and counted as aborted.
+
+        :return: The new :class:`ReassemblySession` or None if the announce was malformed.
+        """
+        self.expire(timestamp)
+
+        if len(data) < 8:
+            self.rejected += 1
+            return None
+        total_size = data[1] | (data[2] << 8)
+        num_packets = data[3]
+        if total_size == 0 or num_packets * TP_PACKET_SIZE < total_size:
+            logger.warning("Malformed TP announce from 0x%.2x: size=%d, packets=%d", source, total_size, num_packets)
+            self.rejected += 1
+            return None
+
+        replaced = self.sessions.pop((source, destination), None)
+        if replaced is not None:
+            self.aborted += 1
+            if self.observer is not None:
+                self.observer(replaced, "aborted")
+
+        session = ReassemblySession(source, destination,
+                                    pgn=data[5] | (data[6] << 8) | (data[7] << 16),
+                                    total_size=total_size,
+                                    num_packets=num_packets,
+                                    is_bam=(data[0] == CM_MSG_TYPE_BAM),
+                                    packets_per_cts=data[4],
+                                    timestamp=timestamp)
+        self.sessions[(source, destination)] = session
+        expiry = timestamp + (self.bam_timeout if session.is_bam else self.rts_timeout)
+        if expiry < self._next_sweep:
+            self._next_sweep = expiry
+        self.started += 1
+        if self.observer is not None:
+            self.observer(session, "started")
+        return session
+
+    def get(self, source, destination):
+        return self.sessions.get((source, destination))
+
+    def close(self, session):
+        """Remove a finished session."""
+        if self.sessions.pop((session.source, session.destination), None) is not None:
+            self.completed += 1
+            if self.observer is not None:
+                self.observer(session, "completed")
+
+    def abort(self, source, destination):
+        session = self.sessions.pop((source, destination), None)
+        if session is not None:
+            self.aborted += 1
+            if self.observer is not None:
+                self.observer(session, "aborted")
+            return True
+        return False
+
+    def next_expiry(self):
+        """Timestamp the first session times out at, None without sessions."""
+        if not self.sessions:
+            return None
+        return min(session.last_update + (self.bam_timeout if session.is_bam else self.rts_timeout)
+                   for session in self.sessions.values())
+
+    def expire(self, now):
+        """
+        Drop sessions whose sender went quiet for longer than the J1939-21
+        timeouts.  Cheap until the first session could have timed out, so
+        it can run for every received frame.
+        """
+        if not self.sessions or now <= self._next_sweep:
+            return
+        for key, session in list(self.sessions.items()):
+            timeout = self.bam_timeout if session.is_bam else self.rts_timeout
+            if now - session.last_update > timeout:
+                logger.info("%s timed out", session)
+                del self.sessions[key]
+                self.timed_out += 1
+                if self.observer is not None:
+                    self.observer(session, "timed_out")
+        expiry = self.next_expiry()
+        self._next_sweep = float("inf") if expiry is None else expiry
+
+
+class TransmitSession(object):
+    """
+    One outbound BAM: the connection management announce followed by its
+    TP.DT packets, sent ``gap`` seconds apart.
+    """
+
+    __slots__ = ("source", "messages", "index", "gap", "deadline")
+
+    def __init__(self, source, messages, gap):
+        self.source = source
+        self.messages = messages
+        self.index = 0
+        self.gap = gap
+        self.deadline = 0.0
+
+    def __str__(self):
+        return "BAM session SRC=0x%.2x %d/%d frames" % (self.source, self.index, len(self.messages))
+
+
+class TransmitScheduler(object):
+    """
+    Deadline based transmitter for BAM sessions.
+
+    Every session keeps the time its next frame is due in a heap; the
+    scheduler sends whatever is due and then waits for the earliest
+    deadline, so sessions from different source addresses interleave on
+    the bus instead of queuing behind each other.  Deadlines advance by
+    exactly ``gap`` from the previous deadline rather than from the time a
+    frame actually went out, so send latency doesn't stretch the session.
+
+    J1939-21 allows one BAM per source address at a time; further BAMs
+    from a busy source wait for the running one to finish.
+
+    The scheduler runs on its own thread after :meth:`start`, or can be
+    driven from an existing loop with :meth:`next_deadline` and
+    :meth:`run_due`; :attr:`wakeup`, when set, is called after a submit
+    so such a loop can recompute its timeout.
+
+    :param send:
+        Callable taking a :class:`can.Message`.
+    :param float gap:
+        Default time between frames of a session in seconds.
+    """
+
+    def __init__(self, send, gap=TP_BAM_GAP_MIN, clock=time.monotonic):
+        self.gap = gap
+        self._send = send
+        self._clock = clock
+        self._heap = []
+        self._counter = itertools.count()
+        # source address -> BAMs waiting for that source's running session
+        self._waiting = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self.wakeup = None
+
+        self.sent = 0
+        self.completed = 0
+        self.failed = 0
+
+    def __len__(self):
+        with self._cond:
+            return sum(1 + len(waiting) for waiting in self._waiting.values())
+
+    def _push(self, session, deadline):
+        session.deadline = deadline
+        heapq.heappush(self._heap, (deadline, next(self._counter), session))
+
+    def submit(self, source, messages, gap=None):
+        """
+        Queue a BAM for transmission.
+
+        :param int source: The sending address.
+        :param list messages: The announce and TP.DT :class:`can.Message` objects in order.
+        :param float gap: Time between frames, defaults to the scheduler's gap.
+        """
+        session = TransmitSession(source, messages, self.gap if gap is None else gap)
+        with self._cond:
+            if source in self._waiting:
+                self._waiting[source].append(session)
+            else:
+                self._waiting[source] = deque()
+                self._push(session, self._clock())
+                self._cond.notify()
+        if self.wakeup is not None:
+            self.wakeup()
+        return session
+
+    def _finish(self, session, now):
+        waiting = self._waiting.get(session.source)
+        if waiting:
+            self._push(waiting.popleft(), now + session.gap)
+        else:
+            self._waiting.pop(session.source, None)
+
+    def next_deadline(self):
+        """Clock time the next frame is due, or None when idle."""
+        with self._cond:
+            return self._heap[0][0] if self._heap else None
+
+    def run_due(self, now=None):
+        """
+        Send every frame that is due.
+
+        :return: The next deadline, or None when idle.
+        """
+        if now is None:
+            now = self._clock()
+        while True:
+            with self._cond:
+                if not self._heap or self._heap[0][0] > now:
+                    return self._heap[0][0] if self._heap else None
+                deadline, _, session = heapq.heappop(self._heap)
+
+            try:
+                self._send(session.messages[session.index])
+            except Exception:
+                logger.exception("Sending %s failed", session)
+                with self._cond:
+                    self.failed += 1
+                    self._finish(session, now)
+                continue
+
+            with self._cond:
+                self.sent += 1
+                session.index += 1
+                if session.index < len(session.messages):
+                    # a session that fell more than a gap behind catches up
+                    # with one frame instead of bursting
+                    self._push(session, max(deadline + session.gap, now))
+                else:
+                    self.completed += 1
+                    self._finish(session, now)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="j1939-bam-scheduler")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+    def _run(self):
+        while self._running:
+            self.run_due()
+            with self._cond:
+                if not self._running:
+                    break
+                if self._heap:
+                    timeout = self._heap[0][0] - self._clock()
+                    if timeout > 0:
+                        self._cond.wait(timeout)
+                else:
+                    self._cond.wait()
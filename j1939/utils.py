@@ -3,6 +3,11 @@ import j1939
 import logging
 import inspect
 import sys
+import time
+from concurrent.futures import TimeoutError as ResponseTimeout
+
+from j1939.pool import bus_pool
+from j1939.memory import MemoryAccess
 
 logger = logging.getLogger("j1939")
 #
@@ -28,36 +33,81 @@ except:
             return 0x12345678
 
     security = Genkey()
+    security250 = security500 = security
 
-def set_mem_object(pointer, extension, value, channel='can0', bustype='socketcan', length=4, src=0, dest=0x17, speed=250, bus=None, timeout=10):
-    countdown = timeout
-    result = -1
-    close = False
+def _keygen(speed):
+    """
+    The seed/key responder for ``speed``; every helper opens its pooled
+    bus with it, so reads and writes on a channel share one bus.
+    """
+    if int(speed) == 250:
+        return security250.SeedToKey
+    if int(speed) == 500:
+        return security500.SeedToKey
+    return None
 
-    logger.debug("------------------------------- Set Mem Object: speed={}, security250={}, security500={}".format(speed, security250, security500))
+# DM14 command byte for a read and a write request
+DM14_READ = 0x13
+DM14_WRITE = 0x15
+
+def _dm14_pdu(pointer, extension, length, command, src, dest):
+    pgn = j1939.PGN()
+    pgn.value = 0xd900 + dest # Request a DM14 mem-object
+    aid = j1939.ArbitrationID(pgn=pgn, source_address=src, destination_address=dest)
 
-    keygetFunction = None
+    # Get the 3 bytes of the pointer and put them in the correct locations
+    pointer0 = pointer & 0xff
+    pointer1 = (pointer & 0xff00) >> 8
+    pointer2 = (pointer & 0xff0000) >> 16
 
-    if int(speed) == 250:
-        keygetFunction = security250.SeedToKey
-        logger.debug("PI02f speed=500, keygetFunction={}".format(keygetFunction))
-    elif int(speed) == 500:
-        keygetFunction = security500.SeedToKey
-        logger.debug("PI02f speed=500, keygetFunction={}".format(keygetFunction))
-    else:
-        logger.debug("PI02f speed=Unknown, keygetFunction={}".format(keygetFunction))
-        pass
+    data = [length, command, pointer0, pointer1, pointer2, extension, 0xff, 0xff]
+    pdu = j1939.PDU(timestamp=0.0, arbitration_id=aid, data=data, info_strings=None)
+    pdu.display_radix='hex'
+    return pdu
+
+def _request_pdu(requested_pgn, src, dest):
+    pgn = j1939.PGN()
+    pgn.value = 0xea00 + dest # request_pgn mem-object
+    aid = j1939.ArbitrationID(pgn=pgn, source_address=src, destination_address=dest)
+
+    pgn0 = requested_pgn & 0xff
+    pgn1 = (requested_pgn >> 8) & 0xff
+    pgn2 = (requested_pgn >> 16) & 0xff
 
-    logger.debug("------------------------------- keygetFunction={}".format(keygetFunction))
+    data = [pgn0, pgn1, pgn2]
+    pdu = j1939.PDU(timestamp=0.0, arbitration_id=aid, data=data, info_strings=None)
+    pdu.display_radix='hex'
+    return pdu
+
+def decode_mem_object(data):
+    """
+    Value carried by a DM16 (binary data transfer) response: 1, 2 and 4
+    byte objects are returned as little endian ints, anything else as a
+    list of bytes.
+    """
+    value = list(data)
+    length = value[0]
+    if length == 1:
+        return value[1]
+    elif length == 2:
+        return (value[2] << 8) + value[1]
+    elif length == 4:
+        return (value[4] << 24) + (value[3] << 16) + (value[2] << 8) + value[1]
+    return value[1:]
 
-    # only watch for the memory object pgn's
-    filt = [{'pgn':0xd800, 'source':dest},{'pgn':0xd400, 'source':dest}]
+def set_mem_object(pointer, extension, value, channel='can0', bustype='socketcan', length=4, src=0, dest=0x17, speed=250, bus=None, timeout=10):
+    # timeout has always counted quarter seconds here
+    deadline = time.time() + timeout * 0.25
+    result = -1
+
+    logger.debug("------------------------------- Set Mem Object: speed={}, security250={}, security500={}".format(speed, security250, security500))
 
     if bus is None:
-        bus = j1939.Bus(channel=channel, bustype=bustype, timeout=0.01, keygen=keygetFunction, speed=speed, bitrate=(int(speed)*1000), broadcast=False, j1939_filters=filt)
-        node = j1939.Node(bus, j1939.NodeName(), [src])
-        bus.connect(node)
-        close = True
+        # the DM15 responses are picked out by bus.expect(), a shared bus
+        # doesn't need filters
+        with bus_pool.bus(channel, bustype, speed, src, keygen=_keygen(speed)) as bus:
+            return set_mem_object(pointer, extension, value, length=length, src=src, dest=dest,
+                                  speed=speed, bus=bus, timeout=timeout)
 
     pLow = pointer & 0x0000FF
     pMid = (pointer >> 8) & 0x0000FF
@@ -70,6 +120,10 @@ def set_mem_object(pointer, extension, value, channel='can0', bustype='socketcan
     dm14pdu = j1939.PDU(timestamp=0.0, arbitration_id=dm14aid, data=dm14data, info_strings=None)
     dm14pdu.display_radix='hex'
 
+    def is_dm15(pdu):
+        return pdu.pgn == 0xd800
+
+    response = bus.expect(0xd800, dest, is_dm15)
     bus.send(dm14pdu)
 
     sendBuffer = []
@@ -111,86 +165,53 @@ def set_mem_object(pointer, extension, value, channel='can0', bustype='socketcan
     logger.info("----------------## PDU=%s ", dm16pdu)
 
     # Wait around for a while looking for the second proceed
-    while countdown:
-        countdown -= 1
-        rcvPdu = bus.recv(timeout=0.25)
-        if rcvPdu:
+    try:
+        while result == -1:
+            rcvPdu = response.result(timeout=max(0, deadline - time.time()))
+            # wait for the next DM15 before anything is sent
+            response = bus.expect(0xd800, dest, is_dm15)
             rcvPdu.display_radix='hex'
             logger.debug("received PDU: %s", rcvPdu)
-            if rcvPdu.pgn == 0xd800:
-                if rcvPdu.data[0]==1 and rcvPdu.data[1]==0x11:
-                    if rcvPdu.data[6] == 0xff and rcvPdu.data[7] == 0xff:
-                        bus.send(dm16pdu)
-                        logger.info('Sent %s', dm16pdu)
-                elif rcvPdu.data[0]==0 and rcvPdu.data[1]==0x19:
-                    logger.info("Value Sent")
-                    result = 1
-                    break
-                elif rcvPdu.data[0]==0 and rcvPdu.data[1]==0x1B:
-                    logger.info("Rejected")
-                    result = 0
-                    break
-    if close:
-        bus.shutdown()
+            if rcvPdu.data[0]==1 and rcvPdu.data[1]==0x11:
+                if rcvPdu.data[6] == 0xff and rcvPdu.data[7] == 0xff:
+                    bus.send(dm16pdu)
+                    logger.info('Sent %s', dm16pdu)
+            elif rcvPdu.data[0]==0 and rcvPdu.data[1]==0x19:
+                logger.info("Value Sent")
+                result = 1
+            elif rcvPdu.data[0]==0 and rcvPdu.data[1]==0x1B:
+                logger.info("Rejected")
+                result = 0
+    except ResponseTimeout:
+        pass
+    finally:
+        response.cancel()
     return result
 
 def get_mem_object(pointer, extension, channel='can0', bustype='socketcan', length=4, src=0, dest=0x17, bus=None, speed=250, timeout=10):
     logger.info("{}: begin".format(inspect.stack()[0][3]))
-    countdown = timeout
     result = None
-    close = False
 
     if bus is None:
-        bus = j1939.Bus(channel=channel, bustype=bustype, timeout=0.01, speed=speed, bitrate=(int(speed)*1000), broadcast=False)
-        node = j1939.Node(bus, j1939.NodeName(), [src])
-        bus.connect(node)
-        close = True
-
-    pgn = j1939.PGN()
-    pgn.value = 0xd900 + dest # Request a DM14 mem-object
-    aid = j1939.ArbitrationID(pgn=pgn, source_address=src, destination_address=dest)
-
-    # Get the 3 bytes of the pointer and put them in the correct locations
-    pointer0 = pointer & 0xff
-    pointer1 = (pointer & 0xff00) >> 8
-    pointer2 = (pointer & 0xff0000) >> 16
+        with bus_pool.bus(channel, bustype, speed, src, keygen=_keygen(speed)) as bus:
+            return get_mem_object(pointer, extension, length=length, src=src, dest=dest, bus=bus,
+                                  speed=speed, timeout=timeout)
 
-    data = [length, 0x13, pointer0, pointer1, pointer2, extension, 0xff, 0xff]
-    pdu = j1939.PDU(timestamp=0.0, arbitration_id=aid, data=data, info_strings=None)
-    assert(pdu != None)
-    pdu.display_radix='hex'
+    pdu = _dm14_pdu(pointer, extension, length, DM14_READ, src, dest)
     logger.info("{}: Sending Request PDU: {}".format(inspect.stack()[0][3], pdu))
+    # registered before sending so a fast response can't be missed
+    response = bus.expect(0xd700, dest, lambda pdu: pdu.pgn == 0xd700)
     bus.send(pdu)
 
     #
     # Wait for the response
     #
-    while countdown:
-        pdu = bus.recv(timeout=1)
-        if pdu is not None:
-            logger.info("{}: Received PDU: {}".format(inspect.stack()[0][3], pdu))
-            logger.info(pdu)
-            if pdu.pgn == 0xd700:
-                value = list(pdu.data)
-                length = value[0]
-                if length == 1:
-                    result = value[1]
-                elif length == 2:
-                    result = (value[2] << 8) + value[1]
-                elif length == 4:
-                    result = (value[4] << 24) + (value[3] << 16) + (value[2] << 8) + value[1]
-                else:
-                    result = value[1:]
-
-                #logger.info("{}: d700 received, result: {}/0x{:08x}".format(inspect.stack()[0][3], result, result))
-                
-                break # got what I was waiting for
-
-        countdown -= 1
-
-    if close:
-        logger.info("{}: Closing Bus".format(inspect.stack()[0][3]))
-        bus.shutdown()
+    try:
+        pdu = response.result(timeout=timeout)
+        logger.info("{}: Received PDU: {}".format(inspect.stack()[0][3], pdu))
+        result = decode_mem_object(pdu.data)
+    except ResponseTimeout:
+        response.cancel()
 
     if result is None:
         raise IOError(" no CAN response")
@@ -198,57 +219,53 @@ def get_mem_object(pointer, extension, channel='can0', bustype='socketcan', leng
 
     return result
 
+def get_mem_objects(objects, channel='can0', bustype='socketcan', src=0, dest=0x17, bus=None, speed=250, window=4, timeout=10):
+    """
+    Read many ``(pointer, extension, length)`` objects with up to
+    ``window`` DM14 requests in flight, see :class:`j1939.memory.MemoryAccess`.
+
+    :return: A :class:`j1939.memory.MemoryResult` per object, in the order
+             given; rejected and timed out objects have ``error`` set.
+    """
+    if bus is None:
+        with bus_pool.bus(channel, bustype, speed, src, keygen=_keygen(speed)) as bus:
+            return get_mem_objects(objects, src=src, dest=dest, bus=bus, speed=speed, window=window, timeout=timeout)
+    memory = MemoryAccess(bus, src=src, dest=dest, window=window, timeout=timeout)
+    return sorted(memory.read(objects), key=lambda result: result.index)
+
+def set_mem_objects(objects, channel='can0', bustype='socketcan', src=0, dest=0x17, bus=None, speed=250, timeout=10):
+    """
+    Write many ``(pointer, extension, length, value)`` objects, one after
+    the other on a single bus, see :func:`get_mem_objects`.
+    """
+    if bus is None:
+        with bus_pool.bus(channel, bustype, speed, src, keygen=_keygen(speed)) as bus:
+            return set_mem_objects(objects, src=src, dest=dest, bus=bus, speed=speed, timeout=timeout)
+    memory = MemoryAccess(bus, src=src, dest=dest, timeout=timeout)
+    return sorted(memory.write(objects), key=lambda result: result.index)
+
 def request_pgn(requested_pgn, channel='can0', speed=250, bustype='socketcan', length=4, src=0, dest=0x17, bus=None, timeout=10):
-    countdown = timeout
     result = None
-    close = False
-
-    keygetFunction = None
-    if speed == 250:
-        keygetFunction = security250.SeedToKey
-    if speed == 500:
-        keygetFunction = security500.SeedToKey
 
     if not isinstance(requested_pgn, int):
         raise ValueError("pgn must be an integer.")
 
     if bus is None:
-        bus = j1939.Bus(channel=channel, bustype=bustype, timeout=0.01, speed=speed, bitrate=(int(speed)*1000), keygen=keygetFunction, broadcast=False)
-        node = j1939.Node(bus, j1939.NodeName(), [src])
-        bus.connect(node)
-        close = True
-        
-    pgn = j1939.PGN()
-    pgn.value = 0xea00 + dest # request_pgn mem-object
-    aid = j1939.ArbitrationID(pgn=pgn, source_address=src, destination_address=dest)
+        with bus_pool.bus(channel, bustype, speed, src, keygen=_keygen(speed)) as bus:
+            return request_pgn(requested_pgn, speed=speed, length=length, src=src, dest=dest, bus=bus,
+                               timeout=timeout)
 
-    pgn0 = requested_pgn & 0xff
-    pgn1 = (requested_pgn >> 8) & 0xff
-    pgn2 = (requested_pgn >> 16) & 0xff
-
-    data = [pgn0, pgn1, pgn2]
-    pdu = j1939.PDU(timestamp=0.0, arbitration_id=aid, data=data, info_strings=None)
-
-    pdu.display_radix='hex'
+    pdu = _request_pdu(requested_pgn, src, dest)
 
+    # the response or an Acknowledgement naming the PGN completes it,
+    # whatever else is going on on the bus
+    responder = None if dest == j1939.DESTINATION_ADDRESS_GLOBAL else dest
+    response = bus.expect(requested_pgn, responder)
     bus.send(pdu)
-    maxPdu = 50
-    while countdown:
-        pdu = bus.recv(timeout=1)
-        if pdu and (pdu.pgn == 0xe800 or pdu.pgn == requested_pgn):
-            result = list(pdu.data) 
-            break # got what I was waiting for
-
-        elif pdu:
-            maxPdu -=1
-            if maxPdu <= 0:
-                raise IOError('Bus too busy')
-        elif pdu is None:
-            countdown -= 1
-        else:
-            raise Exception('WHAT HAPPENED')
-    if close:
-        bus.shutdown()
+    try:
+        result = list(response.result(timeout=timeout).data)
+    except ResponseTimeout:
+        response.cancel()
     if not result:
         raise IOError(" no CAN response")
     return result
@@ -257,20 +274,14 @@ def request_pgn(requested_pgn, channel='can0', speed=250, bustype='socketcan', l
 def send_pgn(requested_pgn, data, channel='can0', speed=250, bustype='socketcan', length=4, src=0, dest=0x17, bus=None, timeout=10):
     countdown = timeout
     result = None
-    close = False
-
-    keygetFunction = None
-    if speed == 250:
-        keygetFunction = security250.SeedToKey
-    if speed == 500:
-        keygetFunction = security500.SeedToKey
 
     if not isinstance(requested_pgn, int):
         raise ValueError("pgn must be an integer.")
     if bus is None:
-        bus = j1939.Bus(channel=channel, bustype=bustype, speed=speed, bitrate=(int(speed)*1000), timeout=0.01, keygen=keygetFunction)
-        close = True
-        
+        with bus_pool.bus(channel, bustype, speed, src, keygen=_keygen(speed)) as bus:
+            return send_pgn(requested_pgn, data, speed=speed, length=length, src=src, dest=dest, bus=bus,
+                            timeout=timeout)
+
     pgn = j1939.PGN()
     if requested_pgn < 0xf000:
         requested_pgn |= dest
@@ -283,8 +294,6 @@ def send_pgn(requested_pgn, data, channel='can0', speed=250, bustype='socketcan'
     pdu.display_radix='hex'
 
     bus.send(pdu)
-    if close:
-        bus.shutdown()
     if 0: #leaving in miller's if 0
         while countdown:
             pdu = bus.recv(timeout=1)
@@ -13,7 +13,7 @@ setup(
     name="python-j1939",
     url="https://github.com/milhead2/python-j1939.git",
     version=__version__,
-    packages=find_packages(),
+    packages=find_packages(exclude=["tests", "tests.*"]),
     author="David 'Miller' Lowe",
     author_email="milhead@gmail.com",
     description="SAE J1939 module for Python",
@@ -24,14 +24,18 @@ setup(
         "doc": ["*.*"]
     },
 
-    install_requires=["python-can>=2.0.0a2"],
+    install_requires=["python-can>=3.0"],
+    extras_require={
+        "numpy": ["numpy"],
+    },
 
     scripts=[
         "./bin/j1939_logger.py",
         "./bin/j1939_mem_query.py",
         "./bin/j1939_mem_set.py",
         "./bin/j1939_request_pgn.py",
-        "./bin/j1939_send_pgn.py"
+        "./bin/j1939_send_pgn.py",
+        "./bin/j1939_replay.py"
     ],
 
     # Tests can be run using `python setup.py test`
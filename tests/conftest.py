@@ -0,0 +1,40 @@
+import itertools
+
+import pytest
+
+import j1939
+
+_channels = itertools.count()
+
+
+def new_channel():
+    """A virtual channel no other test uses."""
+    return "test-%d" % next(_channels)
+
+
+@pytest.fixture
+def make_bus():
+    """Virtual j1939.Bus objects, each on its own channel, shut down after the test."""
+    buses = []
+
+    def make(**kwargs):
+        kwargs.setdefault("channel", new_channel())
+        kwargs.setdefault("bustype", "virtual")
+        kwargs.setdefault("timeout", 0.01)
+        bus = j1939.Bus(**kwargs)
+        buses.append(bus)
+        return bus
+
+    yield make
+    for bus in buses:
+        bus.shutdown()
+
+
+def drain(bus):
+    """Every PDU waiting in the bus's receive queue."""
+    pdus = []
+    while True:
+        pdu = bus.recv(timeout=0)
+        if pdu is None:
+            return pdus
+        pdus.append(pdu)
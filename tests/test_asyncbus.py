@@ -0,0 +1,100 @@
+import asyncio
+
+import can
+import pytest
+
+import j1939
+
+from tests.conftest import new_channel
+
+
+def _frame(pdu_format, data, source=0x17, destination=0x00):
+    return can.Message(arbitration_id=(6 << 26) | (pdu_format << 16) | (destination << 8) | source,
+                       is_extended_id=True, data=data)
+
+
+def test_needs_a_loop_outside_coroutines():
+    with pytest.raises(RuntimeError):
+        j1939.AsyncBus(channel=new_channel(), bustype="virtual")
+
+
+def test_receive_queue_stats_and_wrapped_recv():
+    async def main():
+        bus = j1939.AsyncBus(channel=new_channel(), bustype="virtual", maxsize=2)
+        try:
+            for _ in range(3):
+                bus.bus.notification(_frame(0xFE, [1] * 8, destination=0xCA))
+            assert bus.bus.queue_stats["bus"] == {"depth": 2, "high_water": 2, "dropped": 1, "maxsize": 2,
+                                                  "policy": "drop-newest"}
+            assert (await bus.recv(timeout=1)).pgn == 0xFECA
+            with pytest.raises(RuntimeError):
+                bus.bus.recv(timeout=0)
+        finally:
+            bus.shutdown()
+
+    asyncio.run(main())
+
+
+def test_get_mem_object():
+    async def main():
+        channel = new_channel()
+        bus = j1939.AsyncBus(channel=channel, bustype="virtual")
+        ecu = can.interface.Bus(channel=channel, bustype="virtual")
+        loop = asyncio.get_running_loop()
+
+        def respond(*frames):
+            ecu.recv(2)
+            for frame in frames:
+                ecu.send(frame)
+
+        try:
+            answer = loop.run_in_executor(None, respond, _frame(0xD8, [0, 0, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF]),
+                                          _frame(0xD7, [4, 1, 2, 3, 4]))
+            assert await bus.get_mem_object(0x100, 0, timeout=2) == 0x04030201
+            await answer
+
+            answer = loop.run_in_executor(None, respond, _frame(0xD8, [0, 5 << 1, 2, 0, 0, 0xFF, 0xFF, 0xFF]))
+            start = loop.time()
+            with pytest.raises(j1939.memory.MemoryAccessError) as error:
+                await bus.get_mem_object(0x100, 0, timeout=2)
+            assert loop.time() - start < 1
+            assert (error.value.status, error.value.error_code) == (5, 2)
+            await answer
+
+            # a seed without a key generator on the bus
+            answer = loop.run_in_executor(None, respond, _frame(0xD8, [0, 0, 0xFF, 0xFF, 0xFF, 0xFF, 0x34, 0x12]))
+            with pytest.raises(j1939.memory.MemoryAccessError) as error:
+                await bus.get_mem_object(0x100, 0, timeout=2)
+            assert error.value.error_code == 0x1234
+            await answer
+        finally:
+            bus.shutdown()
+            ecu.shutdown()
+
+    asyncio.run(main())
+
+
+def test_get_mem_object_answers_a_seed():
+    async def main():
+        channel = new_channel()
+        bus = j1939.AsyncBus(channel=channel, bustype="virtual", keygen=lambda seed: seed ^ 0xFFFF)
+        ecu = can.interface.Bus(channel=channel, bustype="virtual")
+        loop = asyncio.get_running_loop()
+
+        def respond():
+            ecu.recv(2)
+            ecu.send(_frame(0xD8, [0, 0, 0xFF, 0xFF, 0xFF, 0xFF, 0x34, 0x12]))
+            keyed = ecu.recv(2)
+            ecu.send(_frame(0xD8, [0, 0, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF]))
+            ecu.send(_frame(0xD7, [1, 0x2A]))
+            return list(keyed.data[6:8])
+
+        try:
+            answer = loop.run_in_executor(None, respond)
+            assert await bus.get_mem_object(0x100, 0, length=1, timeout=2) == 0x2A
+            assert await answer == [0xCB, 0xED]
+        finally:
+            bus.shutdown()
+            ecu.shutdown()
+
+    asyncio.run(main())
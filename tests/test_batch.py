@@ -0,0 +1,50 @@
+import pytest
+
+import j1939
+
+np = pytest.importorskip("numpy")
+
+from j1939.batch import NO_DESTINATION
+
+
+def _object_path(can_id):
+    arbitration_id = j1939.ArbitrationID()
+    arbitration_id.can_id = can_id
+    pdu = j1939.PDU(arbitration_id=arbitration_id)
+    destination = pdu.destination
+    if destination is None:
+        destination = NO_DESTINATION
+    return (arbitration_id.priority, pdu.pgn, pdu.source, destination,
+            arbitration_id.pgn.is_destination_specific)
+
+
+def _batch_path(decoded, i):
+    return (int(decoded.priority[i]), int(decoded.pgn[i]), int(decoded.source[i]),
+            int(decoded.destination[i]), bool(decoded.is_destination_specific[i]))
+
+
+def test_matches_object_path_on_random_ids():
+    can_ids = np.random.RandomState(1939).randint(0, 1 << 29, size=5000, dtype=np.uint32)
+    decoded = j1939.decode_can_ids(can_ids)
+    for i, can_id in enumerate(can_ids):
+        assert _batch_path(decoded, i) == _object_path(int(can_id)), hex(int(can_id))
+
+
+@pytest.mark.parametrize("can_id", [
+    0x18FECA03,     # PDU2
+    0x19FEDA17,     # PDU2, data page 1
+    0x18EF1700,     # PDU1
+    0x19EF1700,     # PDU1, data page 1
+    0x1AF01700,     # reserved bit makes pdu_format 0xF0 PDU1
+    0x18EAFF00,     # PDU1 to the global address
+    0x00000000,
+    0x1FFFFFFF,
+])
+def test_matches_object_path_on_edge_ids(can_id):
+    decoded = j1939.decode_can_ids([can_id])
+    assert _batch_path(decoded, 0) == _object_path(can_id)
+
+
+def test_empty_input():
+    decoded = j1939.decode_can_ids([])
+    assert len(decoded.pgn) == 0
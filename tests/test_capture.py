@@ -0,0 +1,105 @@
+import io
+
+import can
+import pytest
+
+import j1939
+from j1939.capture import CaptureReader, CaptureWriter, replay, FILE_HEADER
+
+from tests.conftest import drain
+
+
+def _messages():
+    return [
+        can.Message(timestamp=100.0, arbitration_id=0x18FECA03, is_extended_id=True, data=[1, 2, 3, 4, 5, 6, 7, 8]),
+        can.Message(timestamp=100.000250, arbitration_id=0x0CF00400, is_extended_id=True, data=[0xF0, 0x7D]),
+        can.Message(timestamp=100.5, arbitration_id=0x123, is_extended_id=False, data=[9]),
+        can.Message(timestamp=100.6, arbitration_id=0x18EA1700, is_extended_id=True, is_remote_frame=True, dlc=3),
+        can.Message(timestamp=101.0, arbitration_id=0x80, is_extended_id=True, is_error_frame=True,
+                    data=[0] * 8),
+        # goes backwards, stored as simultaneous
+        can.Message(timestamp=100.9, arbitration_id=0x18FEF100, is_extended_id=True, data=[]),
+    ]
+
+
+def _write(path, messages, **kwargs):
+    with CaptureWriter(str(path), **kwargs) as writer:
+        for msg in messages:
+            writer.write(msg)
+    return writer
+
+
+def _fields(msg):
+    return (round(msg.timestamp, 6), msg.arbitration_id, msg.is_extended_id, msg.is_remote_frame,
+            msg.is_error_frame, msg.dlc, bytes(msg.data))
+
+
+@pytest.mark.parametrize("compress", [True, False])
+@pytest.mark.parametrize("block_records", [1, 4, 4096])
+def test_round_trip(tmp_path, compress, block_records):
+    path = tmp_path / "frames.j1939cap"
+    messages = _messages()
+    writer = _write(path, messages, compress=compress, block_records=block_records)
+    assert writer.frames == len(messages)
+
+    expected = [_fields(msg) for msg in messages]
+    if block_records > 1:
+        # within a block a timestamp going backwards is stored as the previous one
+        expected[-1] = (101.0,) + expected[-1][1:]
+    with CaptureReader(str(path)) as reader:
+        assert len(reader) == len(messages)
+        assert [_fields(msg) for msg in reader] == expected
+        assert [frame[1] for frame in reader.frames()] == [msg.arbitration_id for msg in messages]
+
+
+def test_close_while_iterating(tmp_path):
+    path = tmp_path / "frames.j1939cap"
+    _write(path, _messages() * 10, compress=False, block_records=8)
+    reader = CaptureReader(str(path))
+    messages = iter(reader)
+    frames = reader.frames()
+    next(messages)
+    next(frames)
+    reader.close()
+    assert list(messages) == []
+    assert list(frames) == []
+    reader.close()
+    with pytest.raises(ValueError):
+        reader.frames()
+
+
+def test_truncated_capture_keeps_complete_blocks(tmp_path):
+    path = tmp_path / "frames.j1939cap"
+    _write(path, _messages(), compress=False, block_records=2)
+    data = path.read_bytes()
+    path.write_bytes(data[:-5])
+    with CaptureReader(str(path)) as reader:
+        assert len(reader) == 4
+
+
+@pytest.mark.parametrize("content", [b"", b"J1939CAP", b"NOTACAPTURE" + b"\0" * FILE_HEADER.size])
+def test_not_a_capture(tmp_path, content):
+    path = tmp_path / "bad"
+    path.write_bytes(content)
+    with pytest.raises(ValueError):
+        CaptureReader(str(path))
+
+
+def test_writer_accept_and_file_object():
+    buffer = io.BytesIO()
+    writer = CaptureWriter(buffer, accept=lambda can_id: can_id != 0x123)
+    for msg in _messages():
+        writer.write(msg)
+    writer.stop()
+    assert writer.frames == len(_messages()) - 1
+    assert not buffer.closed
+
+
+def test_replay_into_bus(tmp_path, make_bus):
+    path = tmp_path / "frames.j1939cap"
+    _write(path, _messages())
+    bus = make_bus()
+    with CaptureReader(str(path)) as reader:
+        assert replay(reader, bus, speed=None) == len(_messages())
+    pdus = drain(bus)
+    assert [(pdu.pgn, pdu.timestamp) for pdu in pdus][:2] == [(0xFECA, 100.0), (0xF004, pytest.approx(100.00025))]
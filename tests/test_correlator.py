@@ -0,0 +1,109 @@
+import sys
+import threading
+
+import j1939
+from j1939.correlator import RequestCorrelator
+
+
+def _pdu(pgn_value, source=0x17, data=(1,) * 8):
+    return j1939.PDU(arbitration_id=j1939.ArbitrationID(pgn=pgn_value, source_address=source), data=list(data))
+
+
+def _ack(pgn_value, source=0x17, control=0):
+    return _pdu(0xE8FF, source, [control, 0xFF, 0xFF, 0xFF, 0xFF,
+                                 pgn_value & 0xFF, (pgn_value >> 8) & 0xFF, pgn_value >> 16])
+
+
+def test_response_completes_oldest_request_first():
+    correlator = RequestCorrelator()
+    first = correlator.expect(0xFEDA, 0x17)
+    second = correlator.expect(0xFEDA, 0x17)
+    response = _pdu(0xFEDA)
+    assert correlator.resolve(response)
+    assert first.result(0) is response
+    assert not second.done()
+    assert len(correlator) == 1
+
+
+def test_responder_address_must_match():
+    correlator = RequestCorrelator()
+    request = correlator.expect(0xFEDA, 0x17)
+    anyone = correlator.expect(0xFEDA)
+    assert correlator.wants(0xFEDA, 0x18)
+    assert correlator.resolve(_pdu(0xFEDA, source=0x18))
+    assert anyone.done() and not request.done()
+
+
+def test_acknowledgement_completes_request_for_its_pgn():
+    correlator = RequestCorrelator()
+    request = correlator.expect(0xFEDA, 0x17)
+    nack = _ack(0xFEDA, control=1)
+    assert correlator.wants(0xE800, 0x17)
+    assert correlator.resolve(nack)
+    assert request.result(0) is nack
+
+
+def test_predicate_filters_responses():
+    correlator = RequestCorrelator()
+    request = correlator.expect(0xD800, 0x17, lambda pdu: pdu.data[0] == 2)
+    assert not correlator.resolve(_pdu(0xD800, data=[1] * 8))
+    assert correlator.resolve(_pdu(0xD800, data=[2] * 8))
+    assert request.done()
+
+
+def test_any_of_several_pgns():
+    correlator = RequestCorrelator()
+    request = correlator.expect([0xFEDA, 0xFEDB], 0x17)
+    assert correlator.resolve(_pdu(0xFEDB))
+    assert request.done()
+    assert not correlator and len(correlator) == 0
+
+
+def test_cancelled_request_is_withdrawn():
+    correlator = RequestCorrelator()
+    cancelled = correlator.expect(0xFEDA, 0x17)
+    waiting = correlator.expect(0xFEDA, 0x17)
+    cancelled.cancel()
+    assert len(correlator) == 1
+    assert correlator.resolve(_pdu(0xFEDA))
+    assert waiting.done()
+    correlator.cancel_all()
+    assert not correlator
+
+
+def test_concurrent_resolves_complete_each_request_once():
+    correlator = RequestCorrelator()
+    requests = [correlator.expect(0xFEDA, 0x17, lambda pdu: True) for _ in range(2000)]
+    results, errors = [], []
+    start = threading.Barrier(4)
+
+    def resolve():
+        start.wait()
+        try:
+            for _ in range(1000):
+                results.append(correlator.resolve(_pdu(0xFEDA)))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=resolve) for _ in range(4)]
+    interval = sys.getswitchinterval()
+    # switch threads as often as possible, to run into any race
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert errors == []
+    assert results.count(True) == 2000
+    assert all(request.done() for request in requests)
+    assert correlator.completed == 2000
+
+
+def test_bus_expect(make_bus):
+    bus = make_bus()
+    response = bus.expect(0xFEDA, 0x17)
+    bus.ingest(j1939.canframe.pack_can_frames([((6 << 26) | (0xFEDA << 8) | 0x17, [1] * 8)]))
+    assert response.result(timeout=1).pgn == 0xFEDA
@@ -0,0 +1,91 @@
+import j1939
+from j1939.canframe import pack_can_frames
+from j1939.constants import *
+from j1939.diagnostics import (DTCTracker, decode_dm, DTC, LAMP_ON, LAMP_OFF,
+                               FAULT_APPEARED, FAULT_CLEARED, OCCURRENCE_CHANGED, LAMPS_CHANGED)
+
+NO_FAULTS = [0x00, 0xFF, 0, 0, 0, 0, 0xFF, 0xFF]
+
+
+def _dtc(spn, fmi, count):
+    return [spn & 0xFF, (spn >> 8) & 0xFF, ((spn >> 16) << 5) | fmi, count]
+
+
+def _dm(lamps, *dtcs):
+    data = [lamps, 0xFF]
+    for dtc in dtcs:
+        data += _dtc(*dtc)
+    return data + [0xFF] * (8 - len(data))
+
+
+def _pdu(data, source=0x03, pgn=PGN_DM1_ACTIVE_DTCS, timestamp=0.0):
+    aid = j1939.ArbitrationID(pgn=j1939.PGN.from_value(pgn), source_address=source)
+    return j1939.PDU(timestamp=timestamp, arbitration_id=aid, data=data)
+
+
+def _kinds(events):
+    return [(event.kind, event.dtc and event.dtc.spn, event.previous and event.previous.spn) for event in events]
+
+
+def test_decode_dm():
+    message = decode_dm([0x14, 0x00] + _dtc(0x7FFFE, 31, 5) + _dtc(100, 1, 0x81))
+    assert (message.lamps.amber_warning, message.lamps.red_stop, message.lamps.malfunction_indicator) == \
+        (LAMP_ON, LAMP_ON, LAMP_OFF)
+    assert message.dtcs == (DTC(0x7FFFE, 31, 5, 0), DTC(100, 1, 1, 1))
+    assert decode_dm(NO_FAULTS).dtcs == ()
+
+
+def test_tracker_reports_changes_only():
+    events = []
+    tracker = DTCTracker(callback=events.append)
+    assert _kinds(tracker.update(_pdu(_dm(0x04, (100, 1, 1))))) == [
+        (LAMPS_CHANGED, None, None), (FAULT_APPEARED, 100, None)]
+    # repeats aren't decoded again
+    assert tracker.update(_pdu(_dm(0x04, (100, 1, 1)))) == []
+    assert _kinds(tracker.update(_pdu(_dm(0x04, (100, 1, 2))))) == [(OCCURRENCE_CHANGED, 100, 100)]
+    assert _kinds(tracker.update(_pdu(NO_FAULTS))) == [(LAMPS_CHANGED, None, None), (FAULT_CLEARED, None, 100)]
+    assert (tracker.messages, tracker.decoded, len(events)) == (4, 3, 5)
+    assert tracker.active(0x03) == []
+
+
+def test_tracker_keeps_sources_and_pgns_apart():
+    tracker = DTCTracker()
+    tracker.update(_pdu(_dm(0x04, (100, 1, 1)), source=0x03))
+    tracker.update(_pdu(_dm(0x04, (200, 2, 1)), source=0x0B))
+    tracker.update(_pdu(_dm(0x00, (300, 3, 1)), source=0x03, pgn=PGN_DM2_PREVIOUSLY_ACTIVE_DTCS))
+    assert [dtc.spn for dtc in tracker.active(0x03)] == [100]
+    assert [dtc.spn for dtc in tracker.active(0x03, PGN_DM2_PREVIOUSLY_ACTIVE_DTCS)] == [300]
+    assert tracker.lamps(0x0B).amber_warning == LAMP_ON
+    assert tracker.sources == [0x03, 0x0B]
+    tracker.forget(0x03)
+    assert tracker.sources == [0x0B]
+    # a forgotten source reports its faults as new
+    assert _kinds(tracker.update(_pdu(_dm(0x04, (100, 1, 1)), source=0x03)))[-1] == (FAULT_APPEARED, 100, None)
+
+
+def test_tracker_ignores_other_and_malformed_pdus():
+    tracker = DTCTracker()
+    assert tracker.update(_pdu([1] * 8, pgn=0xFEEE)) == []
+    assert tracker.update(_pdu([0x04])) == []
+    assert tracker.decoded == 0
+
+
+def test_tracker_attached_to_bus(make_bus):
+    bus = make_bus()
+    events = []
+    tracker = DTCTracker(callback=events.append)
+    tracker.attach(bus)
+    # a DM1 with two faults takes a BAM
+    bam = [0x20, 10, 0, 2, 0xFF, 0xCA, 0xFE, 0]
+    payload = [0x04, 0xFF] + _dtc(100, 1, 1) + _dtc(200, 2, 1)
+    bus.ingest(pack_can_frames([
+        (0x18FECA03, _dm(0x04, (100, 1, 1))),
+        (0x1CECFF03, bam),
+        (0x1CEBFF03, [1] + payload[:7]),
+        (0x1CEBFF03, [2] + payload[7:] + [0xFF] * 4),
+    ]))
+    assert _kinds(events) == [(LAMPS_CHANGED, None, None), (FAULT_APPEARED, 100, None),
+                              (FAULT_APPEARED, 200, None)]
+    tracker.detach()
+    bus.ingest(pack_can_frames([(0x18FECA03, NO_FAULTS)]))
+    assert len(events) == 3
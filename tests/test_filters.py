@@ -0,0 +1,76 @@
+import pytest
+
+from j1939.filters import compile_filters
+
+
+def _can_id(pgn_value, source=0x17, priority=6):
+    return (priority << 26) | (pgn_value << 8) | source
+
+
+def _accepted(filters, pgn_values):
+    return [filters.accepts(_can_id(pgn_value)) for pgn_value in pgn_values]
+
+
+def test_empty_filter_list_compiles_to_none():
+    assert compile_filters([]) is None
+
+
+def test_unknown_key_and_empty_range_are_rejected():
+    with pytest.raises(ValueError):
+        compile_filters([{"pgns": 0xFECA}])
+    with pytest.raises(ValueError):
+        compile_filters([{"pgn_range": (0xFF00, 0xFE00)}])
+
+
+def test_pgn_strips_destination():
+    filters = compile_filters([{"pgn": [0xFECA, 0xEA00]}])
+    assert _accepted(filters, [0xFECA, 0xEA17, 0xEAFF, 0xFECB, 0xEB17]) == [True, True, True, False, False]
+
+
+def test_data_page_1_range_is_exact():
+    filters = compile_filters([{"pgn_range": (0x1EF00, 0x1EFFF)}])
+    assert _accepted(filters, [0x1EF05, 0x1EF00, 0xFECA, 0xF004, 0xEF05]) == [True, True, False, False, False]
+
+
+def test_range_straddling_pdu1_and_pdu2():
+    filters = compile_filters([{"pgn_range": (0xEE00, 0xF0FF)}])
+    # PDU1 0xEE00/0xEF00 with any destination, PDU2 0xF000-0xF0FF
+    assert _accepted(filters, [0xEE17, 0xEFFF, 0xF004, 0xF0FF]) == [True, True, True, True]
+    assert _accepted(filters, [0xED17, 0xF100, 0xFECA, 0x1EF05, 0x1F004]) == [False] * 5
+
+
+def test_all_keys_of_a_filter_must_match():
+    filters = compile_filters([{"pgn": 0xEF00, "source": 0x17, "destination": 0x05, "priority": 6}])
+    assert filters.accepts(_can_id(0xEF05))
+    assert not filters.accepts(_can_id(0xEF06))
+    assert not filters.accepts(_can_id(0xEF05, source=0x18))
+    assert not filters.accepts(_can_id(0xEF05, priority=3))
+
+
+def test_any_filter_may_match_and_decisions_are_counted():
+    filters = compile_filters([{"pgn": 0xFECA}, {"source": 0x20}])
+    assert filters.accepts(_can_id(0xFECA))
+    assert filters.accepts(_can_id(0xF004, source=0x20))
+    assert not filters.accepts(_can_id(0xF004))
+    assert not filters.accepts(_can_id(0xF004))
+    assert filters.stats() == {"accepted": 2, "rejected": 2}
+
+
+def _passes(can_filters, can_id):
+    return any(can_id & f["can_mask"] == f["can_id"] & f["can_mask"] for f in can_filters)
+
+
+@pytest.mark.parametrize("spec", [
+    {"pgn": [0xFECA, 0xEA00]},
+    {"pgn": 0xF000},
+    {"pgn": 0xEF00, "destination": 0x05},
+    {"pgn_range": (0xEE00, 0xF0FF), "source": 0x17},
+])
+def test_can_filters_accept_a_superset(spec):
+    filters = compile_filters([spec])
+    can_filters = filters.can_filters()
+    for pgn_value in (0xFECA, 0xEA17, 0xEAFF, 0xF000, 0x2F000, 0xEF05, 0x1EF05, 0xEE17, 0xF0FF):
+        for source in (0x17, 0x18):
+            can_id = _can_id(pgn_value, source)
+            if filters.accepts(can_id):
+                assert _passes(can_filters, can_id), hex(can_id)
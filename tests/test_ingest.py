@@ -0,0 +1,84 @@
+import can
+import pytest
+
+from j1939.canframe import pack_can_frames, CAN_FRAME_SIZE, CAN_EFF_FLAG, CAN_RTR_FLAG, CAN_ERR_FLAG
+
+from tests.conftest import drain
+
+FRAMES = [
+    (0x0CF00400, [0xF0, 0x7D, 0x7D, 0, 0, 0, 0xF0, 0x7D]),
+    (0x18FECA03, [0, 0xFF, 0, 0, 0, 0, 0xFF, 0xFF]),
+    (0x18EA1700, [0xEE, 0xFE, 0]),
+    (0x123, [1, 2]),                                        # standard ID
+    (0x18ECFF20, [32, 20, 0, 3, 0xFF, 0xCA, 0xFE, 0]),      # BAM of 20 bytes
+    (0x18EBFF20, [1, 0, 1, 2, 3, 4, 5, 6]),
+    (0x18EBFF20, [2, 7, 8, 9, 10, 11, 12, 13]),
+    (0x18EBFF20, [3, 14, 15, 16, 17, 18, 19, 0xFF]),
+]
+
+
+def _summary(pdus):
+    return [(pdu.timestamp, pdu.pgn, pdu.source, pdu.destination, bytes(pdu.data)) for pdu in pdus]
+
+
+def test_ingest_matches_notification(make_bus):
+    notified = make_bus()
+    ingested = make_bus()
+    for can_id, data in FRAMES:
+        notified.notification(can.Message(arbitration_id=can_id, is_extended_id=can_id > 0x7FF,
+                                          data=data, timestamp=5.0))
+
+    buffer = pack_can_frames(FRAMES)
+    assert len(buffer) == CAN_FRAME_SIZE * len(FRAMES)
+    assert ingested.ingest(memoryview(buffer), timestamp=5.0) == len(FRAMES) - 1
+
+    expected = _summary(drain(notified))
+    assert _summary(drain(ingested)) == expected
+    assert expected[-1] == (5.0, 0xFECA, 0x20, None, bytes(range(20)))
+
+
+def test_buffer_can_be_reused(make_bus):
+    bus = make_bus()
+    buffer = pack_can_frames(FRAMES[:2])
+    bus.ingest(buffer, timestamp=1.0)
+    buffer[:] = b"\xAA" * len(buffer)
+    assert [bytes(pdu.data) for pdu in drain(bus)] == [bytes(data) for _, data in FRAMES[:2]]
+
+
+def test_skips_remote_and_error_frames(make_bus):
+    bus = make_bus()
+    buffer = pack_can_frames([
+        (0x18FEF100 | CAN_EFF_FLAG | CAN_RTR_FLAG, []),
+        (0x20000080 | CAN_EFF_FLAG | CAN_ERR_FLAG, [0] * 8),
+        (0x18FEF100, [1] * 8),
+    ])
+    assert bus.ingest(buffer) == 1
+    assert [pdu.pgn for pdu in drain(bus)] == [0xFEF1]
+
+
+def test_counts_frames_in_metrics(make_bus):
+    bus = make_bus(metrics=True)
+    bus.ingest(pack_can_frames(FRAMES[:4] * 10 + [
+        (0x18FEF100 | CAN_EFF_FLAG | CAN_RTR_FLAG, []),
+        (0x80 | CAN_EFF_FLAG | CAN_ERR_FLAG, [0] * 8),
+    ]))
+    snapshot = bus.metrics.snapshot()
+    assert snapshot["rx_frames"] == 30
+    # the standard ID, remote and error frames
+    assert snapshot["rx_other_frames"] == 12
+
+
+def test_other_frames_count_the_same_through_the_listener(make_bus):
+    bus = make_bus(metrics=True)
+    listener = bus._listener
+    for msg in (can.Message(arbitration_id=0x123, is_extended_id=False, data=[1, 2]),
+                can.Message(arbitration_id=0x80, is_extended_id=True, is_error_frame=True, data=[0] * 8),
+                can.Message(arbitration_id=0x18FECA03, is_extended_id=True, data=[0] * 8)):
+        listener.on_message_received(msg)
+    snapshot = bus.metrics.snapshot()
+    assert (snapshot["rx_frames"], snapshot["rx_other_frames"]) == (1, 2)
+
+
+def test_partial_record_is_rejected(make_bus):
+    with pytest.raises(ValueError):
+        make_bus().ingest(b"\0" * (CAN_FRAME_SIZE - 1))
@@ -0,0 +1,150 @@
+import pytest
+
+import j1939
+from j1939.constants import *
+from j1939.memory import MemoryAccess, _transfer_data
+
+from tests.conftest import new_channel
+
+ECU = 0x17
+TOOL = 0x00
+
+
+class FakeECU(object):
+    """Answers DM14 requests from a dict of memory, on its bus's receive thread."""
+
+    def __init__(self, bus, memory, seed=None, key=None, silent=(), rejected=()):
+        self.bus = bus
+        self.memory = memory
+        self.seed = seed
+        self.key = key
+        self.silent = set(silent)
+        self.rejected = set(rejected)
+        self.writes = []
+        self._write = None
+        bus.subscribe(pgn=PGN_DM14_MEMORY_ACCESS_REQUEST, source=TOOL, destination=ECU, callback=self._on_dm14)
+        bus.subscribe(pgn=PGN_DM16_BINARY_DATA_TRANSFER, source=TOOL, destination=ECU, callback=self._on_dm16)
+
+    def _send(self, pdu_format, data):
+        pgn = j1939.PGN(pdu_format=pdu_format, pdu_specific=TOOL)
+        aid = j1939.ArbitrationID(pgn=pgn, source_address=ECU, destination_address=TOOL)
+        self.bus.send(j1939.PDU(arbitration_id=aid, data=data))
+
+    def _dm15(self, status, seed=0xFFFF, error=0xFFFFFF):
+        self._send(0xD8, [0, status << 1, error & 0xFF, (error >> 8) & 0xFF, error >> 16, 0xFF,
+                          seed & 0xFF, seed >> 8])
+
+    def _on_dm14(self, pdu):
+        data = pdu.data
+        length = data[0] | ((data[1] >> 5) << 8)
+        command = data[1] & 0x1F
+        pointer = data[2] | (data[3] << 8) | (data[4] << 16)
+        key = data[6] | (data[7] << 8)
+        if pointer in self.silent:
+            return
+        if pointer in self.rejected:
+            self._dm15(5, error=2)
+            return
+        if self.seed is not None and key != self.key:
+            self._dm15(0, seed=self.seed)
+            return
+        self._dm15(0)
+        if command == j1939.utils.DM14_READ:
+            self._send(0xD7, [length & 0xFF] + list(self.memory[pointer][:length]))
+        else:
+            self._write = pointer
+
+    def _on_dm16(self, pdu):
+        self.writes.append((self._write, list(pdu.data)))
+        self._dm15(4)
+
+
+def _pair(make_bus):
+    channel = new_channel()
+    tool = make_bus(channel=channel)
+    tool.connect(j1939.Node(tool, j1939.NodeName(0), [TOOL]))
+    ecu = make_bus(channel=channel)
+    ecu.connect(j1939.Node(ecu, j1939.NodeName(0), [ECU]))
+    return tool, ecu
+
+
+MEMORY = {
+    0x1000: bytes([1, 2, 3, 4]),
+    0x1004: bytes([5, 6]),
+    0x1006: bytes([7, 8, 9]),
+    0x2000: bytes(range(200)),
+    0x3000: bytes([0x2A]),
+}
+
+
+def test_reads_complete_in_order_with_values(make_bus):
+    tool, ecu = _pair(make_bus)
+    FakeECU(ecu, MEMORY)
+    objects = [(0x1000, 0, 4), (0x1004, 0, 2), (0x1006, 0, 3), (0x2000, 0, 200), (0x3000, 0, 1)]
+    results = list(MemoryAccess(tool, TOOL, ECU, window=4, timeout=2).read(objects))
+    assert [result.index for result in results] == [0, 1, 2, 3, 4]
+    assert [result.error for result in results] == [None] * 5
+    assert [result.value for result in results] == [0x04030201, 0x0605, bytes([7, 8, 9]), bytes(range(200)), 0x2A]
+
+
+def test_rejected_and_timed_out_reads(make_bus):
+    tool, ecu = _pair(make_bus)
+    FakeECU(ecu, MEMORY, silent=[0x1004], rejected=[0x1006])
+    results = list(MemoryAccess(tool, TOOL, ECU, window=1, timeout=0.2).read(
+        [(0x1000, 0, 4), (0x1004, 0, 2), (0x1006, 0, 3), (0x3000, 0, 1)]))
+    assert [result.index for result in results] == [0, 1, 2, 3]
+    assert results[0].value == 0x04030201
+    assert str(results[1].error) == "no DM15/DM16 response"
+    assert (results[2].error.status, results[2].error.error_code) == (5, 2)
+    assert results[3].value == 0x2A
+
+
+def test_writes_send_dm16_after_proceed(make_bus):
+    tool, ecu = _pair(make_bus)
+    fake = FakeECU(ecu, MEMORY)
+    results = list(MemoryAccess(tool, TOOL, ECU, timeout=2).write(
+        [(0x1000, 0, 4, 0x01020304), (0x1004, 0, 4, "abc"), (0x1006, 0, 3, [7, 8, 9])]))
+    assert [result.error for result in results] == [None] * 3
+    assert fake.writes == [(0x1000, [4, 4, 3, 2, 1]), (0x1004, [5, 97, 98, 99]), (0x1006, [3, 7, 8, 9])]
+
+
+def test_seed_is_answered_with_the_key(make_bus):
+    tool, ecu = _pair(make_bus)
+    FakeECU(ecu, MEMORY, seed=0x1234, key=0x4321)
+    seeds = []
+
+    def keygen(seed):
+        seeds.append(seed)
+        # only the low 16 bits fit the DM14 key field
+        return 0x12340000 | 0x4321
+
+    [result] = MemoryAccess(tool, TOOL, ECU, timeout=2, keygen=keygen).read([(0x1000, 0, 4)])
+    assert (result.value, result.error) == (0x04030201, None)
+    assert seeds == [0x1234]
+
+
+def test_seed_fails_without_keygen_or_with_a_wrong_key(make_bus):
+    tool, ecu = _pair(make_bus)
+    FakeECU(ecu, MEMORY, seed=0x1234, key=0x4321)
+    [result] = MemoryAccess(tool, TOOL, ECU, timeout=2).read([(0x1000, 0, 4)])
+    assert str(result.error) == "ECU asks for a seed/key exchange"
+    [result] = MemoryAccess(tool, TOOL, ECU, timeout=2, keygen=lambda seed: 0).read([(0x1000, 0, 4)])
+    assert str(result.error) == "key not accepted"
+
+
+def test_transfer_data_matches_set_mem_object():
+    assert _transfer_data(0x0102, 2) == [2, 2, 1]
+    assert _transfer_data("ab", 4) == [5, 97, 98]
+    assert _transfer_data(b"\x01\x02", 2) == [2, 1, 2]
+    with pytest.raises(ValueError):
+        _transfer_data(1, 8)
+    with pytest.raises(ValueError):
+        _transfer_data("abcde", 4)
+
+
+def test_invalid_arguments(make_bus):
+    tool = make_bus()
+    with pytest.raises(ValueError):
+        MemoryAccess(tool, window=0)
+    with pytest.raises(ValueError):
+        MemoryAccess(tool).read([(0, 0, 0)])
@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+from j1939.canframe import pack_can_frames, CAN_EFF_FLAG
+from j1939.metrics import Histogram, MetricsRegistry, PrometheusFileWriter
+
+
+def _lines(text):
+    return [line for line in text.splitlines() if not line.startswith("#")]
+
+
+def test_histogram_is_cumulative():
+    histogram = Histogram((1.0, 0.1))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"] == [(0.1, 2), (1.0, 3), (float("inf"), 4)]
+    assert (snapshot["count"], snapshot["sum"]) == (4, pytest.approx(2.65))
+
+
+def test_notification_sample_must_be_power_of_two():
+    with pytest.raises(ValueError):
+        MetricsRegistry(notification_sample=3)
+
+
+def test_snapshot_splits_can_ids():
+    registry = MetricsRegistry()
+    registry.rx.update({0x0CF00400: 3, 0x18F00400: 2, 0x18EA1700: 1})
+    registry.sent(0x18EA0017)
+    snapshot = registry.snapshot()
+    assert snapshot["rx_frames"] == 6
+    assert snapshot["rx_by_pgn"] == {0xF004: 5, 0xEA00: 1}
+    assert snapshot["rx_by_pgn_source"] == {(0xF004, 0x00): 5, (0xEA00, 0x00): 1}
+    assert snapshot["tx_by_source"] == {0x17: 1}
+
+
+def test_prometheus_text():
+    registry = MetricsRegistry()
+    registry.rx[0x18FECA03] = 7
+    registry.rx_other = 2
+    registry.queue_stats = lambda: {"pdu": {"depth": 1, "high_water": 5, "dropped": 0}}
+    text = registry.prometheus_text(labels={"channel": "can0"})
+    lines = _lines(text)
+    assert 'j1939_frames_received_total{pgn="0x0feca",source="0x03",channel="can0"} 7' in lines
+    assert 'j1939_frames_other_received_total{channel="can0"} 2' in lines
+    assert 'j1939_queue_high_water{queue="pdu",channel="can0"} 5' in lines
+    assert 'j1939_tp_sessions_total{event="completed",kind="bam",channel="can0"} 0' in lines
+    assert 'j1939_notification_seconds_bucket{le="+Inf",channel="can0"} 0' in lines
+    assert "# TYPE j1939_tp_session_duration_seconds histogram" in text
+    assert text.endswith("\n")
+
+
+def test_prometheus_text_without_labels():
+    registry = MetricsRegistry()
+    assert "j1939_frames_other_received_total 0" in _lines(registry.prometheus_text())
+
+
+def test_bus_metrics(make_bus):
+    bus = make_bus(metrics=True)
+    bus.ingest(pack_can_frames([(0x18FECA03 | CAN_EFF_FLAG, [0] * 8)] * 4 + [(0x123, [1])]))
+    text = bus.metrics.prometheus_text()
+    assert 'j1939_frames_received_total{pgn="0x0feca",source="0x03"} 4' in text
+    assert "j1939_frames_other_received_total 1" in text
+    bus.metrics.reset()
+    snapshot = bus.metrics.snapshot()
+    assert (snapshot["rx_frames"], snapshot["rx_other_frames"]) == (0, 0)
+
+
+def test_file_writer(tmp_path):
+    registry = MetricsRegistry()
+    registry.rx_other = 1
+    path = str(tmp_path / "j1939.prom")
+    writer = PrometheusFileWriter(registry, path, interval=60)
+    writer.start()
+    writer.stop()
+    with open(path) as f:
+        assert "j1939_frames_other_received_total 1" in f.read()
+    assert os.listdir(str(tmp_path)) == ["j1939.prom"]
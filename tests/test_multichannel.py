@@ -0,0 +1,126 @@
+import threading
+
+import can
+import pytest
+
+from j1939.multichannel import MultiChannelBus
+
+from tests.conftest import new_channel
+
+
+class _Clock(object):
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def make_multi():
+    multis = []
+
+    def make(names=("a", "b", "c"), **kwargs):
+        channels = dict((name, dict(channel=new_channel(), bustype="virtual")) for name in names)
+        kwargs.setdefault("timeout", 0.01)
+        multi = MultiChannelBus(channels, **kwargs)
+        multis.append(multi)
+        return multi
+
+    yield make
+    for multi in multis:
+        multi.shutdown()
+
+
+def _inject(multi, name, timestamp, source=0x00):
+    multi[name].notification(can.Message(timestamp=timestamp, arbitration_id=0x18FECA00 | source,
+                                         is_extended_id=True, data=[source] * 8))
+
+
+def _drain(multi):
+    items = []
+    while True:
+        item = multi.recv(timeout=0)
+        if item is None:
+            return items
+        items.append((item.channel, item.pdu.timestamp))
+
+
+def test_merges_in_timestamp_order(make_multi):
+    multi = make_multi(clock=_Clock(1000.0))
+    timestamps = {"a": [1.0, 4.0, 4.5, 9.0], "b": [2.0, 3.0, 8.0], "c": [0.5, 4.25, 7.0, 7.5, 10.0]}
+    for name, values in timestamps.items():
+        for timestamp in values:
+            _inject(multi, name, timestamp)
+    merged = _drain(multi)
+    assert [timestamp for _, timestamp in merged] == sorted(t for values in timestamps.values() for t in values)
+    assert merged[:3] == [("c", 0.5), ("a", 1.0), ("b", 2.0)]
+    assert (multi.released, multi.late) == (12, 0)
+
+
+def test_quiet_channel_holds_back_for_max_latency(make_multi):
+    clock = _Clock(100.0)
+    multi = make_multi(names=("a", "b"), clock=clock, max_latency=0.05)
+    _inject(multi, "a", 99.99)
+    assert multi.recv(timeout=0) is None
+    clock.now = 100.03
+    assert multi.recv(timeout=0) is None
+    clock.now = 100.05
+    item = multi.recv(timeout=0)
+    assert (item.channel, item.pdu.timestamp) == ("a", 99.99)
+
+
+def test_channel_that_delivered_newer_doesnt_hold_back(make_multi):
+    multi = make_multi(names=("a", "b"), clock=_Clock(2.01), max_latency=0.05)
+    _inject(multi, "a", 1.0)
+    _inject(multi, "a", 3.0)
+    _inject(multi, "b", 2.0)
+    assert _drain(multi) == [("a", 1.0), ("b", 2.0)]
+    # b delivered 2.0 only, it could still deliver something before 3.0
+    _inject(multi, "b", 2.5)
+    assert _drain(multi) == [("b", 2.5)]
+
+
+def test_late_frames_pass_and_are_counted(make_multi):
+    clock = _Clock(10.0)
+    multi = make_multi(names=("a", "b"), clock=clock, max_latency=0.05)
+    _inject(multi, "a", 5.0)
+    assert _drain(multi) == [("a", 5.0)]
+    _inject(multi, "b", 4.0)
+    assert _drain(multi) == [("b", 4.0)]
+    assert multi.late == 1
+
+
+def test_blocking_recv_is_woken_by_a_put(make_multi):
+    multi = make_multi(names=("a", "b"), max_latency=0.0)
+    result = []
+    reader = threading.Thread(target=lambda: result.append(multi.recv(timeout=2)))
+    reader.start()
+    _inject(multi, "b", 0.0)
+    reader.join(3)
+    assert result[0].channel == "b"
+
+
+def test_shutdown_ends_iteration(make_multi):
+    multi = make_multi(names=("a",))
+    stopper = threading.Timer(0.05, multi.shutdown)
+    stopper.start()
+    assert list(multi) == []
+    stopper.join()
+
+
+def test_channels_from_a_list():
+    channels = [new_channel(), new_channel()]
+    multi = MultiChannelBus([dict(channel=channel, bustype="virtual") for channel in channels], timeout=0.01)
+    try:
+        assert multi.channels == channels
+        assert list(multi.queue_stats) == channels
+    finally:
+        multi.shutdown()
+
+
+def test_bad_arguments():
+    with pytest.raises(ValueError):
+        MultiChannelBus({}, bustype="virtual")
+    with pytest.raises(ValueError):
+        MultiChannelBus({"a": dict(channel=new_channel(), bustype="virtual")}, max_latency=-1)
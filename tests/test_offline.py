@@ -0,0 +1,89 @@
+import can
+import pytest
+
+from j1939.capture import CaptureWriter
+from j1939.offline import OfflineDecoder, decode_messages, decode_file, _shard_key
+
+
+def _msg(timestamp, can_id, data, extended=True):
+    return can.Message(timestamp=timestamp, arbitration_id=can_id, is_extended_id=extended, data=data)
+
+
+def _recording():
+    """Single frames of 6 sources around a BAM from 0x20 and an RTS/CTS session from 0x21 to 0x30."""
+    frames = []
+    t = 1000.0
+    for i in range(60):
+        frames.append(_msg(t, 0x0CF00400 | (i % 6), [i] * 8))
+        t += 0.001
+        if i == 10:
+            frames.append(_msg(t, 0x1CECFF20, [0x20, 14, 0, 2, 0xFF, 0xCA, 0xFE, 0]))
+        elif i == 20:
+            frames.append(_msg(t, 0x1CEBFF20, [1] + [0xB1] * 7))
+            frames.append(_msg(t, 0x1CEC3021, [0x10, 10, 0, 2, 0xFF, 0xE5, 0xFE, 0]))
+        elif i == 21:
+            frames.append(_msg(t, 0x1CEC2130, [0x11, 2, 1, 0xFF, 0xFF, 0xE5, 0xFE, 0]))
+        elif i == 30:
+            frames.append(_msg(t, 0x1CEBFF20, [2] + [0xB2] * 7))
+            frames.append(_msg(t, 0x1CEB3021, [1] + [0xC1] * 7))
+        elif i == 31:
+            frames.append(_msg(t, 0x1CEB3021, [2, 0xC2, 0xC2, 0xC2, 0xFF, 0xFF, 0xFF, 0xFF]))
+        elif i == 40:
+            frames.append(_msg(t, 0x123, [1, 2], extended=False))
+        t += 0.001
+    return frames
+
+
+def _summary(pdus):
+    return [(round(pdu.timestamp, 6), pdu.pgn, pdu.source, bytes(pdu.data)) for pdu in pdus]
+
+
+@pytest.fixture
+def capture(tmp_path):
+    path = str(tmp_path / "recording.j1939")
+    with CaptureWriter(path, block_records=16) as writer:
+        for msg in _recording():
+            writer.write(msg)
+    return path
+
+
+def test_decoder_reassembles_both_sessions():
+    pdus = list(decode_messages(_recording()))
+    long = [pdu for pdu in pdus if len(pdu.data) > 8]
+    assert [(pdu.pgn, pdu.source, bytes(pdu.data)) for pdu in long] == [
+        (0xFECA, 0x20, bytes([0xB1] * 7 + [0xB2] * 7)),
+        (0xFEE5, 0x21, bytes([0xC1] * 7 + [0xC2] * 3)),
+    ]
+    # the standard frame and the transport frames give no PDU
+    assert len(pdus) == 62
+
+
+def test_decoder_includes_transport_frames():
+    decoder = OfflineDecoder(include_transport=True)
+    pdus = [pdu for pdu in map(decoder.decode, _recording()) if pdu is not None]
+    # the last TP.DT of a session gives the reassembled PDU instead
+    assert len(pdus) == 62 + 5
+    assert (decoder.frames, decoder.pdus) == (68, 67)
+
+
+def test_shard_key_keeps_sessions_together():
+    assert _shard_key(0x1CEC3021) == _shard_key(0x1CEC2130) == _shard_key(0x1CEB3021)
+    assert _shard_key(0x0CF00405) == 0x05
+
+
+@pytest.mark.parametrize("processes", [2, 3, 7])
+def test_sharded_decode_matches_sequential(capture, processes):
+    sequential = _summary(decode_file(capture, processes=1))
+    sharded = _summary(decode_file(capture, processes=processes))
+    assert sharded == sequential
+    timestamps = [summary[0] for summary in sharded]
+    assert timestamps == sorted(timestamps)
+
+
+def test_decodes_python_can_logs(tmp_path):
+    path = str(tmp_path / "recording.log")
+    writer = can.CanutilsLogWriter(path, channel="can0")
+    for msg in _recording():
+        writer.on_message_received(msg)
+    writer.stop()
+    assert _summary(decode_file(path, processes=2)) == _summary(decode_messages(_recording()))
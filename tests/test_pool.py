@@ -0,0 +1,73 @@
+import itertools
+import time
+
+import pytest
+
+from j1939.pool import BusPool
+from j1939.utils import _keygen
+
+_channels = itertools.count()
+
+
+@pytest.fixture
+def pool():
+    pool = BusPool(idle_timeout=None)
+    yield pool
+    pool.close()
+
+
+def _channel():
+    return "pool-%d" % next(_channels)
+
+
+def test_acquire_reuses_open_bus(pool):
+    channel = _channel()
+    first = pool.acquire(channel, "virtual", 250, 0)
+    second = pool.acquire(channel, "virtual", "250", 0)
+    assert first is second
+    assert (pool.opened, pool.reused, len(pool)) == (1, 1, 1)
+    pool.release(first)
+    pool.release(second)
+    with pytest.raises(ValueError):
+        pool.release(first)
+
+
+def test_bus_arguments_are_part_of_the_key(pool):
+    channel = _channel()
+    keygen = _keygen(250)
+    with pool.bus(channel, "virtual", 250, 0, keygen=keygen) as with_keygen:
+        with pool.bus(channel, "virtual", 250, 0) as without:
+            assert with_keygen is not without
+        with pool.bus(channel, "virtual", 250, 0, keygen=_keygen("250")) as again:
+            assert again is with_keygen
+        with pool.bus(channel, "virtual", 250, 1, keygen=keygen) as other_source:
+            assert other_source is not with_keygen
+    assert pool.opened == 3
+
+
+def test_unhashable_arguments(pool):
+    channel = _channel()
+    filters = [{"pgn": 0xFECA}]
+    with pool.bus(channel, "virtual", 250, 0, j1939_filters=filters) as first:
+        with pool.bus(channel, "virtual", 250, 0, j1939_filters=list(filters)) as second:
+            assert first is second
+
+
+def test_release_to_zero_users_closes_without_idle_timeout(pool):
+    pool.idle_timeout = 0
+    with pool.bus(_channel(), "virtual", 250, 0):
+        assert len(pool) == 1
+    assert len(pool) == 0
+
+
+def test_idle_bus_closes_after_timeout_unless_reacquired(pool):
+    pool.idle_timeout = 0.05
+    channel = _channel()
+    with pool.bus(channel, "virtual", 250, 0) as first:
+        pass
+    with pool.bus(channel, "virtual", 250, 0) as second:
+        assert second is first
+        time.sleep(0.1)
+        assert len(pool) == 1
+    time.sleep(0.2)
+    assert len(pool) == 0
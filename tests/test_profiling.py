@@ -0,0 +1,118 @@
+import json
+
+import pytest
+
+from j1939 import profiling
+from j1939.canframe import pack_can_frames
+from j1939.profiling import FrameProfile, LatencyCollector, ChromeTraceRecorder
+
+from tests.conftest import drain
+
+
+@pytest.fixture(autouse=True)
+def no_hooks():
+    yield
+    profiling.remove_hook()
+
+
+def _profile(can_id, stamps, consumer=False):
+    profile = FrameProfile(can_id, 1, stamps[0][1])
+    profile.stamps = list(stamps)
+    if consumer:
+        profile.consumer_thread = 2
+    return profile
+
+
+def test_hooks_turn_profiling_on_and_off():
+    collector = LatencyCollector()
+    assert not profiling.enabled
+    profiling.add_hook(collector)
+    profiling.add_hook(collector)
+    assert profiling.enabled and profiling._hooks == [collector]
+    profiling.remove_hook(collector)
+    assert not profiling.enabled
+
+
+def test_durations_and_stats():
+    collector = LatencyCollector()
+    collector(_profile(1, [("frame_in", 0), ("decode", 2000), ("dispatch", 5000)]))
+    collector(_profile(2, [("frame_in", 0), ("decode", 4000), ("dispatch", 6000)]))
+    stats = collector.stats()
+    assert stats["decode"]["count"] == 2
+    assert (stats["decode"]["p50_us"], stats["decode"]["max_us"]) == (4.0, 4.0)
+    assert stats["dispatch"]["max_us"] == 3.0
+    assert stats["total"]["p50_us"] == 6.0
+    collector.clear()
+    assert collector.stats() == {}
+
+
+def test_a_failing_hook_doesnt_stop_the_others():
+    def broken(profile):
+        raise RuntimeError("broken hook")
+
+    collector = LatencyCollector()
+    profiling.add_hook(broken)
+    profiling.add_hook(collector)
+    profiling.begin(0x18FECA00)
+    profiling.end()
+    assert collector.frames == 1
+
+
+def test_bus_stages(make_bus):
+    bus = make_bus()
+    collector = LatencyCollector()
+    profiling.add_hook(collector)
+    bus.ingest(pack_can_frames([(0x18FECA03, [0] * 8)] * 3 + [
+        (0x1CECFF03, [0x20, 10, 0, 2, 0xFF, 0xCA, 0xFE, 0]),
+        (0x1CEBFF03, [1] * 8),
+        (0x1CEBFF03, [2] * 8),
+    ]))
+    # queued PDUs are reported once they are taken out of the queue
+    assert collector.frames == 2
+    assert len(drain(bus)) == 4
+    assert collector.frames == 6
+    stats = collector.stats()
+    for stage in ("decode", "dispatch", "tp", "queue_put", "consumer_get", "total"):
+        assert stage in stats
+
+
+def test_chrome_trace(tmp_path):
+    recorder = ChromeTraceRecorder(window=1.0, max_frames=2)
+    recorder(_profile(0x18FECA03, [("frame_in", 1000), ("decode", 3000), ("queue_put", 4000),
+                                   ("consumer_get", 10000)], consumer=True))
+    # outside the window
+    recorder(_profile(0x18FECA03, [("frame_in", 2 * 10 ** 9), ("decode", 2 * 10 ** 9 + 1)]))
+    recorder(_profile(0x0CF00400, [("frame_in", 5000), ("decode", 6000)]))
+    recorder(_profile(0x0CF00400, [("frame_in", 7000), ("decode", 8000)]))
+    assert recorder.full and len(recorder.profiles) == 2
+
+    path = str(tmp_path / "trace.json")
+    recorder.write(path)
+    with open(path) as f:
+        trace = json.load(f)
+    events = [(e["name"], e["tid"], e["ts"], e["dur"]) for e in trace["traceEvents"]]
+    assert events == [
+        ("frame 0x18feca03", 1, 0.0, 3.0),
+        ("decode", 1, 0.0, 2.0),
+        ("queue_put", 1, 2.0, 1.0),
+        ("queue wait", 2, 3.0, 6.0),
+        ("frame 0x0cf00400", 1, 4.0, 1.0),
+        ("decode", 1, 4.0, 1.0),
+    ]
+    assert all(e["ph"] == "X" for e in trace["traceEvents"])
+
+
+def test_pending_is_bounded(monkeypatch):
+    monkeypatch.setattr(profiling, "MAX_PENDING", 2)
+    collector = LatencyCollector()
+    profiling.add_hook(collector)
+    pdus = [object() for _ in range(3)]
+    for pdu in pdus:
+        profiling.begin(0)
+        profiling.queued(pdu)
+        profiling.end()
+    assert len(profiling._pending) == 2
+    profiling.consumed(pdus[0])
+    assert collector.frames == 0
+    profiling.consumed(pdus[2])
+    assert collector.frames == 1
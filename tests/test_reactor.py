@@ -0,0 +1,114 @@
+import threading
+import time
+
+import pytest
+
+import j1939
+from j1939.canframe import pack_can_frames
+from j1939.constants import TP_TIMEOUT_T1
+from j1939.reactor import Reactor
+
+from tests.conftest import new_channel
+
+
+@pytest.fixture
+def reactor():
+    reactor = Reactor()
+    yield reactor
+    reactor.stop(timeout=2)
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def _pdu(source, data, pdu_format=0xFE, pdu_specific=0xCA):
+    aid = j1939.ArbitrationID(pgn=j1939.PGN(pdu_format=pdu_format, pdu_specific=pdu_specific),
+                              source_address=source)
+    return j1939.PDU(arbitration_id=aid, data=data)
+
+
+def test_buses_share_the_reactor_thread(make_bus, reactor):
+    channel = new_channel()
+    sender = make_bus(channel=channel)
+    buses = [make_bus(channel=channel, reactor=reactor) for _ in range(3)]
+    assert len(reactor) == 3
+    threads = []
+    for bus in buses:
+        bus.subscribe(pgn=0xFECA, callback=lambda pdu: threads.append(threading.current_thread()))
+    sender.send(_pdu(0x20, [1] * 8))
+    for bus in buses:
+        pdu = bus.recv(timeout=2)
+        assert (pdu.pgn, list(pdu.data)) == (0xFECA, [1] * 8)
+    assert threads == [reactor.thread] * 3
+
+
+def test_nodes_run_inline(make_bus, reactor):
+    channel = new_channel()
+    sender = make_bus(channel=channel)
+    bus = make_bus(channel=channel, reactor=reactor)
+    seen = []
+
+    class RecordingNode(j1939.Node):
+        def on_message_received(self, pdu):
+            seen.append((pdu.pgn, threading.current_thread()))
+
+    bus.connect(RecordingNode(bus, j1939.NodeName(0), [0x30]))
+    # nodes get the network management PGNs, e.g. a request
+    sender.send(_pdu(0x20, [0xCA, 0xFE, 0x00], pdu_format=0xEA, pdu_specific=0xFF))
+    assert _wait_for(lambda: seen)
+    assert seen[0] == (0xEA00, reactor.thread)
+
+
+def test_bam_is_paced_by_the_reactor(make_bus, reactor):
+    channel = new_channel()
+    bus = make_bus(channel=channel, reactor=reactor)
+    bus.connect(j1939.Node(bus, j1939.NodeName(0), [0x20]))
+    receiver = make_bus(channel=channel)
+    bus.send(_pdu(0x20, list(range(30))))
+    pdu = receiver.recv(timeout=2)
+    assert list(pdu.data) == list(range(30))
+    # no scheduler thread of its own
+    assert bus._tx_scheduler._thread is None
+    assert bus._tx_scheduler.completed == 1
+
+
+def test_stalled_session_times_out_without_traffic(make_bus, reactor):
+    bus = make_bus(reactor=reactor)
+    bus.ingest(pack_can_frames([(0x1CECFF03, [0x20, 14, 0, 2, 0xFF, 0xCA, 0xFE, 0]),
+                                (0x1CEBFF03, [1] * 8)]))
+    assert len(bus._tp_sessions) == 1
+    assert _wait_for(lambda: len(bus._tp_sessions) == 0, TP_TIMEOUT_T1 + 1.0)
+
+
+def test_add_and_remove(make_bus):
+    reactor = Reactor()
+    bus = make_bus(reactor=reactor)
+    with pytest.raises(ValueError):
+        reactor.add(bus)
+    assert reactor.remove(bus)
+    assert not reactor.remove(bus)
+    thread = reactor.thread
+    reactor.stop(timeout=2)
+    assert not thread.is_alive()
+    with pytest.raises(RuntimeError):
+        reactor.add(bus)
+
+
+def test_own_reactor_stops_with_the_bus():
+    bus = j1939.Bus(channel=new_channel(), bustype="virtual", timeout=0.01, reactor=True)
+    thread = bus._reactor.thread
+    assert thread.is_alive()
+    bus.shutdown()
+    thread.join(2)
+    assert not thread.is_alive()
+
+
+def test_reactor_and_loop_are_exclusive():
+    with pytest.raises(ValueError):
+        j1939.Bus(channel=new_channel(), bustype="virtual", reactor=True, loop=object())
@@ -0,0 +1,101 @@
+import threading
+from queue import Full
+
+import pytest
+
+import j1939
+from j1939.canframe import pack_can_frames
+from j1939.receivequeue import (ReceiveQueue, OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST,
+                                OVERFLOW_PRIORITY)
+
+
+def _pdu(priority, tag):
+    aid = j1939.ArbitrationID(priority=priority, pgn=j1939.PGN(pdu_format=0xFE, pdu_specific=0xCA),
+                              source_address=0x20)
+    return j1939.PDU(arbitration_id=aid, data=[tag])
+
+
+def _tags(queue):
+    tags = []
+    while not queue.empty():
+        tags.append(queue.get_nowait().data[0])
+    return tags
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        ReceiveQueue(4, "drop-random")
+
+
+def test_drop_newest():
+    queue = ReceiveQueue(2, OVERFLOW_DROP_NEWEST)
+    for tag in range(4):
+        queue.put(_pdu(6, tag))
+    assert _tags(queue) == [0, 1]
+    assert (queue.dropped, queue.dropped_by_priority[6], queue.high_water) == (2, 2, 2)
+
+
+def test_drop_oldest():
+    queue = ReceiveQueue(2, OVERFLOW_DROP_OLDEST)
+    for tag in range(4):
+        queue.put(_pdu(6, tag))
+    assert _tags(queue) == [2, 3]
+    assert queue.dropped == 2
+    # the evicted PDUs don't count as unfinished tasks
+    assert queue.unfinished_tasks == 2
+
+
+def test_priority_sheds_lowest_priority_first():
+    queue = ReceiveQueue(3, OVERFLOW_PRIORITY)
+    queue.put(_pdu(6, 0))
+    queue.put(_pdu(3, 1))
+    queue.put(_pdu(6, 2))
+    queue.put(_pdu(0, 3))   # evicts the oldest priority 6 PDU
+    queue.put(_pdu(7, 4))   # lower than everything queued, dropped
+    queue.put(_pdu(6, 5))   # evicts the other priority 6 PDU
+    assert queue.depth == 3
+    # still returned in arrival order
+    assert _tags(queue) == [1, 3, 5]
+    assert queue.dropped == 3
+    assert queue.dropped_by_priority == [0, 0, 0, 0, 0, 0, 2, 1]
+
+
+def test_priority_of_items_without_one():
+    queue = ReceiveQueue(1, OVERFLOW_PRIORITY)
+    queue.put(_pdu(6, 0))
+    queue.put(None)
+    assert queue.dropped_by_priority[7] == 1
+    assert _tags(queue) == [0]
+
+
+def test_block_waits_for_room():
+    queue = ReceiveQueue(1, OVERFLOW_BLOCK)
+    queue.put(_pdu(6, 0))
+    with pytest.raises(Full):
+        queue.put(_pdu(6, 1), timeout=0.01)
+    consumer = threading.Timer(0.02, queue.get)
+    consumer.start()
+    queue.put(_pdu(6, 2), timeout=2)
+    consumer.join()
+    assert _tags(queue) == [2]
+    assert queue.dropped == 0
+
+
+def test_clear_and_stats():
+    queue = ReceiveQueue(0, OVERFLOW_PRIORITY)
+    calls = []
+    queue.on_put = lambda: calls.append(True)
+    for tag in range(5):
+        queue.put(_pdu(tag, tag))
+    queue.clear()
+    assert len(calls) == 5
+    assert queue.stats() == {"depth": 0, "high_water": 5, "dropped": 0, "maxsize": 0, "policy": "priority"}
+    queue.put(_pdu(1, 9))
+    assert _tags(queue) == [9]
+
+
+def test_bus_queue_overflow(make_bus):
+    bus = make_bus(queue_size=2, overflow_policy=OVERFLOW_DROP_OLDEST)
+    bus.ingest(pack_can_frames([(0x18FECA00 | source, [source] * 8) for source in range(5)]))
+    assert [pdu.source for pdu in [bus.recv(timeout=0), bus.recv(timeout=0)]] == [3, 4]
+    assert bus.queue_stats["bus"]["dropped"] == 3
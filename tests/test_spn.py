@@ -0,0 +1,126 @@
+import io
+
+import pytest
+
+import j1939
+from j1939.spn import SPNDatabase, SPNDefinition, PGNExtractor, NOT_AVAILABLE, ERROR, _special_values
+
+EEC1 = 0xF004
+
+DEFINITIONS = [
+    SPNDefinition(190, "Engine Speed", EEC1, 24, 16, 0.125, 0.0, "rpm"),
+    SPNDefinition(513, "Actual Engine - Percent Torque", EEC1, 16, 8, 1.0, -125.0, "%"),
+    SPNDefinition(899, "Engine Torque Mode", EEC1, 0, 4),
+    SPNDefinition(None, "Switch", EEC1, 4, 2),
+    SPNDefinition(None, "Flag", EEC1, 6, 1),
+]
+
+
+def _extract(field, length, raw, signed=False):
+    extractor = PGNExtractor(EEC1, [SPNDefinition(None, field, EEC1, 0, length, signed=signed)])
+    return extractor(raw.to_bytes(max(1, (length + 7) // 8), "little"))[field]
+
+
+@pytest.mark.parametrize("length, valid_max, not_available", [
+    (1, 1, 2),
+    (2, 1, 3),
+    (4, 13, 15),
+    (8, 0xFA, 0xFF),
+    (16, 0xFAFF, 0xFF00),
+    (32, 0xFAFFFFFF, 0xFF000000),
+])
+def test_special_value_ranges(length, valid_max, not_available):
+    assert _special_values(length, False) == (valid_max, not_available)
+    assert _extract("x", length, valid_max) == valid_max
+    if not_available <= (1 << length) - 1:
+        assert _extract("x", length, not_available) is NOT_AVAILABLE
+        assert _extract("x", length, (1 << length) - 1) is NOT_AVAILABLE
+    if valid_max + 1 < not_available:
+        assert _extract("x", length, valid_max + 1) is ERROR
+        assert _extract("x", length, not_available - 1) is ERROR
+
+
+def test_indicators_are_falsy():
+    assert not NOT_AVAILABLE and not ERROR
+    assert repr(NOT_AVAILABLE) == "NOT_AVAILABLE"
+
+
+def test_signed_parameters_have_no_special_values():
+    assert _extract("x", 8, 0xFF, signed=True) == -1
+    assert _extract("x", 16, 0x8000, signed=True) == -0x8000
+
+
+def test_decode_scales():
+    db = SPNDatabase(DEFINITIONS)
+    values = db.decode_data(EEC1, [0x03, 0xFF, 135, 0x40, 0x25, 0xFF, 0xFF, 0xFF])
+    assert values == {"Engine Speed": 1192.0, "Actual Engine - Percent Torque": 10.0,
+                      "Engine Torque Mode": 3, "Switch": 0, "Flag": 0}
+
+
+def test_decode_all_ones():
+    values = SPNDatabase(DEFINITIONS).decode_data(EEC1, [0xFF] * 8)
+    # a single bit has no room for special values
+    assert values.pop("Flag") == 1
+    assert set(values.values()) == {NOT_AVAILABLE}
+
+
+def test_decode_short_payload():
+    values = SPNDatabase(DEFINITIONS).decode_data(EEC1, [0x03, 0xFF, 135])
+    assert values["Engine Speed"] is NOT_AVAILABLE
+    assert values["Actual Engine - Percent Torque"] == 10.0
+
+
+def test_pdu1_pgns_drop_the_destination():
+    db = SPNDatabase([SPNDefinition(None, "Value", 0xEF17, 0, 8)])
+    assert db.pgns == [0xEF00]
+    assert 0xEF42 in db
+    assert db.decode_data(0xEF42, [7]) == {"Value": 7}
+    assert db.decode_data(0xFECA, [7]) is None
+
+
+def test_decode_pdu():
+    aid = j1939.ArbitrationID(pgn=j1939.PGN(pdu_format=0xF0, pdu_specific=0x04), source_address=0)
+    pdu = j1939.PDU(arbitration_id=aid, data=[0xF0, 0xFF, 125, 0x00, 0x20, 0xFF, 0xFF, 0xFF])
+    assert SPNDatabase(DEFINITIONS).decode(pdu)["Engine Speed"] == 1024.0
+
+
+def test_zero_length_is_rejected():
+    with pytest.raises(ValueError):
+        SPNDatabase([SPNDefinition(1, "Nothing", EEC1, 0, 0)])
+
+
+def test_csv_plain_columns():
+    db = SPNDatabase.from_csv(io.StringIO(
+        "pgn,spn,name,start_bit,length,scale,offset,units\n"
+        "61444,190,Engine Speed,24,16,0.125,0,rpm\n"))
+    assert db.definitions(EEC1) == [DEFINITIONS[0]]
+
+
+def test_csv_digital_annex_columns():
+    db = SPNDatabase.from_csv(io.StringIO(
+        "PGN,SPN,SPN Name,SPN Position in PG,SPN Length,Resolution,Offset,Units\n"
+        "61444,190,Engine Speed,4-5,2 bytes,0.125 rpm/bit,0,rpm\n"
+        "61444,899,Engine Torque Mode,1.1,4 bits,Binary,0,bit\n"
+        "65260,237,Vehicle Identification Number,a,Variable,ASCII,0,ASCII\n"
+        "65265,84,Wheel-Based Vehicle Speed,2-3,2 bytes,1/256 km/h per bit,0,km/h\n"))
+    assert len(db) == 3
+    speed, = db.definitions(65265)
+    assert (speed.start_bit, speed.length, speed.scale) == (8, 16, 1 / 256.0)
+    mode, = [d for d in db.definitions(EEC1) if d.spn == 899]
+    assert (mode.start_bit, mode.length, mode.scale) == (0, 4, 1.0)
+
+
+def test_csv_needs_position_columns():
+    with pytest.raises(ValueError):
+        SPNDatabase.from_csv(io.StringIO("pgn,name\n61444,Engine Speed\n"))
+
+
+def test_dbc():
+    db = SPNDatabase.from_dbc(io.StringIO(
+        'BO_ 2364540158 EEC1: 8 Vector__XXX\n'
+        ' SG_ EngSpeed : 24|16@1+ (0.125,0) [0|8031.875] "rpm" Vector__XXX\n'
+        ' SG_ Torque : 16|8@1- (1,0) [-128|127] "%" Vector__XXX\n'
+        ' SG_ Motorola : 7|8@0+ (1,0) [0|255] "" Vector__XXX\n'
+        'BA_ "SPN" SG_ 2364540158 EngSpeed 190;\n'))
+    definitions = db.definitions(EEC1)
+    assert [(d.spn, d.name, d.signed) for d in definitions] == [(190, "EngSpeed", False), (None, "Torque", True)]
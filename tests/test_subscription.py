@@ -0,0 +1,48 @@
+import time
+
+import can
+import pytest
+
+from j1939.filters import compile_filters
+from j1939.subscription import normalize_pgn
+
+
+@pytest.mark.parametrize("pgn, normalized", [
+    (0xEF17, 0xEF00),
+    (0x1EF17, 0xEF00),      # PDU1, data page 1
+    (0x1EF00, 0xEF00),
+    (0x2F017, 0xF000),      # the reserved bit makes it PDU1
+    (0xFECA, 0xFECA),
+    (0x1FEDA, 0x1FEDA),     # PDU2 keeps its data page
+])
+def test_normalize_pgn_follows_pdu_pgn(pgn, normalized):
+    assert normalize_pgn(pgn) == normalized
+
+
+def _notify(bus, can_id, data=(1,) * 8):
+    bus.notification(can.Message(arbitration_id=can_id, is_extended_id=True, data=list(data),
+                                 timestamp=time.time()))
+
+
+def test_data_page_1_pdu1_subscription_matches(make_bus):
+    bus = make_bus(broadcast=False)
+    received = []
+    bus.subscribe(pgn=0x1EF00, callback=lambda pdu: received.append((pdu.pgn, pdu.source, pdu.destination)))
+    _notify(bus, (6 << 26) | (0x1EF00 << 8) | (0x00 << 8) | 0x17)
+    _notify(bus, (6 << 26) | (0xEF00 << 8) | (0x05 << 8) | 0x18)
+    assert received == [(0xEF00, 0x17, 0x00), (0xEF00, 0x18, 0x05)]
+
+
+def test_data_page_1_pdu1_expect_completes(make_bus):
+    bus = make_bus()
+    response = bus.expect(0x1EF00, 0x17)
+    _notify(bus, (6 << 26) | (0x1EF00 << 8) | 0x17)
+    assert response.result(timeout=1).pgn == 0xEF00
+
+
+def test_data_page_1_pdu1_filter_matches():
+    filters = compile_filters([{"pgn": 0x1EF00}])
+    assert filters.accepts((6 << 26) | (0x1EF05 << 8) | 0x17)
+    assert filters.accepts((6 << 26) | (0xEF05 << 8) | 0x17)
+    assert not filters.accepts((6 << 26) | (0xEE05 << 8) | 0x17)
+    assert filters.can_filters() == [{"can_id": 0xEF0000, "can_mask": 0xFF0000, "extended": True}]
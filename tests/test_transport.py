@@ -0,0 +1,264 @@
+import time
+
+import pytest
+
+import j1939
+from j1939.canframe import pack_can_frames
+from j1939.transport import TransportReassembler, ReassemblySession, TransmitScheduler
+
+from tests.conftest import drain, new_channel
+
+# RTS/BAM announcing PGN 0xFECA: 14 bytes in 2 packets
+BAM = [0x20, 14, 0, 2, 0xFF, 0xCA, 0xFE, 0]
+RTS = [0x10, 14, 0, 2, 0xFF, 0xCA, 0xFE, 0]
+
+
+def _packet(sequence):
+    return bytes([sequence] + [sequence] * 7)
+
+
+def _can_id(pdu_format, pdu_specific, source):
+    return (7 << 26) | (pdu_format << 16) | (pdu_specific << 8) | source
+
+
+def _session(total_size=14, num_packets=2):
+    return ReassemblySession(0x20, 0xFF, 0xFECA, total_size, num_packets, is_bam=True)
+
+
+def test_session_completes():
+    session = _session()
+    assert session.add(_packet(2))
+    assert session.add(_packet(1))
+    assert session.is_complete
+    assert bytes(session.buffer) == bytes([1] * 7 + [2] * 7)
+    assert session.gaps == 1
+
+
+def test_session_drops_empty_and_short_packets():
+    session = _session()
+    assert not session.add(b"")
+    assert not session.add(b"\x01\x01\x01")
+    assert session.malformed == 2
+    assert session.received_count == 0
+
+
+def test_session_accepts_short_last_packet_carrying_the_rest():
+    session = _session(total_size=10)
+    assert session.add(_packet(1))
+    assert session.add(b"\x02\x02\x02\x02")
+    assert session.is_complete
+
+
+def test_session_drops_duplicates_and_out_of_range_packets():
+    session = _session()
+    assert session.add(_packet(1))
+    assert not session.add(_packet(1))
+    assert not session.add(_packet(3))
+    assert not session.add(_packet(0))
+    assert session.duplicates == 1
+    assert not session.is_complete
+
+
+def test_malformed_announces_are_rejected():
+    sessions = TransportReassembler()
+    assert sessions.open(0x20, 0xFF, BAM[:5]) is None
+    # a size of 0, and more bytes than the packets can carry
+    assert sessions.open(0x20, 0xFF, [0x20, 0, 0, 2, 0xFF, 0xCA, 0xFE, 0]) is None
+    assert sessions.open(0x20, 0xFF, [0x20, 15, 0, 2, 0xFF, 0xCA, 0xFE, 0]) is None
+    assert sessions.rejected == 3
+    assert len(sessions) == 0
+
+
+def test_new_announce_aborts_the_unfinished_session():
+    sessions = TransportReassembler()
+    first = sessions.open(0x20, 0xFF, BAM)
+    second = sessions.open(0x20, 0xFF, BAM)
+    assert first is not second
+    assert sessions.get(0x20, 0xFF) is second
+    assert sessions.aborted == 1
+
+
+def test_sessions_expire():
+    events = []
+    sessions = TransportReassembler(bam_timeout=1.0, rts_timeout=2.0)
+    sessions.observer = lambda session, event: events.append((session.source, event))
+    sessions.open(0x20, 0xFF, BAM, timestamp=10.0)
+    sessions.open(0x21, 0x17, RTS, timestamp=10.0)
+    assert sessions.next_expiry() == 11.0
+    sessions.expire(10.5)
+    assert len(sessions) == 2
+    sessions.expire(11.5)
+    assert sessions.get(0x20, 0xFF) is None
+    assert sessions.get(0x21, 0x17) is not None
+    sessions.expire(12.5)
+    assert len(sessions) == 0
+    assert sessions.timed_out == 2
+    assert events == [(0x20, "started"), (0x21, "started"), (0x20, "timed_out"), (0x21, "timed_out")]
+
+
+def test_bus_drops_malformed_packets_and_completes_later_session(make_bus):
+    bus = make_bus()
+    bus.ingest(pack_can_frames([
+        (_can_id(0xEC, 0xFF, 0x20), BAM),
+        (_can_id(0xEB, 0xFF, 0x20), b""),
+        (_can_id(0xEB, 0xFF, 0x20), b"\x02\x08"),
+        (_can_id(0xEC, 0xFF, 0x20), BAM),
+        (_can_id(0xEB, 0xFF, 0x20), _packet(1)),
+        (_can_id(0xEB, 0xFF, 0x20), _packet(2)),
+    ]), timestamp=3.0)
+    pdus = [pdu for pdu in drain(bus) if pdu.pgn == 0xFECA]
+    assert [(pdu.timestamp, bytes(pdu.data)) for pdu in pdus] == [(3.0, bytes([1] * 7 + [2] * 7))]
+
+
+def test_bus_drops_packets_of_an_aborted_session(make_bus):
+    bus = make_bus()
+    bus.ingest(pack_can_frames([
+        (_can_id(0xEC, 0x17, 0x20), RTS),
+        (_can_id(0xEB, 0x17, 0x20), _packet(1)),
+        # the receiver aborts
+        (_can_id(0xEC, 0x20, 0x17), [0xFF, 1, 0xFF, 0xFF, 0xFF, 0xCA, 0xFE, 0]),
+        (_can_id(0xEB, 0x17, 0x20), _packet(2)),
+    ]))
+    assert len(bus._tp_sessions) == 0
+    assert bus._tp_sessions.aborted == 1
+    assert [pdu for pdu in drain(bus) if pdu.pgn == 0xFECA] == []
+
+
+def test_bus_times_out_stalled_session_on_next_packet(make_bus):
+    bus = make_bus()
+    bus._tp_sessions.bam_timeout = 0.05
+    bus.ingest(pack_can_frames([(_can_id(0xEC, 0xFF, 0x20), BAM), (_can_id(0xEB, 0xFF, 0x20), _packet(1))]))
+    time.sleep(0.1)
+    bus.ingest(pack_can_frames([(_can_id(0xEB, 0xFF, 0x20), _packet(2))]))
+    assert bus._tp_sessions.timed_out == 1
+    assert [pdu for pdu in drain(bus) if pdu.pgn == 0xFECA] == []
+
+
+def test_historical_timestamps_dont_time_out_sessions(make_bus):
+    bus = make_bus(reactor=True)
+    bus.ingest(pack_can_frames([(_can_id(0xEC, 0xFF, 0x20), BAM), (_can_id(0xEB, 0xFF, 0x20), _packet(1))]),
+               timestamp=1000.0)
+    time.sleep(0.05)
+    bus.ingest(pack_can_frames([(_can_id(0xEB, 0xFF, 0x20), _packet(2))]), timestamp=1000.1)
+    pdu = bus.recv(timeout=1)
+    assert (pdu.pgn, pdu.timestamp) == (0xFECA, 1000.1)
+    assert bus._tp_sessions.timed_out == 0
+
+
+class _Clock(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def _scheduler(gap=0.05):
+    clock = _Clock()
+    sent = []
+    scheduler = TransmitScheduler(lambda msg: sent.append((clock.now, msg)), gap=gap, clock=clock)
+    return scheduler, clock, sent
+
+
+def test_scheduler_paces_a_session_by_its_deadlines():
+    scheduler, clock, sent = _scheduler()
+    scheduler.submit(0x20, ["cm", "dt1", "dt2"])
+    assert scheduler.run_due() == 100.05
+    # late by 0.03: the next deadline still follows the previous one
+    clock.now = 100.08
+    assert scheduler.run_due() == pytest.approx(100.10)
+    clock.now = 100.10
+    assert scheduler.run_due() is None
+    assert [msg for _, msg in sent] == ["cm", "dt1", "dt2"]
+    assert (scheduler.sent, scheduler.completed, len(scheduler)) == (3, 1, 0)
+
+
+def test_scheduler_late_session_catches_up_without_bursting():
+    scheduler, clock, sent = _scheduler()
+    scheduler.submit(0x20, ["cm", "dt1", "dt2", "dt3", "dt4"])
+    scheduler.run_due()
+    clock.now = 101.0
+    # the overdue frame and one more go out, the rest is paced again
+    assert scheduler.run_due() == 101.0 + 0.05
+    assert [msg for _, msg in sent] == ["cm", "dt1", "dt2"]
+
+
+def test_scheduler_interleaves_sources():
+    scheduler, clock, sent = _scheduler()
+    scheduler.submit(0x20, ["a0", "a1", "a2"])
+    scheduler.submit(0x21, ["b0", "b1"], gap=0.1)
+    while scheduler.next_deadline() is not None:
+        clock.now = scheduler.next_deadline()
+        scheduler.run_due()
+    assert [msg for _, msg in sent[:3]] == ["a0", "b0", "a1"]
+    assert sorted(msg for _, msg in sent[3:]) == ["a2", "b1"]
+    assert [when for _, when in sorted((msg, when) for when, msg in sent)] == pytest.approx(
+        [100.0, 100.05, 100.1, 100.0, 100.1])
+
+
+def test_scheduler_queues_bams_of_a_busy_source():
+    scheduler, clock, sent = _scheduler()
+    scheduler.submit(0x20, ["a0", "a1"])
+    scheduler.submit(0x20, ["b0", "b1"])
+    assert len(scheduler) == 2
+    while scheduler.next_deadline() is not None:
+        clock.now = scheduler.next_deadline()
+        scheduler.run_due()
+    assert [msg for _, msg in sent] == ["a0", "a1", "b0", "b1"]
+    # the next BAM starts a gap after the last packet of the previous one
+    assert sent[2][0] == pytest.approx(sent[1][0] + 0.05)
+
+
+def test_scheduler_drops_a_session_whose_send_fails():
+    clock = _Clock()
+    sent = []
+
+    def send(msg):
+        if msg == "a1":
+            raise ValueError("bus down")
+        sent.append(msg)
+
+    scheduler = TransmitScheduler(send, gap=0.05, clock=clock)
+    scheduler.submit(0x20, ["a0", "a1", "a2"])
+    scheduler.submit(0x20, ["b0"])
+    while scheduler.next_deadline() is not None:
+        clock.now = scheduler.next_deadline()
+        scheduler.run_due()
+    assert sent == ["a0", "b0"]
+    assert (scheduler.failed, scheduler.completed) == (1, 1)
+
+
+def test_scheduler_wakeup_on_submit():
+    scheduler, _, _ = _scheduler()
+    woken = []
+    scheduler.wakeup = lambda: woken.append(True)
+    scheduler.submit(0x20, ["cm"])
+    assert woken == [True]
+
+
+def test_scheduler_thread_sends_bams():
+    sent = []
+    scheduler = TransmitScheduler(sent.append, gap=0.001)
+    scheduler.start()
+    try:
+        scheduler.submit(0x20, list(range(5)))
+        scheduler.submit(0x21, list(range(5, 10)))
+        deadline = time.monotonic() + 2
+        while scheduler.completed < 2 and time.monotonic() < deadline:
+            time.sleep(0.005)
+    finally:
+        scheduler.stop()
+    assert sorted(sent) == list(range(10))
+    assert sent.index(4) > sent.index(5)
+
+
+def test_bus_sends_bam_through_the_scheduler(make_bus):
+    channel = new_channel()
+    sender = make_bus(channel=channel)
+    sender.connect(j1939.Node(sender, j1939.NodeName(0), [0x20]))
+    receiver = make_bus(channel=channel)
+    aid = j1939.ArbitrationID(pgn=j1939.PGN(pdu_format=0xFE, pdu_specific=0xCA), source_address=0x20)
+    sender.send(j1939.PDU(arbitration_id=aid, data=list(range(20))))
+    pdu = receiver.recv(timeout=2)
+    assert (pdu.pgn, pdu.source, list(pdu.data)) == (0xFECA, 0x20, list(range(20)))
+    assert sender._tx_scheduler.completed == 1